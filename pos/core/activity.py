@@ -0,0 +1,137 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.models import UserActivity
+
+logger = logging.getLogger(__name__)
+
+
+class ActivityLogger:
+    """
+    Buffers UserActivity rows and writes them with bulk_create from a
+    background thread, every ``batch_size`` rows or ``flush_interval``
+    seconds, whichever comes first.
+
+    The buffer is bounded. When it is full, log() waits up to
+    ``put_timeout`` seconds for room and then drops the record, so a stalled
+    database slows requests down by at most that much.
+
+    With ACTIVITY_LOG_ASYNC off (the default under tests) records are
+    written inline on the caller's connection instead.
+    """
+
+    def __init__(self, batch_size=500, flush_interval=0.2, maxsize=10000, put_timeout=0.05):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def log(self, user, activity_type, details='', ip_address='0.0.0.0'):
+        # Stamped now, not when the batch is flushed.
+        record = UserActivity(user_id=user.pk, activity_type=activity_type[:100],
+                              details=details, ip_address=ip_address,
+                              timestamp=timezone.now())
+        # Inside a transaction, only log what actually commits.
+        if connection.in_atomic_block:
+            transaction.on_commit(lambda: self._deliver(record))
+        else:
+            self._deliver(record)
+
+    def _deliver(self, record):
+        if getattr(settings, 'ACTIVITY_LOG_ASYNC', True):
+            self._put(record)
+        else:
+            self._write([record])
+
+    def _put(self, record):
+        self._start()
+        try:
+            self._queue.put(record, timeout=self.put_timeout)
+        except queue.Full:
+            self.dropped += 1
+            logger.warning("Activity log buffer full, dropped a %s record (%d so far)",
+                           record.activity_type, self.dropped)
+
+    def flush(self):
+        """Write everything buffered so far, on the calling thread."""
+        batch = []
+        while True:
+            try:
+                record = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if record is not None:
+                batch.append(record)
+        self._write(batch)
+
+    def stop(self):
+        """Flush-on-shutdown: stop the background thread after it writes what is queued."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name='activity-logger', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    record = self._queue.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if record is None:
+                    stopping = True
+                    break
+                batch.append(record)
+            self._write(batch)
+        connection.close()
+
+    def _write(self, batch):
+        if not batch:
+            return
+        try:
+            UserActivity.objects.bulk_create(batch, batch_size=self.batch_size)
+        except Exception:
+            logger.exception("Could not write %d activity record(s)", len(batch))
+
+
+_logger = None
+_logger_lock = threading.Lock()
+
+
+def get_logger():
+    global _logger
+    with _logger_lock:
+        if _logger is None:
+            _logger = ActivityLogger(
+                batch_size=getattr(settings, 'ACTIVITY_LOG_BATCH_SIZE', 500),
+                flush_interval=getattr(settings, 'ACTIVITY_LOG_FLUSH_INTERVAL', 0.2),
+                maxsize=getattr(settings, 'ACTIVITY_LOG_QUEUE_SIZE', 10000),
+                put_timeout=getattr(settings, 'ACTIVITY_LOG_PUT_TIMEOUT', 0.05),
+            )
+            atexit.register(_logger.stop)
+        return _logger
+
+
+def log(user, activity_type, details='', ip_address='0.0.0.0'):
+    get_logger().log(user, activity_type, details, ip_address)
@@ -0,0 +1,89 @@
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.db.models import Q
+from django.http import JsonResponse
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from core import barcode_cache
+from core.models import Discount, Metrics, Product, SalesRollup, Stock
+from serializers import DiscountSerializer, MetricsSerializer, ProductScanSerializer, StockSerializer
+
+# Async twins of the hottest read endpoints. Under an ASGI server they run on
+# the event loop and use the async ORM instead of taking a worker thread each.
+# They return the same payloads as the DRF actions they mirror.
+
+
+async def _authenticate(request):
+    # Session users come from the middleware without a thread hop; other
+    # schemes (basic, token) go through DRF's configured authenticators.
+    if 'HTTP_AUTHORIZATION' not in request.META:
+        return await request.auser()
+    drf_request = Request(request, authenticators=[
+        auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+    return await sync_to_async(lambda: drf_request.user)()
+
+
+def async_api_view(view):
+    @wraps(view)
+    async def wrapped(request, *args, **kwargs):
+        if request.method != 'GET':
+            return JsonResponse({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+        try:
+            user = await _authenticate(request)
+        except AuthenticationFailed as e:
+            return JsonResponse({'detail': e.detail}, status=401)
+        if not user.is_authenticated:
+            return JsonResponse({'detail': 'Authentication credentials were not provided.'},
+                                status=401)
+        return await view(request, *args, **kwargs)
+    return wrapped
+
+
+def _active_discounts(today):
+    return Discount.objects.filter(
+        from_date__lte=today, to_date__gte=today).prefetch_related('products')
+
+
+async def _load_scan(code):
+    try:
+        product = await Product.objects.aget(barcode=code)
+    except Product.DoesNotExist:
+        return None
+    discounts = _active_discounts(timezone.localdate()).filter(
+        Q(products=product) | Q(all_products_discount=True)).distinct()
+    return ProductScanSerializer(product, context={
+        'active_discounts': [discount async for discount in discounts]}).data
+
+
+@async_api_view
+async def product_by_barcode(request, code):
+    data = await barcode_cache.alookup(code, _load_scan)
+    if data is None:
+        return JsonResponse({'error': 'Unknown barcode'}, status=404)
+    return JsonResponse(data)
+
+
+@async_api_view
+async def stock_by_sku(request, sku):
+    rows = [stock async for stock in Stock.objects.filter(sku=sku).order_by('id')]
+    return JsonResponse(StockSerializer(rows, many=True).data, safe=False)
+
+
+@async_api_view
+async def active_discounts(request):
+    discounts = [discount async for discount in _active_discounts(timezone.localdate())]
+    return JsonResponse(DiscountSerializer(discounts, many=True).data, safe=False)
+
+
+@async_api_view
+async def dashboard_summary(request):
+    metrics = await Metrics.objects.afirst() or Metrics()
+    totals = await SalesRollup.atotals_for(timezone.localdate())
+    metrics.daily_sales = totals['DAY']
+    metrics.weekly_sales = totals['WEEK']
+    metrics.monthly_sales = totals['MONTH']
+    return JsonResponse(MetricsSerializer(metrics).data)
@@ -0,0 +1,142 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+GENERATION_KEY = 'barcode:generation'
+
+
+class LRUCache:
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+                return self._data[key]
+            except KeyError:
+                return None
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_local = LRUCache(getattr(settings, 'BARCODE_LRU_SIZE', 4096))
+_local_generation = 0
+# The shared generation as last read, and when (time.monotonic()).
+_seen = {'generation': None, 'at': float('-inf')}
+
+
+def _shared():
+    alias = getattr(settings, 'BARCODE_CACHE_ALIAS', None)
+    return caches[alias] if alias else None
+
+
+def _stale():
+    ttl = getattr(settings, 'BARCODE_GENERATION_TTL', 1)
+    return time.monotonic() - _seen['at'] >= ttl
+
+
+def _saw(generation):
+    _seen.update(generation=generation, at=time.monotonic())
+    return generation
+
+
+def _fresh_generation():
+    # Not 1: if the shared key is evicted, a restarted count must not match
+    # generations still keyed in some worker's LRU.
+    return time.time_ns()
+
+
+def _generation(shared):
+    if shared is None:
+        return _local_generation
+    if _stale():
+        return _saw(shared.get_or_set(GENERATION_KEY, _fresh_generation, timeout=None))
+    return _seen['generation']
+
+
+def _key(generation, code):
+    return f'barcode:{generation}:{timezone.localdate()}:{code}'
+
+
+def lookup(code, loader):
+    """
+    Return the cached scan payload for ``code``, calling ``loader(code)`` on a
+    miss. Misses (``None``) are not cached. Keys include the date so that
+    discounts roll over at midnight, and the generation so that an
+    invalidation is seen by every process sharing BARCODE_CACHE_ALIAS. The
+    shared generation is read at most once per BARCODE_GENERATION_TTL
+    seconds, so a hit in the local LRU needs no round trip, and other
+    processes see an invalidation within that time. Without a shared alias
+    it is only seen by the current process.
+    """
+    shared = _shared()
+    key = _key(_generation(shared), code)
+
+    payload = _local.get(key)
+    if payload is not None:
+        return payload
+    if shared is not None:
+        payload = shared.get(key)
+    if payload is None:
+        payload = loader(code)
+        if payload is None:
+            return None
+        if shared is not None:
+            shared.set(key, payload, timeout=24 * 60 * 60)
+    _local.set(key, payload)
+    return payload
+
+
+async def alookup(code, loader):
+    """Async version of lookup(); ``loader`` is a coroutine function."""
+    shared = _shared()
+    if shared is None:
+        generation = _local_generation
+    elif _stale():
+        generation = _saw(await shared.aget_or_set(GENERATION_KEY, _fresh_generation,
+                                                   timeout=None))
+    else:
+        generation = _seen['generation']
+    key = _key(generation, code)
+
+    payload = _local.get(key)
+    if payload is not None:
+        return payload
+    if shared is not None:
+        payload = await shared.aget(key)
+    if payload is None:
+        payload = await loader(code)
+        if payload is None:
+            return None
+        if shared is not None:
+            await shared.aset(key, payload, timeout=24 * 60 * 60)
+    _local.set(key, payload)
+    return payload
+
+
+def invalidate():
+    global _local_generation
+    _local_generation += 1
+    _local.clear()
+    shared = _shared()
+    if shared is not None:
+        try:
+            _saw(shared.incr(GENERATION_KEY))
+        except ValueError:
+            shared.set(GENERATION_KEY, _saw(_fresh_generation()), timeout=None)
@@ -0,0 +1 @@
+"""Synthetic data and till traffic for measuring how many tills one instance can serve."""
@@ -0,0 +1,199 @@
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connections
+from django.utils import timezone
+
+from core import stock_ledger, sync
+from core.models import (
+    Agent, Brand, CreditBalanceSnapshot, CreditPayment, CustomUser, Customer, CustomerCredit,
+    Discount, Expense, ExpenseCategory, InventoryItem, InventoryMovement, Metrics, MonthlySales,
+    Product, ProductCategory, Purchase, PurchaseReturn, Receipt, Report, ReportSchedule, Role,
+    SalesOrder, SalesReturn, Staff, Stock, StorageLocation, Supplier, Transaction, Unit,
+    UserActivity, UserActivityArchive,
+)
+
+BATCHES_PER_PRODUCT = 10
+
+
+def _bulk(model, rows):
+    return model.objects.bulk_create(rows, batch_size=2000)
+
+
+def generate(scale=1, batch_quantity=20, username='bench', password='bench'):
+    """
+    Fill every model with synthetic rows and return the admin user that owns
+    them. ``scale`` multiplies the volumes: 200 products with 10 batches
+    each, 20k inventory movements and 100 of most other rows per step.
+    """
+    products_count, movements_count, rows = 200 * scale, 20000 * scale, 100 * scale
+    today = date.today()
+    user = CustomUser.objects.create_user(username, password=password, role='Admin',
+                                          is_staff=True)
+    users = _bulk(CustomUser, [CustomUser(username=f'cashier{i}', role='Cashier')
+                               for i in range(rows)])
+    category = ProductCategory.objects.create(name='Groceries')
+    brand = Brand.objects.create(name='House')
+    unit = Unit.objects.create(name='Piece', symbol='pcs')
+    locations = _bulk(StorageLocation, [StorageLocation(name=f'Aisle {i}') for i in range(4)])
+
+    products = _bulk(Product, [
+        Product(name=f'Product {i}', barcode=f'BC{i:08d}', sku=f'SKU{i:08d}',
+                category=category, brand=brand, unit=unit, price=Decimal(f'{1 + i % 50}.99'),
+                cost_price=Decimal(f'{i % 50}.50'), stock_quantity=i % 25,
+                available_quantity=BATCHES_PER_PRODUCT * batch_quantity, packing_date=today)
+        for i in range(products_count)
+    ])
+    _bulk(InventoryItem, [
+        InventoryItem(product=product, batch_number=f'B{batch}', quantity=batch_quantity,
+                      location=locations[batch % len(locations)],
+                      expiry_date=today + timedelta(days=batch * 30))
+        for product in products for batch in range(BATCHES_PER_PRODUCT)
+    ])
+    _bulk(InventoryMovement, [
+        InventoryMovement(product=products[i % products_count],
+                          movement_type=('IN', 'OUT', 'TRANSFER', 'ADJUST')[i % 4],
+                          quantity=1 + i % 5, reference_number=f'M{i}',
+                          from_location=locations[i % len(locations)],
+                          to_location=locations[(i + 1) % len(locations)] if i % 4 == 2 else None,
+                          performed_by=user)
+        for i in range(movements_count)
+    ])
+    customers = _bulk(Customer, [
+        Customer(contact_id=f'C{i}', business_name=f'Business {i}', name=f'Customer {i}',
+                 email=f'customer{i}@example.com', pay_term='30', opening_balance=0,
+                 advance_balance=0, credit_limit=1000, date=today, mobile=f'07{i:08d}',
+                 total_sales_due=0, total_sales_return_due=0)
+        for i in range(rows)
+    ])
+    sales = _bulk(Transaction, [
+        Transaction(customer=customers[i % rows], cashier=user, payment_method='CASH',
+                    total_amount=Decimal('19.98'), paid_amount=Decimal('20.00'),
+                    change_amount=Decimal('0.02'), is_completed=i % 10 != 0)
+        for i in range(rows * 5)
+    ])
+    _bulk(Receipt, [Receipt(receipt_number=f'R{sale.pk}', transaction=sale) for sale in sales])
+    credits = _bulk(CustomerCredit, [
+        CustomerCredit(customer=customer, credit_limit=500, current_balance=100)
+        for customer in customers
+    ])
+    _bulk(CreditPayment, [
+        CreditPayment(customer_credit=credit, amount=Decimal('25.00'), reference_number='P',
+                      received_by=user)
+        for credit in credits for _ in range(4)
+    ])
+
+    _bulk(UserActivity, [
+        UserActivity(user=users[i % rows], activity_type='POST product-list',
+                     details='/api/products/ -> 201', ip_address='127.0.0.1')
+        for i in range(rows * 20)
+    ])
+    _bulk(UserActivityArchive, [
+        UserActivityArchive(id=i + 1, user=users[i % rows], activity_type='POST product-list',
+                            timestamp=timezone.now() - timedelta(days=200), details='',
+                            ip_address='127.0.0.1', month=today.replace(day=1))
+        for i in range(rows * 5)
+    ])
+    _bulk(Report, [
+        Report(report_type='INVENTORY', start_date=today - timedelta(days=30), end_date=today,
+               generated_by=user, parameters={}, results={})
+        for _ in range(rows)
+    ])
+    schedules = _bulk(ReportSchedule, [
+        ReportSchedule(report_type='SALES', frequency='DAILY', next_run=timezone.now())
+        for _ in range(rows)
+    ])
+    ReportSchedule.recipients.through.objects.bulk_create([
+        ReportSchedule.recipients.through(reportschedule_id=schedule.pk, customuser_id=user.pk)
+        for schedule in schedules
+    ])
+
+    discounts = _bulk(Discount, [
+        Discount(from_date=today - timedelta(days=1), to_date=today + timedelta(days=i % 30),
+                 discount_type='Product wise discount', discount_percent=Decimal('5.00'))
+        for i in range(rows)
+    ])
+    Discount.products.through.objects.bulk_create([
+        Discount.products.through(discount_id=discount.pk, product_id=products[(i + j) % products_count].pk)
+        for i, discount in enumerate(discounts) for j in range(5)
+    ])
+
+    _bulk(Supplier, [
+        Supplier(contact_id=f'S{i}', business_name=f'Supplier {i}', name=f'Supplier {i}',
+                 email=f'supplier{i}@example.com', tax_number='T', pay_term='30',
+                 opening_balance=0, advance_balance=0, date=today, address='Main St',
+                 mobile='0700000000', total_purchase_due=0)
+        for i in range(rows)
+    ])
+    _bulk(SalesOrder, [
+        SalesOrder(customer=customers[i], date=today, order_no=f'SO{i}', location='Aisle 0',
+                   status='Draft', shipping_status='Pending', quantity_remaining=1,
+                   total_amount=10)
+        for i in range(rows)
+    ])
+    _bulk(SalesReturn, [
+        SalesReturn(date=today, invoice_no=f'SR{i}', parent_sale=f'SO{i}', customer_name='C',
+                    location='Aisle 0', payment_status='Paid', total_amount=10, payment_due=0)
+        for i in range(rows)
+    ])
+    _bulk(Purchase, [
+        Purchase(date=today, reference_no=f'PO{i}', location='Aisle 0', supplier='S',
+                 purchase_status='Completed', payment_status='Paid', grand_total=10,
+                 payment_due=0, total=10)
+        for i in range(rows)
+    ])
+    _bulk(PurchaseReturn, [
+        PurchaseReturn(reference_no=f'PR{i}', parent_purchase=f'PO{i}', location='Aisle 0',
+                       supplier='S', grand_total=10, payment_due=0, total=10)
+        for i in range(rows)
+    ])
+    _bulk(Expense, [
+        Expense(date=today, reference_no=f'E{i}', customer_name='C', recurring_details='',
+                expense_category='Rent', sub_category='', location='Aisle 0',
+                payment_status='Paid', tax=0, total_amount=10, payment_due=0, expense_for='')
+        for i in range(rows)
+    ])
+    _bulk(ExpenseCategory, [ExpenseCategory(category_name=f'Category {i}', category_code=f'EC{i}')
+                            for i in range(rows)])
+    _bulk(Role, [Role(name=name) for name, _ in CustomUser.ROLE_CHOICES])
+    _bulk(Agent, [Agent(name=f'Agent {i}', commission_rate=Decimal('2.50')) for i in range(rows)])
+    _bulk(Staff, [Staff(name=f'Staff {i}', position='Cashier') for i in range(rows)])
+
+    # Derived tables, built the way their maintenance commands build them.
+    sync.restamp()
+    Stock.rebuild()
+    stock_ledger.rebuild_balances(from_scratch=True)
+    stock_ledger.take_snapshot()
+    CreditBalanceSnapshot.take()
+    Metrics.recount()
+    call_command('rebuild_sales_rollups', stdout=StringIO())
+    MonthlySales.objects.bulk_create(
+        [MonthlySales(month=f'{today.year - 1 - i // 12}-{i % 12 + 1:02d}', sales=1000)
+         for i in range(24)],
+        ignore_conflicts=True)
+    return user
+
+
+@contextmanager
+def scratch_database():
+    """Point the default SQLite connection, in every thread, at a new migrated file."""
+    if connections['default'].vendor != 'sqlite':
+        raise ValueError("A scratch database is only supported on SQLite")
+    db_settings = connections.settings['default']
+    original = db_settings['NAME']
+    workdir = tempfile.mkdtemp(prefix='pos-bench-')
+    connections['default'].close()
+    db_settings['NAME'] = os.path.join(workdir, 'bench.sqlite3')
+    try:
+        call_command('migrate', verbosity=0)
+        yield db_settings['NAME']
+    finally:
+        connections['default'].close()
+        db_settings['NAME'] = original
+        shutil.rmtree(workdir, ignore_errors=True)
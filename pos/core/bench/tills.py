@@ -0,0 +1,330 @@
+"""
+Till traffic. Each till loops over baskets: scan every item, price the
+basket, check out, print the receipt and now and then void the sale or
+take an item back. The scenario is a generator of requests so the same
+traffic can be replayed through the WSGI or ASGI handler in-process, or
+over HTTP against a running server.
+"""
+import asyncio
+import http.client
+import json
+import math
+import random
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from decimal import Decimal
+from urllib.parse import urlsplit
+
+from django.db import connections
+
+from core import metrics
+
+LOCK_WAIT = 'pos_request_db_lock_wait_seconds'
+
+
+class Catalog:
+    """The ids and barcodes the tills pick from."""
+
+    def __init__(self, products, customers, location, user):
+        self.products = products
+        self.customers = customers
+        self.location = location
+        self.user = user
+
+    @classmethod
+    def load(cls, user, limit=5000):
+        from core.models import Customer, Product, StorageLocation
+
+        products = list(Product.objects.filter(is_active=True, available_quantity__gt=0)
+                        .order_by('pk').values_list('pk', 'barcode')[:limit])
+        customers = list(Customer.objects.order_by('pk').values_list('pk', flat=True)[:limit])
+        location = StorageLocation.objects.order_by('pk').values_list('pk', flat=True).first()
+        if not products or not customers or location is None:
+            raise ValueError("The database has no stocked products, customers or locations")
+        return cls(products, customers, location, user.pk)
+
+
+def till_session(catalog, rng, void_rate=0.02, return_rate=0.01):
+    """
+    One basket. Yields (step, method, path, payload) and is sent back the
+    decoded response, or None when the request failed.
+    """
+    picks = rng.sample(catalog.products, min(len(catalog.products), rng.randint(1, 8)))
+    for _, barcode in picks:
+        yield 'scan', 'GET', f'/api/products/by-barcode/{barcode}/', None
+
+    lines = [{'product': product_id, 'quantity': rng.randint(1, 3)} for product_id, _ in picks]
+    priced = yield 'price', 'POST', '/api/products/price-basket/', {'lines': lines}
+    if priced is None:
+        return
+    # Checkout charges list prices; pay cash rounded up to the next unit.
+    due = sum(Decimal(str(line['subtotal'])) for line in priced['lines'])
+    sale = yield 'checkout', 'POST', '/api/transactions/checkout/', {
+        'customer': rng.choice(catalog.customers),
+        'payment_method': 'CASH',
+        'paid_amount': str(math.ceil(due)),
+        'lines': lines,
+    }
+    if sale is None:
+        return
+    yield 'print', 'POST', f"/api/receipts/{sale['receipt']}/print_receipt/", {}
+
+    roll = rng.random()
+    if roll < void_rate:
+        yield 'void', 'POST', f"/api/receipts/{sale['receipt']}/void_receipt/", {
+            'reason': 'Customer changed their mind'}
+    elif roll < void_rate + return_rate:
+        yield 'return', 'POST', '/api/inventory-movements/', {
+            'product': lines[0]['product'], 'movement_type': 'RETURN', 'quantity': 1,
+            'reference_number': sale['receipt_number'], 'from_location': catalog.location,
+            'performed_by': catalog.user,
+        }
+
+
+class TillStats:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = Counter()
+        self.statuses = Counter()
+
+    def record(self, step, seconds, status):
+        self.latencies[step].append(seconds)
+        self.statuses[status] += 1
+        if not 200 <= status < 400:
+            self.errors[step] += 1
+
+    def merge(self, other):
+        for step, latencies in other.latencies.items():
+            self.latencies[step].extend(latencies)
+        self.errors.update(other.errors)
+        self.statuses.update(other.statuses)
+
+
+def _decode(status, body):
+    if not 200 <= status < 400 or not body:
+        return None
+    try:
+        return json.loads(body)
+    except ValueError:
+        return None
+
+
+class InProcessTransport:
+    """Django's test client: the full WSGI handler and middleware stack, no sockets."""
+
+    def __init__(self, user):
+        from django.test import Client
+
+        self.client = Client(raise_request_exception=False, HTTP_HOST='localhost')
+        self.client.force_login(user)
+
+    def request(self, method, path, payload):
+        body = json.dumps(payload) if payload is not None else ''
+        response = self.client.generic(method, path, body, content_type='application/json')
+        return response.status_code, _decode(response.status_code, response.content)
+
+    def close(self):
+        connections.close_all()
+
+
+class AsgiTransport:
+    """Django's async test client: the ASGI handler in-process."""
+
+    def __init__(self, user):
+        from django.test import AsyncClient
+
+        self.client = AsyncClient(raise_request_exception=False, HTTP_HOST='localhost')
+        self.client.force_login(user)
+
+    async def request(self, method, path, payload):
+        body = json.dumps(payload) if payload is not None else ''
+        response = await self.client.generic(method, path, body,
+                                             content_type='application/json')
+        return response.status_code, _decode(response.status_code, response.content)
+
+
+class HttpTransport:
+    """A keep-alive HTTP/1.1 connection to a running server, logged in by session cookie."""
+
+    def __init__(self, base_url, session_key, csrf_token):
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.headers = {
+            'Content-Type': 'application/json',
+            'Cookie': f'sessionid={session_key}; csrftoken={csrf_token}',
+            'X-CSRFToken': csrf_token,
+        }
+        self.connection = None
+
+    def request(self, method, path, payload):
+        body = json.dumps(payload) if payload is not None else None
+        try:
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            self.connection.request(method, path, body, self.headers)
+            response = self.connection.getresponse()
+            content = response.read()
+        except (OSError, http.client.HTTPException):
+            self.close()
+            return 0, None
+        if response.will_close:
+            self.close()
+        return response.status, _decode(response.status, content)
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+def http_login(user):
+    """A session for ``user`` in the server's database and a CSRF token to go with it."""
+    from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+    from django.contrib.sessions.backends.db import SessionStore
+    from django.utils.crypto import get_random_string
+
+    session = SessionStore()
+    session[SESSION_KEY] = str(user.pk)
+    session[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.create()
+    return session.session_key, get_random_string(32)
+
+
+def http_lock_wait(base_url):
+    """(requests, seconds) of write-lock waiting reported by the server's /api/_metrics."""
+    parts = urlsplit(base_url)
+    connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=10)
+    try:
+        connection.request('GET', '/api/_metrics')
+        response = connection.getresponse()
+        text = response.read().decode()
+    except (OSError, http.client.HTTPException):
+        return None
+    finally:
+        connection.close()
+    if response.status != 200:
+        return None
+    total = {'count': 0, 'sum': 0.0}
+    for kind, value in re.findall(rf'^{LOCK_WAIT}_(count|sum){{[^}}]*}} (\S+)$', text, re.M):
+        total[kind] += float(value)
+    return int(total['count']), total['sum']
+
+
+def _drive(transport, catalog, rng, deadline, options, stats):
+    while time.monotonic() < deadline:
+        session = till_session(catalog, rng, options['void_rate'], options['return_rate'])
+        try:
+            step, method, path, payload = next(session)
+            while True:
+                start = time.perf_counter()
+                status, data = transport.request(method, path, payload)
+                stats.record(step, time.perf_counter() - start, status)
+                step, method, path, payload = session.send(data)
+        except StopIteration:
+            pass
+
+
+async def _adrive(transport, catalog, rng, deadline, options, stats):
+    while time.monotonic() < deadline:
+        session = till_session(catalog, rng, options['void_rate'], options['return_rate'])
+        try:
+            step, method, path, payload = next(session)
+            while True:
+                start = time.perf_counter()
+                status, data = await transport.request(method, path, payload)
+                stats.record(step, time.perf_counter() - start, status)
+                step, method, path, payload = session.send(data)
+        except StopIteration:
+            pass
+
+
+def run_threads(transports, catalog, duration, options):
+    """Run one till per transport on its own thread, like a threaded WSGI worker."""
+    stats = [TillStats() for _ in transports]
+    deadline = time.monotonic() + duration
+
+    def till(index):
+        rng = random.Random(options['seed'] + index)
+        try:
+            _drive(transports[index], catalog, rng, deadline, options, stats[index])
+        finally:
+            transports[index].close()
+
+    threads = [threading.Thread(target=till, args=(index,), name=f'till-{index}')
+               for index in range(len(transports))]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return _merge(stats), time.monotonic() - started
+
+
+def run_async(transports, catalog, duration, options):
+    """Run every till as a task on one event loop, like an ASGI worker."""
+    stats = [TillStats() for _ in transports]
+
+    async def main():
+        deadline = time.monotonic() + duration
+        await asyncio.gather(*(
+            _adrive(transport, catalog, random.Random(options['seed'] + index), deadline,
+                    options, stats[index])
+            for index, transport in enumerate(transports)
+        ))
+
+    started = time.monotonic()
+    asyncio.run(main())
+    return _merge(stats), time.monotonic() - started
+
+
+def _merge(stats):
+    total = TillStats()
+    for till in stats:
+        total.merge(till)
+    return total
+
+
+def _percentile(ordered, p):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))] * 1000 if ordered else 0.0
+
+
+def summarize(stats, elapsed, tills, lock_wait):
+    """The JSON-ready result of a run. ``lock_wait`` is (requests, seconds) or None."""
+    steps = {}
+    for step, latencies in sorted(stats.latencies.items()):
+        ordered = sorted(latencies)
+        steps[step] = {
+            'requests': len(ordered),
+            'errors': stats.errors[step],
+            'p50_ms': _percentile(ordered, 0.50),
+            'p95_ms': _percentile(ordered, 0.95),
+            'p99_ms': _percentile(ordered, 0.99),
+        }
+    everything = sorted(latency for latencies in stats.latencies.values()
+                        for latency in latencies)
+    baskets = len(stats.latencies['checkout']) - stats.errors['checkout']
+    return {
+        'tills': tills,
+        'duration_s': round(elapsed, 2),
+        'baskets': baskets,
+        'baskets_per_s': baskets / elapsed if elapsed else 0.0,
+        'requests': len(everything),
+        'requests_per_s': len(everything) / elapsed if elapsed else 0.0,
+        'p50_ms': _percentile(everything, 0.50),
+        'p95_ms': _percentile(everything, 0.95),
+        'p99_ms': _percentile(everything, 0.99),
+        'statuses': {str(status): count for status, count in sorted(stats.statuses.items())},
+        'steps': steps,
+        'lock_wait': None if lock_wait is None else {
+            'requests': lock_wait[0],
+            'total_s': lock_wait[1],
+            'per_basket_ms': lock_wait[1] * 1000 / baskets if baskets else 0.0,
+        },
+    }
+
+
+def local_lock_wait():
+    return metrics.registry.totals(LOCK_WAIT)
@@ -0,0 +1,174 @@
+import codecs
+import json
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import BaseParser
+
+
+class NDJSONParser(BaseParser):
+    """
+    Parses a newline-delimited JSON body lazily, one row per line, so large
+    imports are never held in memory at once. Undecodable lines are yielded
+    as ValueError instances and reported as row errors.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        return self._rows(codecs.getreader(encoding)(stream))
+
+    def _rows(self, reader):
+        for line in reader:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                yield e
+
+
+class BulkUpsert:
+    """
+    Validate rows one by one and write the valid ones in batches with
+    ``bulk_create(update_conflicts=True)``. Invalid rows are reported by
+    index and never abort the batch.
+
+    ``related`` maps foreign key fields, which the row serializer accepts as
+    plain ids, to their model; their existence is checked once per batch.
+    ``also_unique`` lists other unique fields that must not collide with a
+    different row than the one matched on ``unique_fields``.
+    """
+
+    def __init__(self, model, serializer_class, unique_fields, related=None,
+                 also_unique=(), batch_size=1000, after_batch=None):
+        self.model = model
+        self.serializer_class = serializer_class
+        self.unique_fields = list(unique_fields)
+        self.related = related or {}
+        self.also_unique = list(also_unique)
+        self.batch_size = batch_size
+        self.after_batch = after_batch
+
+    def run(self, rows):
+        result = {'created': 0, 'updated': 0, 'errors': []}
+        rows = enumerate(rows)
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                result['errors'].sort(key=lambda error: error['row'])
+                return result
+            self._run_batch(batch, result)
+
+    def _run_batch(self, batch, result):
+        errors = result['errors']
+        valid = []
+        # One serializer validates every row, as ListSerializer does with its
+        # child, so the fields are only built once.
+        child = self.serializer_class()
+        for index, row in batch:
+            if not isinstance(row, dict):
+                message = str(row) if isinstance(row, ValueError) else 'Expected a JSON object.'
+                errors.append({'row': index, 'errors': {'non_field_errors': [message]}})
+                continue
+            try:
+                valid.append((index, self._attributes(child.run_validation(row))))
+            except ValidationError as e:
+                errors.append({'row': index, 'errors': e.detail})
+
+        valid = self._check_related(valid, errors)
+        valid = self._check_unique(valid, errors)
+        if not valid:
+            return
+
+        existing = self._existing_keys(valid)
+        instances = [self.model(**attrs) for _, attrs in valid]
+        # Rows replace every writable field, so an omitted field with a
+        # model default is reset to that default.
+        update_fields = [
+            field for field in self._attributes(self.serializer_class().fields)
+            if field not in self._key_attnames()
+        ]
+        with transaction.atomic():
+            self.model.objects.bulk_create(
+                instances,
+                update_conflicts=True,
+                unique_fields=self.unique_fields,
+                update_fields=update_fields,
+            )
+            if self.after_batch:
+                self.after_batch(instances)
+
+        updated = sum(1 for _, attrs in valid if self._key(attrs) in existing)
+        result['updated'] += updated
+        result['created'] += len(valid) - updated
+
+    def _attributes(self, validated_data):
+        return {
+            f'{name}_id' if name in self.related else name: value
+            for name, value in validated_data.items()
+        }
+
+    def _key_attnames(self):
+        return [self.model._meta.get_field(name).attname for name in self.unique_fields]
+
+    def _key(self, attrs):
+        return tuple(attrs[name] for name in self._key_attnames())
+
+    def _check_related(self, valid, errors):
+        missing = {}
+        for name, model in self.related.items():
+            wanted = {attrs[f'{name}_id'] for _, attrs in valid}
+            found = set(model.objects.filter(pk__in=wanted).values_list('pk', flat=True))
+            missing[name] = wanted - found
+        kept = []
+        for index, attrs in valid:
+            bad = {name: [f'Invalid pk "{attrs[f"{name}_id"]}" - object does not exist.']
+                   for name, ids in missing.items() if attrs[f'{name}_id'] in ids}
+            if bad:
+                errors.append({'row': index, 'errors': bad})
+            else:
+                kept.append((index, attrs))
+        return kept
+
+    def _check_unique(self, valid, errors):
+        # A key may appear once per batch, and the other unique fields must
+        # not belong to a different existing row.
+        taken = {}
+        for field in self.also_unique:
+            values = [attrs[field] for _, attrs in valid]
+            taken[field] = {
+                row[0]: row[1:]
+                for row in self.model.objects.filter(**{f'{field}__in': values})
+                .values_list(field, *self._key_attnames())
+            }
+
+        kept, seen = [], {}
+        for index, attrs in valid:
+            key = self._key(attrs)
+            if key in seen:
+                errors.append({'row': index, 'errors': {'non_field_errors': [
+                    f'Duplicate of row {seen[key]} in the same request.']}})
+                continue
+            clash = next((field for field in self.also_unique
+                          if taken[field].get(attrs[field], key) != key), None)
+            if clash:
+                errors.append({'row': index, 'errors': {clash: [
+                    f'{self.model._meta.verbose_name} with this {clash} already exists.']}})
+                continue
+            seen[key] = index
+            for field in self.also_unique:
+                taken[field][attrs[field]] = key
+            kept.append((index, attrs))
+        return kept
+
+    def _existing_keys(self, valid):
+        attnames = self._key_attnames()
+        lookups = {
+            f'{attname}__in': {attrs[attname] for _, attrs in valid}
+            for attname in attnames
+        }
+        return set(self.model.objects.filter(**lookups).values_list(*attnames))
@@ -0,0 +1,86 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponseNotModified
+from django.utils.http import parse_etags
+from rest_framework.response import Response
+
+# Reference data (brands, categories, units, locations, expense categories)
+# changes rarely and every till fetches it. Each model has a version counter,
+# bumped by core.signals when a row is saved or deleted. Responses are cached
+# and tagged by (model version, URL), so a till that already has the current
+# data gets a 304 without the database being touched.
+
+
+def _cache():
+    return caches[getattr(settings, 'CATALOG_CACHE_ALIAS', 'default')]
+
+
+def _version_key(model):
+    return f'catalog:version:{model._meta.label_lower}'
+
+
+def _seed():
+    # Counters start from the clock, so a cache that loses them can never
+    # hand out a version, and with it an ETag, that was used before.
+    return time.time_ns()
+
+
+def version(model):
+    return _cache().get_or_set(_version_key(model), _seed, timeout=None)
+
+
+def bump(model):
+    cache = _cache()
+    try:
+        cache.incr(_version_key(model))
+    except ValueError:
+        cache.set(_version_key(model), _seed(), timeout=None)
+
+
+def _tag(model, request):
+    query = sorted((key, value) for key, values in request.query_params.lists()
+                   for value in values)
+    # Paginated responses embed absolute links, so the host is part of the key.
+    url = f'{request.scheme}://{request.get_host()}{request.path}?{query}'
+    digest = hashlib.sha1(f'{version(model)}:{url}'.encode()).hexdigest()
+    return f'catalog:{model._meta.label_lower}:{digest}', f'"{digest}"'
+
+
+def respond(view, request, render):
+    """
+    Serve a GET from the cache, or 304 when the client's ETag is current.
+    ``render`` builds the response on a miss; only 200 JSON responses are
+    stored.
+    """
+    if request.accepted_renderer.format != 'json':
+        return render()
+    key, etag = _tag(view.queryset.model, request)
+    if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+
+    cache = _cache()
+    data = cache.get(key)
+    if data is not None:
+        return Response(data, headers={'ETag': etag})
+    response = render()
+    if response.status_code == 200:
+        cache.set(key, response.data, getattr(settings, 'CATALOG_CACHE_TIMEOUT', 60 * 60))
+        response['ETag'] = etag
+    return response
+
+
+class CatalogCacheMixin:
+    """list() and retrieve() through respond(); writes are untouched."""
+
+    def list(self, request, *args, **kwargs):
+        return respond(self, request, lambda: super(CatalogCacheMixin, self).list(
+            request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return respond(self, request, lambda: super(CatalogCacheMixin, self).retrieve(
+            request, *args, **kwargs))
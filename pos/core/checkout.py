@@ -0,0 +1,154 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, IntegerField, Max, Value, When
+
+from core.models import (
+    ChangeSequence, InventoryItem, InventoryMovement, Metrics, Product, Receipt, SalesRollup, Stock,
+    StockBalance, Transaction
+)
+
+
+class CheckoutError(ValueError):
+    pass
+
+
+def checkout(cashier, customer, payment_method, paid_amount, lines,
+             receipt_number=None, transaction_id=None, timestamp=None, allow_shortfall=False):
+    """
+    Record a whole basket in one database transaction: the completed
+    Transaction, its Receipt, the stock deductions and the OUT movements.
+
+    ``lines`` is an iterable of ``(product_id, quantity)`` pairs.
+    ``transaction_id`` and ``timestamp`` are given for sales a till recorded
+    offline. Raises CheckoutError (a ValueError) and rolls back on any failure.
+
+    With ``allow_shortfall``, a quantity beyond the unexpired stock does not
+    fail the sale: it is taken from the product's last batch, which goes
+    negative until the next stock count, and ``sale.shortfall`` maps each such
+    product id to the quantity.
+    """
+    quantities = defaultdict(int)
+    for product_id, quantity in lines:
+        quantities[product_id] += quantity
+
+    with transaction.atomic():
+        # Locked, in pk order, so the stock_quantity read here is the one the
+        # deduction below applies to and the out-of-stock count cannot drift.
+        products = Product.objects.select_for_update().order_by('pk').in_bulk(list(quantities))
+        missing = set(quantities) - set(products)
+        if missing:
+            raise CheckoutError(f"Unknown product(s): {sorted(missing)}")
+
+        total = sum((products[pk].price * qty for pk, qty in quantities.items()),
+                    Decimal('0.00'))
+        paid_amount = Decimal(paid_amount)
+        if paid_amount < total:
+            raise CheckoutError(f"Paid amount {paid_amount} is less than total {total}")
+
+        # One locking query for the whole basket, returning only the batches
+        # the sale draws from, first expiry first.
+        items = defaultdict(list)
+        for item in InventoryItem.fefo_batches(quantities):
+            items[item.product_id].append(item)
+
+        allocations = []
+        shortfall = {}
+        for product_id, wanted in quantities.items():
+            for item in items[product_id]:
+                if not wanted:
+                    break
+                taken = min(item.quantity, wanted)
+                item.quantity -= taken
+                wanted -= taken
+                allocations.append((item, taken))
+            if wanted and not allow_shortfall:
+                raise CheckoutError(
+                    f"Insufficient unexpired stock for product {product_id}: "
+                    f"short by {wanted}")
+            if wanted:
+                shortfall[product_id] = wanted
+
+        if shortfall:
+            # The goods were already handed over, so the rest comes out of the
+            # batch drawn last, or the newest batch when none was drawn.
+            undrawn = [pk for pk in shortfall if not items[pk]]
+            if undrawn:
+                newest = InventoryItem.objects.filter(product_id__in=undrawn).values(
+                    'product_id').annotate(newest=Max('pk')).values('newest')
+                for item in InventoryItem.objects.select_for_update().filter(pk__in=newest):
+                    items[item.product_id].append(item)
+            for product_id, wanted in shortfall.items():
+                if not items[product_id]:
+                    raise CheckoutError(f"No stock batch to sell product {product_id} from")
+                item = items[product_id][-1]
+                item.quantity -= wanted
+                allocations.append((item, wanted))
+
+        sale = Transaction.objects.create(
+            customer=customer,
+            cashier=cashier,
+            payment_method=payment_method,
+            total_amount=total,
+            paid_amount=paid_amount,
+            change_amount=paid_amount - total,
+            is_completed=True,
+            **({'transaction_id': transaction_id} if transaction_id else {}),
+        )
+        if timestamp is not None:
+            # timestamp is auto_now_add, so the time of sale is set afterwards.
+            Transaction.objects.filter(pk=sale.pk).update(timestamp=timestamp)
+            sale.timestamp = timestamp
+        if receipt_number:
+            # A number from the till may already be taken; keep the error a
+            # CheckoutError rather than a failed transaction.
+            try:
+                with transaction.atomic():
+                    receipt = Receipt.objects.create(receipt_number=receipt_number,
+                                                     transaction=sale)
+            except IntegrityError:
+                raise CheckoutError(f"Receipt number {receipt_number} is already used")
+        else:
+            receipt = Receipt.objects.create(receipt_number=sale.transaction_id.hex,
+                                             transaction=sale)
+
+        InventoryItem.objects.bulk_update({item.pk: item for item, _ in allocations}.values(),
+                                          ['quantity'])
+        # bulk_update bypasses InventoryItem.save(), so move the product
+        # counters here in a single UPDATE.
+        deduction = Case(
+            *[When(pk=pk, then=Value(qty)) for pk, qty in quantities.items()],
+            output_field=IntegerField(),
+        )
+        Product.objects.filter(pk__in=quantities).update(
+            available_quantity=F('available_quantity') - deduction,
+            stock_quantity=F('stock_quantity') - deduction,
+        )
+        # Products whose stock reaches zero, less those it leaves.
+        Metrics.adjust(out_of_stock_products=sum(
+            (products[pk].stock_quantity == qty) - (products[pk].stock_quantity == 0)
+            for pk, qty in quantities.items()))
+        ChangeSequence.stamp(
+            Product.objects.filter(pk__in=quantities),
+            InventoryItem.objects.filter(pk__in=[item.pk for item, _ in allocations]),
+        )
+        movements = InventoryMovement.objects.bulk_create([
+            InventoryMovement(
+                product_id=item.product_id,
+                movement_type='OUT',
+                quantity=taken,
+                reference_number=receipt.receipt_number,
+                from_location_id=item.location_id,
+                performed_by=cashier,
+            )
+            for item, taken in allocations
+        ])
+        # bulk_update and bulk_create skip InventoryItem.save() and
+        # InventoryMovement.save(), which keep these projections current.
+        StockBalance.apply(movements)
+        Stock.record_movements(movements)
+        SalesRollup.record(sale)
+
+    sale.shortfall = shortfall
+    return sale, receipt
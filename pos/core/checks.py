@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+
+# Caches invalidated by bumping a counter. A change made in one worker only
+# reaches the others if the cache behind the alias is shared between them.
+SHARED_CACHE_SETTINGS = {
+    'BARCODE_CACHE_ALIAS': None,
+    'PRICING_CACHE_ALIAS': 'default',
+    'CATALOG_CACHE_ALIAS': 'default',
+}
+
+
+@checks.register(checks.Tags.caches, deploy=True)
+def check_shared_caches(app_configs, **kwargs):
+    errors = []
+    for setting, default in SHARED_CACHE_SETTINGS.items():
+        alias = getattr(settings, setting, default)
+        if alias is None:
+            message = f"{setting} is None, so invalidation stays in one worker."
+        elif isinstance(caches[alias], LocMemCache):
+            message = (f"{setting} points at the local-memory cache '{alias}', "
+                       f"so invalidation stays in one worker.")
+        else:
+            continue
+        errors.append(checks.Warning(
+            message,
+            hint="Point it at a cache shared by every worker (file-based, Redis or Memcached).",
+            id='core.W001',
+        ))
+    return errors
@@ -0,0 +1,230 @@
+import csv
+import importlib.util
+import json
+import os
+import tempfile
+from datetime import date, datetime, time
+from decimal import Decimal
+from uuid import UUID
+
+from django.core.files import File
+from django.http import StreamingHttpResponse
+from django.db.models import DecimalField, ExpressionWrapper, F, Value
+from django.utils import timezone
+
+from core.models import CreditPayment, InventoryMovement, Transaction
+
+CHUNK_SIZE = 2000
+
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+
+
+def _period(report, field):
+    tz = timezone.get_current_timezone()
+    return {
+        f'{field}__gte': datetime.combine(report.start_date, time.min, tzinfo=tz),
+        f'{field}__lte': datetime.combine(report.end_date, time.max, tzinfo=tz),
+    }
+
+
+def _sales(report):
+    columns = ['transaction_id', 'timestamp', 'customer', 'cashier', 'payment_method',
+               'total_amount', 'paid_amount', 'change_amount']
+    queryset = Transaction.objects.filter(
+        is_completed=True, **_period(report, 'timestamp')
+    ).exclude(receipt__void_status=True).order_by('timestamp', 'id')
+    return columns, queryset.values_list(
+        'transaction_id', 'timestamp', 'customer_id', 'cashier_id', 'payment_method',
+        'total_amount', 'paid_amount', 'change_amount')
+
+
+def _inventory(report):
+    columns = ['id', 'timestamp', 'product', 'sku', 'movement_type', 'quantity',
+               'from_location', 'to_location', 'reference_number', 'performed_by']
+    queryset = InventoryMovement.objects.filter(
+        **_period(report, 'timestamp')).order_by('timestamp', 'id')
+    return columns, queryset.values_list(
+        'id', 'timestamp', 'product_id', 'product__sku', 'movement_type', 'quantity',
+        'from_location_id', 'to_location_id', 'reference_number', 'performed_by_id')
+
+
+def _credit(report):
+    columns = ['id', 'payment_date', 'customer_credit', 'customer', 'amount',
+               'reference_number', 'received_by']
+    queryset = CreditPayment.objects.filter(
+        **_period(report, 'payment_date')).order_by('payment_date', 'id')
+    return columns, queryset.values_list(
+        'id', 'payment_date', 'customer_credit_id', 'customer_credit__customer_id',
+        'amount', 'reference_number', 'received_by_id')
+
+
+def _sold_lines(report):
+    # Sales lines are the OUT movements written by checkout, valued at the
+    # product's current price and cost.
+    return InventoryMovement.objects.filter(
+        movement_type='OUT', **_period(report, 'timestamp')
+    ).order_by('timestamp', 'id')
+
+
+def _profit(report):
+    columns = ['timestamp', 'reference_number', 'product', 'sku', 'quantity',
+               'revenue', 'cost', 'profit']
+    queryset = _sold_lines(report).annotate(
+        revenue=ExpressionWrapper(F('quantity') * F('product__price'), output_field=MONEY),
+        cost=ExpressionWrapper(F('quantity') * F('product__cost_price'), output_field=MONEY),
+    ).annotate(
+        profit=ExpressionWrapper(F('revenue') - F('cost'), output_field=MONEY),
+    )
+    return columns, queryset.values_list(
+        'timestamp', 'reference_number', 'product_id', 'product__sku', 'quantity',
+        'revenue', 'cost', 'profit')
+
+
+def _tax(report):
+    columns = ['timestamp', 'reference_number', 'product', 'sku', 'quantity',
+               'taxable_amount', 'tax_rate', 'tax']
+    queryset = _sold_lines(report).annotate(
+        taxable_amount=ExpressionWrapper(F('quantity') * F('product__price'), output_field=MONEY),
+    ).annotate(
+        tax=ExpressionWrapper(
+            F('taxable_amount') * F('product__tax_rate') / Value(Decimal('100')),
+            output_field=MONEY),
+    )
+    return columns, queryset.values_list(
+        'timestamp', 'reference_number', 'product_id', 'product__sku', 'quantity',
+        'taxable_amount', 'product__tax_rate', 'tax')
+
+
+REPORT_QUERIES = {
+    'SALES': _sales,
+    'INVENTORY': _inventory,
+    'CREDIT': _credit,
+    'PROFIT': _profit,
+    'TAX': _tax,
+}
+
+
+def report_rows(report):
+    """Return the column names and a lazy values_list queryset for a Report."""
+    return REPORT_QUERIES[report.report_type](report)
+
+
+def _plain(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (Decimal, UUID)):
+        return str(value)
+    return value
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def stream_csv(columns, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for row in rows.iterator(chunk_size=CHUNK_SIZE):
+        yield writer.writerow([_plain(value) for value in row])
+
+
+def stream_ndjson(columns, rows):
+    for row in rows.iterator(chunk_size=CHUNK_SIZE):
+        yield json.dumps(dict(zip(columns, map(_plain, row)))) + '\n'
+
+
+def write_parquet(columns, rows, path):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    try:
+        chunk = []
+        for row in rows.iterator(chunk_size=CHUNK_SIZE):
+            chunk.append([_plain(value) for value in row])
+            if len(chunk) == CHUNK_SIZE:
+                writer = _write_row_group(pa, pq, writer, columns, chunk, path)
+                chunk = []
+        if chunk or writer is None:
+            writer = _write_row_group(pa, pq, writer, columns, chunk, path)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def _write_row_group(pa, pq, writer, columns, chunk, path):
+    table = pa.table({name: [row[i] for row in chunk] for i, name in enumerate(columns)})
+    if writer is None:
+        writer = pq.ParquetWriter(path, table.schema)
+    writer.write_table(table.cast(writer.schema))
+    return writer
+
+
+STREAMS = {
+    'csv': ('text/csv', stream_csv),
+    'ndjson': ('application/x-ndjson', stream_ndjson),
+}
+
+FILE_FORMATS = ('csv', 'ndjson', 'parquet')
+
+
+def streaming_response(filename, columns, rows, file_format='csv'):
+    """Stream ``rows`` as CSV or NDJSON; raises ValueError for other formats."""
+    if file_format not in STREAMS:
+        raise ValueError(f"Unsupported export format: {file_format}")
+    content_type, stream = STREAMS[file_format]
+    response = StreamingHttpResponse(stream(columns, rows), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{file_format}"'
+    return response
+
+
+def check_file_format(file_format):
+    """Raise ValueError unless report files can be written as ``file_format`` here."""
+    if file_format not in FILE_FORMATS:
+        raise ValueError(f"Unsupported export format: {file_format}")
+    if file_format == 'parquet' and importlib.util.find_spec('pyarrow') is None:
+        raise ValueError("Parquet export requires pyarrow to be installed")
+
+
+class _Counted:
+    """Wraps a queryset and counts the rows the writers take from it."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.count = 0
+
+    def iterator(self, chunk_size):
+        for row in self.rows.iterator(chunk_size=chunk_size):
+            self.count += 1
+            yield row
+
+
+def write_report_file(report, file_format='csv'):
+    """
+    Write the report's rows to ``report.file_path`` and store a row count in
+    ``report.file_job``, leaving ``report.results`` as it was. Rows go through
+    a temporary file, so memory use does not depend on the number of rows.
+    """
+    check_file_format(file_format)
+    columns, rows = report_rows(report)
+    rows = _Counted(rows)
+
+    fd, path = tempfile.mkstemp(suffix=f'.{file_format}')
+    os.close(fd)
+    try:
+        if file_format == 'parquet':
+            write_parquet(columns, rows, path)
+        else:
+            with open(path, 'w', newline='', encoding='utf-8') as out:
+                out.writelines(STREAMS[file_format][1](columns, rows))
+        name = f'{report.report_type.lower()}-{report.start_date}-{report.end_date}.{file_format}'
+        with open(path, 'rb') as out:
+            report.file_path.save(name, File(out), save=False)
+    finally:
+        os.remove(path)
+
+    report.file_job = {'status': 'COMPLETED', 'row_count': rows.count, 'columns': columns,
+                       'format': file_format}
+    report.save(update_fields=['file_path', 'file_job'])
+    return report
@@ -0,0 +1,87 @@
+import functools
+import hashlib
+import json
+import zlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from core.models import IdempotentResponse
+
+HEADER = 'Idempotency-Key'
+
+
+def _digests(request, key):
+    # Keys are per user and per URL, so two tills or two actions never share one.
+    scope = f'{request.user.pk}\n{request.method}\n{request.path}\n{key}'
+    payload = json.dumps(request.data, sort_keys=True, default=str)
+    return (hashlib.sha256(scope.encode()).digest(),
+            hashlib.sha256(payload.encode()).digest()[:16])
+
+
+def _replay(stored, request_hash):
+    if bytes(stored.request_hash) != request_hash:
+        return Response({'error': f'{HEADER} was already used for a different request'},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+    data = json.loads(zlib.decompress(stored.body)) if stored.body else None
+    return Response(data, status=stored.status_code, headers={'Idempotent-Replayed': 'true'})
+
+
+def _stored(key):
+    return IdempotentResponse.objects.filter(key=key, expires_at__gt=timezone.now()).only(
+        'request_hash', 'status_code', 'body').first()
+
+
+def idempotent(view):
+    """
+    Make a POST action safe to retry. When the request has an
+    Idempotency-Key header, the first request with that key runs the action
+    and its response is stored; later ones get the stored response back
+    without the action running or its tables being read.
+
+    The key is claimed in the same transaction as the action, so of two
+    concurrent requests the second waits on the claim and then replays the
+    first one's response. A response of 500 or above is not stored: the
+    action is rolled back and the key can be retried.
+    """
+    @functools.wraps(view)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view(self, request, *args, **kwargs)
+        if len(key) > 255:
+            return Response({'error': f'{HEADER} is limited to 255 characters'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        key, request_hash = _digests(request, key)
+        stored = _stored(key)
+        if stored is not None:
+            return _replay(stored, request_hash)
+
+        ttl = timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL', 24 * 60 * 60))
+        with transaction.atomic():
+            now = timezone.now()
+            try:
+                with transaction.atomic():
+                    IdempotentResponse.objects.filter(key=key, expires_at__lte=now).delete()
+                    claim = IdempotentResponse.objects.create(
+                        key=key, request_hash=request_hash, status_code=0, body=b'',
+                        expires_at=now + ttl)
+            except IntegrityError:
+                claim = None
+            if claim is not None:
+                response = view(self, request, *args, **kwargs)
+                if response.status_code >= 500:
+                    transaction.set_rollback(True)
+                    return response
+                body = JSONRenderer().render(response.data) if response.data is not None else b''
+                IdempotentResponse.objects.filter(pk=claim.pk).update(
+                    status_code=response.status_code, body=zlib.compress(body) if body else b'')
+                return response
+        # Another request with this key committed first.
+        return _replay(_stored(key), request_hash)
+    return wrapper
@@ -0,0 +1,42 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import UserActivity, UserActivityArchive
+
+
+class Command(BaseCommand):
+    help = (
+        "Move UserActivity rows older than the retention period to "
+        "UserActivityArchive, oldest first, one batch per transaction. Keeps "
+        "the live table, and searches on its details, small."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-days', type=int,
+                            default=getattr(settings, 'ACTIVITY_RETENTION_DAYS', 90))
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['keep_days'])
+        old = UserActivity.objects.filter(timestamp__lt=cutoff).order_by('timestamp', 'id')
+        moved = 0
+        while True:
+            rows = list(old.values(
+                'id', 'user_id', 'activity_type', 'timestamp', 'details', 'ip_address'
+            )[:options['batch_size']])
+            if not rows:
+                break
+            with transaction.atomic():
+                UserActivityArchive.objects.bulk_create(
+                    [UserActivityArchive(
+                        month=timezone.localdate(row['timestamp']).replace(day=1), **row)
+                     for row in rows],
+                    ignore_conflicts=True,
+                )
+                UserActivity.objects.filter(pk__in=[row['id'] for row in rows]).delete()
+            moved += len(rows)
+        self.stdout.write(self.style.SUCCESS(f"Archived {moved} activity record(s)"))
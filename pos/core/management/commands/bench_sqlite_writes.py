@@ -0,0 +1,135 @@
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import django
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+MODES = {
+    # Django's defaults: rollback journal, deferred transactions.
+    'default': ({}, False),
+    'tuned': ({'init_command': ';'.join(getattr(settings, 'SQLITE_PRAGMAS', [])),
+               'transaction_mode': 'IMMEDIATE', 'timeout': 20}, False),
+    'queued': ({'init_command': ';'.join(getattr(settings, 'SQLITE_PRAGMAS', [])),
+                'transaction_mode': 'IMMEDIATE', 'timeout': 20}, True),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure sustained short write transactions per second against a scratch "
+        "SQLite copy of the schema, with processes x threads writers standing in "
+        "for gunicorn workers, under Django's default SQLite settings, the tuned "
+        "pragmas, and the tuned pragmas plus the group-commit write queue."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=4)
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--duration', type=float, default=10)
+        parser.add_argument('--mode', choices=[*MODES, 'all'], default='all')
+        parser.add_argument('--json', dest='json_path',
+                            help="Also write the results to this file as JSON.")
+
+    def handle(self, *args, **options):
+        if connections['default'].vendor != 'sqlite':
+            raise CommandError("This benchmark only applies to SQLite.")
+        modes = list(MODES) if options['mode'] == 'all' else [options['mode']]
+
+        workdir = tempfile.mkdtemp(prefix='pos-bench-')
+        try:
+            template = os.path.join(workdir, 'template.sqlite3')
+            self._create_template(template)
+            results = {}
+            for mode in modes:
+                path = os.path.join(workdir, f'{mode}.sqlite3')
+                shutil.copy(template, path)
+                results[mode] = self._run(mode, path, options)
+                self.stdout.write(
+                    f"{mode:>8}: {results[mode]['writes_per_sec']:.0f} writes/s, "
+                    f"{results[mode]['errors']} errors "
+                    f"({options['processes']} processes x {options['threads']} threads)"
+                )
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as out:
+                json.dump(results, out, indent=2)
+
+    def _create_template(self, path):
+        _use_database(path, {})
+        call_command('migrate', verbosity=0)
+        from core.models import CustomUser
+        CustomUser.objects.create(username='bench')
+        connections['default'].close()
+
+    def _run(self, mode, path, options):
+        context = multiprocessing.get_context('spawn')
+        with context.Pool(options['processes'], initializer=django.setup) as pool:
+            counts = pool.starmap(_writer_process, [
+                (path, mode, options['threads'], options['duration'])
+            ] * options['processes'])
+        writes = sum(count[0] for count in counts)
+        return {
+            'writes': writes,
+            'errors': sum(count[1] for count in counts),
+            'writes_per_sec': writes / options['duration'],
+            'processes': options['processes'],
+            'threads': options['threads'],
+        }
+
+
+def _use_database(path, db_options):
+    # Connections of every thread are built from this dict.
+    connections['default'].close()
+    connections.settings['default'].update(NAME=path, OPTIONS=db_options)
+
+
+def _writer_process(path, mode, threads, duration):
+    from django.db import OperationalError, transaction
+
+    from core import write_queue
+    from core.models import CustomUser, UserActivity
+
+    db_options, queued = MODES[mode]
+    _use_database(path, db_options)
+    settings.SQLITE_WRITE_QUEUE = queued
+    user_id = CustomUser.objects.values_list('pk', flat=True).get(username='bench')
+    connections['default'].close()
+
+    def write():
+        with transaction.atomic():
+            UserActivity.objects.create(user_id=user_id, activity_type='BENCH',
+                                        details='benchmark write', ip_address='127.0.0.1')
+
+    counts = [0, 0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def loop():
+        done = errors = 0
+        while time.monotonic() < deadline:
+            try:
+                write_queue.run(write)
+                done += 1
+            except OperationalError:
+                errors += 1
+        connections['default'].close()
+        with lock:
+            counts[0] += done
+            counts[1] += errors
+
+    workers = [threading.Thread(target=loop) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return counts
@@ -0,0 +1,134 @@
+import json
+import subprocess
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.bench import tills
+from core.bench.data import generate, scratch_database
+from core.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = (
+        "Simulate a store's tills (scan, price, checkout, print receipt and the "
+        "odd void or return) and report baskets/s, p50/p95/p99 latency per step "
+        "and time spent waiting for the database write lock. --target wsgi or "
+        "asgi runs the handler in-process against a scratch SQLite database "
+        "filled by core.bench.data. An http:// URL targets a running server that "
+        "shares this project's database; fill it with generate_bench_data first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', default='wsgi',
+                            help="wsgi, asgi, or the base URL of a running server.")
+        parser.add_argument('--tills', type=int, default=8)
+        parser.add_argument('--duration', type=float, default=30)
+        parser.add_argument('--scale', type=int, default=1,
+                            help="Volume of the scratch data for in-process targets.")
+        parser.add_argument('--use-current-db', action='store_true',
+                            help="Run in-process targets against the configured database.")
+        parser.add_argument('--username', default='bench',
+                            help="User the tills log in as.")
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--void-rate', type=float, default=0.02)
+        parser.add_argument('--return-rate', type=float, default=0.01)
+        parser.add_argument('--json', dest='json_path',
+                            help="Write the results to this file as JSON.")
+        parser.add_argument('--baseline',
+                            help="A JSON file from an earlier run to compare against.")
+
+    def handle(self, *args, **options):
+        target = options['target']
+        remote = target.startswith(('http://', 'https://'))
+        if not remote and target not in ('wsgi', 'asgi'):
+            raise CommandError("--target must be wsgi, asgi or an http:// URL")
+
+        scratch = not remote and not options['use_current_db']
+        with scratch_database() if scratch else nullcontext():
+            if scratch:
+                self.stdout.write(f"Generating scratch data at scale {options['scale']}...")
+                user = generate(options['scale'], batch_quantity=10000,
+                                username=options['username'])
+            else:
+                user = CustomUser.objects.filter(username=options['username']).first()
+                if user is None:
+                    raise CommandError(f"No user {options['username']!r}; "
+                                       "run generate_bench_data first.")
+            result = self._run(target, user, options)
+
+        result = {
+            'commit': _commit(),
+            'started_at': timezone.now().isoformat(),
+            'target': target,
+            'scale': options['scale'] if scratch else None,
+            **result,
+        }
+        self._print(result)
+        if options['baseline']:
+            with open(options['baseline']) as baseline:
+                self._compare(json.load(baseline), result)
+        if options['json_path']:
+            with open(options['json_path'], 'w') as out:
+                json.dump(result, out, indent=2)
+
+    def _run(self, target, user, options):
+        catalog = tills.Catalog.load(user)
+        count, duration = options['tills'], options['duration']
+        if target == 'wsgi':
+            before = tills.local_lock_wait()
+            transports = [tills.InProcessTransport(user) for _ in range(count)]
+            stats, elapsed = tills.run_threads(transports, catalog, duration, options)
+            after = tills.local_lock_wait()
+        elif target == 'asgi':
+            before = tills.local_lock_wait()
+            transports = [tills.AsgiTransport(user) for _ in range(count)]
+            stats, elapsed = tills.run_async(transports, catalog, duration, options)
+            after = tills.local_lock_wait()
+        else:
+            session_key, csrf_token = tills.http_login(user)
+            before = tills.http_lock_wait(target)
+            transports = [tills.HttpTransport(target, session_key, csrf_token)
+                          for _ in range(count)]
+            stats, elapsed = tills.run_threads(transports, catalog, duration, options)
+            after = tills.http_lock_wait(target)
+
+        lock_wait = None
+        if before is not None and after is not None:
+            lock_wait = (after[0] - before[0], after[1] - before[1])
+        return tills.summarize(stats, elapsed, count, lock_wait)
+
+    def _print(self, result):
+        self.stdout.write(
+            f"{result['target']}: {result['tills']} tills, {result['baskets']} baskets in "
+            f"{result['duration_s']} s = {result['baskets_per_s']:.1f} baskets/s, "
+            f"{result['requests_per_s']:.1f} req/s, statuses {result['statuses']}")
+        for step, row in result['steps'].items():
+            self.stdout.write(
+                f"  {step:>8}: {row['requests']:>6} requests, {row['errors']} errors, "
+                f"p50 {row['p50_ms']:.1f} ms, p95 {row['p95_ms']:.1f} ms, "
+                f"p99 {row['p99_ms']:.1f} ms")
+        lock_wait = result['lock_wait']
+        if lock_wait is None:
+            self.stdout.write("  lock wait: not available (is /api/_metrics reachable?)")
+        else:
+            self.stdout.write(
+                f"  lock wait: {lock_wait['total_s'] * 1000:.0f} ms total, "
+                f"{lock_wait['per_basket_ms']:.2f} ms per basket")
+
+    def _compare(self, baseline, result):
+        def ratio(key):
+            return result[key] / baseline[key] if baseline.get(key) else float('nan')
+
+        self.stdout.write(
+            f"vs {baseline.get('commit') or 'baseline'}: baskets/s x{ratio('baskets_per_s'):.2f}, "
+            f"p95 x{ratio('p95_ms'):.2f}, p99 x{ratio('p99_ms'):.2f}")
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.bench.data import generate
+from core.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the configured database with synthetic rows for every model, for "
+        "running bench_tills against a local server. Use an empty database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=1,
+                            help="Multiplies the volumes: 200 products, 2k inventory items "
+                                 "and 20k movements per step.")
+        parser.add_argument('--batch-quantity', type=int, default=10000,
+                            help="Units in each inventory batch.")
+        parser.add_argument('--username', default='bench')
+        parser.add_argument('--password', default='bench')
+
+    def handle(self, *args, **options):
+        if CustomUser.objects.filter(username=options['username']).exists():
+            raise CommandError(f"User {options['username']!r} already exists; "
+                               "benchmark data goes into an empty database.")
+        generate(options['scale'], options['batch_quantity'], options['username'],
+                 options['password'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated benchmark data at scale {options['scale']} "
+            f"for user {options['username']!r}"))
@@ -0,0 +1,144 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, models, transaction
+from django.urls import NoReverseMatch, reverse
+from rest_framework.test import APIClient
+
+from core.models import CustomUser
+from pos.urls import router
+
+
+# Unfiltered lists walk the primary key under a LIMIT, so only queries with a
+# WHERE clause are checked.
+SCAN_PATTERNS = {
+    'sqlite': re.compile(r'^SCAN (?!.*USING (COVERING INDEX|INDEX|INTEGER PRIMARY KEY))'),
+    'postgresql': re.compile(r'Seq Scan'),
+    'mysql': re.compile(r'\bALL\b'),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "EXPLAIN the queries behind every registered list endpoint, its "
+        "filterset_fields and its GET actions, and flag full table scans."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fail-on-scan', action='store_true',
+            help="Exit non-zero when any query needs a full table scan.",
+        )
+        parser.add_argument(
+            '--verbose-plans', action='store_true',
+            help="Print the plan of every query, not only the flagged ones.",
+        )
+
+    def handle(self, *args, **options):
+        pattern = SCAN_PATTERNS.get(connection.vendor)
+        if pattern is None:
+            raise CommandError(f"Unsupported database vendor: {connection.vendor}")
+
+        # The test client's default host, testserver, is not in ALLOWED_HOSTS.
+        client = APIClient(SERVER_NAME='localhost')
+        client.force_authenticate(CustomUser(username='index-advisor', is_superuser=True))
+
+        flagged = []
+        captured = 0
+        for name, path, params in self._requests():
+            explained = self._explain(client, name, path, params)
+            captured += len(explained)
+            for sql, plan in explained:
+                scans = [row for row in plan if pattern.search(row)]
+                if scans:
+                    flagged.append(name)
+                    self.stdout.write(self.style.WARNING(f"{name}: full scan"))
+                if scans or options['verbose_plans']:
+                    self.stdout.write(f"  {sql}")
+                    for row in plan:
+                        self.stdout.write(f"    {row}")
+
+        if not captured:
+            raise CommandError("No filtered queries were captured; nothing was checked")
+        if flagged:
+            message = f"{len(set(flagged))} endpoint(s) with full table scans"
+            if options['fail_on_scan']:
+                raise CommandError(message)
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS("No full table scans found"))
+
+    def _requests(self):
+        for prefix, viewset, basename in router.registry:
+            if hasattr(viewset, 'list'):
+                yield from self._list_requests(prefix, viewset, basename)
+
+            for extra in viewset.get_extra_actions():
+                if 'get' not in extra.mapping:
+                    continue
+                kwargs = {}
+                if extra.detail:
+                    kwargs['pk'] = viewset.queryset.values_list('pk', flat=True).first() or 1
+                try:
+                    url = reverse(f'{basename}-{extra.url_name}', kwargs=kwargs)
+                except NoReverseMatch:
+                    continue
+                yield f'{prefix} {extra.url_name}', url, {}
+
+    def _list_requests(self, prefix, viewset, basename):
+        list_url = reverse(f'{basename}-list')
+        yield f'{prefix} list', list_url, {}
+
+        filterset_fields = getattr(viewset, 'filterset_fields', None) or []
+        for field_name in filterset_fields:
+            model_field = viewset.queryset.model._meta.get_field(field_name)
+            params = {field_name: self._sample_value(model_field)}
+            yield f'{prefix} list ?{field_name}', list_url, params
+        if len(filterset_fields) > 1:
+            model = viewset.queryset.model
+            params = {f: self._sample_value(model._meta.get_field(f)) for f in filterset_fields}
+            yield f'{prefix} list ?{"&".join(filterset_fields)}', list_url, params
+
+    def _sample_value(self, field):
+        if field.choices:
+            return field.choices[0][0]
+        if isinstance(field, models.BooleanField):
+            return 'true'
+        if isinstance(field, (models.ForeignKey, models.IntegerField, models.AutoField)):
+            return 1
+        if isinstance(field, models.DateField):
+            return '2000-01-01'
+        return 'x'
+
+    def _explain(self, client, name, path, params):
+        statements = []
+
+        def capture(execute, sql, sql_params, many, context):
+            if not many and sql.lstrip().upper().startswith('SELECT') and ' WHERE ' in sql:
+                statements.append((sql, sql_params))
+            return execute(sql, sql_params, many, context)
+
+        # GET handlers are not supposed to write, but roll back just in case.
+        with transaction.atomic():
+            with connection.execute_wrapper(capture):
+                response = client.get(path, params)
+            transaction.set_rollback(True)
+        if not 200 <= response.status_code < 300:
+            raise CommandError(f"{name}: GET {path} returned {response.status_code}")
+
+        results = []
+        with connection.cursor() as cursor:
+            for sql, sql_params in statements:
+                cursor.execute(self._explain_prefix() + sql, sql_params)
+                results.append((sql, [self._plan_row(row) for row in cursor.fetchall()]))
+        return results
+
+    def _explain_prefix(self):
+        if connection.vendor == 'sqlite':
+            return 'EXPLAIN QUERY PLAN '
+        return 'EXPLAIN '
+
+    def _plan_row(self, row):
+        if connection.vendor == 'sqlite':
+            return row[-1]
+        return ' '.join(str(col) for col in row)
@@ -0,0 +1,152 @@
+import asyncio
+import json
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+# Sync DRF path and async twin (core/async_views.py) of each hot endpoint.
+ENDPOINTS = {
+    'barcode': ('/api/products/by-barcode/{code}/', '/api/async/products/by-barcode/{code}/'),
+    'stock': ('/api/stock/?search={code}', '/api/async/stock/{code}/'),
+    'discounts': ('/api/discounts/active_discounts/', '/api/async/discounts/active/'),
+    'dashboard': ('/api/metrics/dashboard_summary/', '/api/async/metrics/dashboard-summary/'),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare throughput of the sync (WSGI) and async (ASGI) read endpoints. "
+        "Start both servers first, e.g. "
+        "`gunicorn pos.wsgi -w 4 --threads 8 -b :8000` and "
+        "`uvicorn pos.asgi:application --workers 4 --port 8001`, "
+        "then point --sync-base and --async-base at them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sync-base', default='http://127.0.0.1:8000')
+        parser.add_argument('--async-base', default='http://127.0.0.1:8001')
+        parser.add_argument('--endpoint', choices=ENDPOINTS, default='barcode')
+        parser.add_argument('--code', default='',
+                            help="Barcode or SKU for the barcode and stock endpoints.")
+        parser.add_argument('--connections', type=int, default=500)
+        parser.add_argument('--duration', type=float, default=30,
+                            help="Seconds to run against each server.")
+        parser.add_argument('--header', action='append', default=[],
+                            help='Extra request header, e.g. "Cookie: sessionid=...". Repeatable.')
+        parser.add_argument('--json', dest='json_path',
+                            help="Also write the results to this file as JSON.")
+
+    def handle(self, *args, **options):
+        headers = []
+        for header in options['header']:
+            name, sep, value = header.partition(':')
+            if not sep:
+                raise CommandError(f"Malformed header: {header!r}")
+            headers.append((name.strip(), value.strip()))
+
+        sync_path, async_path = ENDPOINTS[options['endpoint']]
+        results = {}
+        for name, base, path in (('sync', options['sync_base'], sync_path),
+                                 ('async', options['async_base'], async_path)):
+            url = base.rstrip('/') + path.format(code=options['code'])
+            results[name] = asyncio.run(
+                run_load(url, headers, options['connections'], options['duration']))
+            self._print(name, url, results[name])
+
+        if results['sync']['rps']:
+            ratio = results['async']['rps'] / results['sync']['rps']
+            self.stdout.write(f"async/sync throughput: {ratio:.2f}x")
+        if options['json_path']:
+            with open(options['json_path'], 'w') as out:
+                json.dump(results, out, indent=2)
+
+    def _print(self, name, url, result):
+        self.stdout.write(
+            f"{name:>5} {url}\n"
+            f"      {result['requests']} requests, {result['rps']:.1f} req/s, "
+            f"p50 {result['p50_ms']:.1f} ms, p95 {result['p95_ms']:.1f} ms, "
+            f"p99 {result['p99_ms']:.1f} ms, statuses {result['statuses']}, "
+            f"errors {result['errors']}"
+        )
+
+
+async def run_load(url, headers, connections, duration):
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    target = parts.path + (f'?{parts.query}' if parts.query else '')
+    request = ''.join(
+        [f'GET {target} HTTP/1.1\r\nHost: {parts.netloc}\r\nConnection: keep-alive\r\n']
+        + [f'{name}: {value}\r\n' for name, value in headers] + ['\r\n']
+    ).encode()
+
+    latencies, statuses, errors = [], {}, [0]
+    deadline = time.monotonic() + duration
+    started = time.monotonic()
+    await asyncio.gather(*(
+        _client(host, port, request, deadline, latencies, statuses, errors)
+        for _ in range(connections)
+    ))
+    elapsed = time.monotonic() - started
+
+    latencies.sort()
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else 0.0
+
+    return {
+        'url': url,
+        'connections': connections,
+        'duration_s': round(elapsed, 2),
+        'requests': len(latencies),
+        'rps': len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(0.50),
+        'p95_ms': percentile(0.95),
+        'p99_ms': percentile(0.99),
+        'statuses': statuses,
+        'errors': errors[0],
+    }
+
+
+async def _client(host, port, request, deadline, latencies, statuses, errors):
+    reader = writer = None
+    while time.monotonic() < deadline:
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            sent = time.monotonic()
+            writer.write(request)
+            await writer.drain()
+            status, keep_alive = await _read_response(reader)
+            latencies.append(time.monotonic() - sent)
+            statuses[status] = statuses.get(status, 0) + 1
+            if not keep_alive:
+                writer.close()
+                writer = None
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            errors[0] += 1
+            if writer is not None:
+                writer.close()
+            writer = None
+            await asyncio.sleep(0.01)
+    if writer is not None:
+        writer.close()
+
+
+async def _read_response(reader):
+    head = (await reader.readuntil(b'\r\n\r\n')).decode('latin-1').split('\r\n')
+    status = int(head[0].split()[1])
+    fields = {}
+    for line in head[1:]:
+        name, _, value = line.partition(':')
+        fields[name.strip().lower()] = value.strip().lower()
+
+    if fields.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readuntil(b'\r\n')).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.readexactly(int(fields.get('content-length', 0)))
+    return status, fields.get('connection') != 'close' and head[0].startswith('HTTP/1.1')
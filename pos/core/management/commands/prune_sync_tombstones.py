@@ -0,0 +1,35 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Max
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from core.models import ChangeSequence, SyncTombstone
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete sync tombstones older than the retention period. Tills whose "
+        "last sync is older than the newest pruned tombstone get a full "
+        "resync from the changes feed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-days', type=int,
+                            default=getattr(settings, 'SYNC_TOMBSTONE_RETENTION_DAYS', 30))
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['keep_days'])
+        with transaction.atomic():
+            last = SyncTombstone.objects.filter(deleted_at__lt=cutoff).aggregate(
+                last=Max('change_seq'))['last']
+            if last is None:
+                pruned = 0
+            else:
+                pruned, _ = SyncTombstone.objects.filter(change_seq__lte=last).delete()
+                ChangeSequence.objects.filter(pk=1).update(
+                    pruned_through=Greatest(F('pruned_through'), last))
+        self.stdout.write(self.style.SUCCESS(f"Pruned {pruned} tombstone(s)"))
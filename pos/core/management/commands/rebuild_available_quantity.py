@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F
+
+from core.models import ChangeSequence, Product
+
+
+class Command(BaseCommand):
+    help = "Reconcile Product.available_quantity with the sum of its inventory items."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify', action='store_true',
+            help="Only report products whose counter has drifted; exit non-zero if any.",
+        )
+
+    def handle(self, *args, **options):
+        actual = Product.inventory_total()
+
+        drifted = Product.objects.annotate(actual=actual).exclude(
+            available_quantity=F('actual'))
+
+        if options['verify']:
+            rows = list(drifted.values_list('pk', 'available_quantity', 'actual'))
+            for pk, stored, expected in rows:
+                self.stdout.write(f"product {pk}: stored {stored}, actual {expected}")
+            if rows:
+                raise CommandError(f"{len(rows)} product(s) out of sync")
+            self.stdout.write(self.style.SUCCESS("available_quantity is in sync"))
+            return
+
+        with transaction.atomic():
+            pks = list(drifted.values_list('pk', flat=True))
+            updated = Product.objects.filter(pk__in=pks).update(available_quantity=actual)
+            # Tills hold available_quantity too; stamp the rows so they resync.
+            if pks:
+                ChangeSequence.stamp(Product.objects.filter(pk__in=pks))
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt available_quantity for {updated} product(s)"))
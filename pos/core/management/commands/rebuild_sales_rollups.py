@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+
+from core.models import Customer, Metrics, MonthlySales, SalesRollup, Transaction
+
+
+class Command(BaseCommand):
+    help = "Recompute SalesRollup, MonthlySales and the dashboard customer count from scratch."
+
+    def handle(self, *args, **options):
+        sales = Transaction.objects.filter(is_completed=True).exclude(receipt__void_status=True)
+        truncs = {'DAY': TruncDay, 'WEEK': TruncWeek, 'MONTH': TruncMonth}
+
+        with transaction.atomic():
+            SalesRollup.objects.all().delete()
+            rollups = []
+            for period, trunc in truncs.items():
+                rows = sales.annotate(
+                    period_start=trunc('timestamp')
+                ).values('period_start').annotate(
+                    total=Sum('total_amount'), count=Count('id')
+                ).order_by()
+                rollups.extend(
+                    SalesRollup(period=period, period_start=row['period_start'].date(),
+                                total_sales=row['total'], transaction_count=row['count'])
+                    for row in rows
+                )
+            SalesRollup.objects.bulk_create(rollups, batch_size=1000)
+
+            MonthlySales.objects.all().delete()
+            MonthlySales.objects.bulk_create(
+                MonthlySales(month=rollup.period_start.strftime('%Y-%m'),
+                             sales=float(rollup.total_sales))
+                for rollup in rollups if rollup.period == 'MONTH'
+            )
+
+            customers = Customer.objects.count()
+            if not Metrics.objects.update(number_of_customers=customers):
+                Metrics.objects.create(number_of_customers=customers)
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {len(rollups)} sales rollup(s)"))
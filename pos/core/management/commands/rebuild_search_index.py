@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.search import SEARCH_INDEXES, get_backend
+
+
+class Command(BaseCommand):
+    help = "Recreate the full-text search index for products and customers."
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        if backend is None:
+            raise CommandError("No full-text search backend for this database")
+        with transaction.atomic():
+            for model in SEARCH_INDEXES:
+                backend.create_index(model)
+                backend.rebuild(model)
+                self.stdout.write(f"Indexed {model._meta.verbose_name_plural}")
+        self.stdout.write(self.style.SUCCESS("Search index rebuilt"))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from core import stock_ledger
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild StockBalance from the latest stock snapshot plus the inventory "
+        "movements after it, or from the whole movement log with --from-scratch."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from-scratch', action='store_true',
+                            help="Replay every movement instead of starting from the latest snapshot.")
+
+    def handle(self, *args, **options):
+        count = stock_ledger.rebuild_balances(from_scratch=options['from_scratch'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} stock balance(s)"))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from core.models import Stock
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute every Stock valuation row from product prices, inventory "
+        "items and inventory movements with grouped queries. Rows are kept "
+        "current incrementally; run this after bulk imports or to repair drift."
+    )
+
+    def handle(self, *args, **options):
+        count = Stock.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} stock valuation row(s)"))
@@ -0,0 +1,85 @@
+import multiprocessing
+import os
+import signal
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from core.exports import FILE_FORMATS, check_file_format
+from core.scheduler import build_report, claim_due_schedules, claim_pending_reports
+
+
+class Command(BaseCommand):
+    help = (
+        "Run due ReportSchedules and reports queued through the API. Builds "
+        "run in a pool of worker processes; several schedulers can share the "
+        "same database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 2,
+                            help="Number of worker processes building reports.")
+        parser.add_argument('--interval', type=float, default=30,
+                            help="Seconds between checks for due work.")
+        parser.add_argument('--format', default='csv', choices=FILE_FORMATS,
+                            help="File format of scheduled reports.")
+        parser.add_argument('--once', action='store_true',
+                            help="Exit once no work is due.")
+
+    def handle(self, *args, **options):
+        try:
+            check_file_format(options['format'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        workers = options['workers']
+        stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+
+        # Workers are spawned rather than forked so they do not inherit the
+        # parent's database connections, and set Django up before their
+        # first task is unpickled.
+        connections.close_all()
+        context = multiprocessing.get_context('spawn')
+        running = set()
+        with ProcessPoolExecutor(workers, mp_context=context, initializer=django.setup) as pool:
+            try:
+                while not stop.is_set():
+                    # Claim no more than there are idle workers, so the rest
+                    # stays available to other schedulers.
+                    for report_id in self._claim(workers - len(running), options['format']):
+                        running.add(pool.submit(build_report, report_id))
+
+                    if options['once'] and not running:
+                        break
+                    if running:
+                        timeout = None if options['once'] else options['interval']
+                        done, running = wait(running, timeout=timeout,
+                                             return_when=FIRST_COMPLETED)
+                        self._report(done)
+                    else:
+                        stop.wait(options['interval'])
+            except KeyboardInterrupt:
+                pass
+            self._report(wait(running)[0] if running else ())
+
+    def _claim(self, room, file_format):
+        if room <= 0:
+            return []
+        ids = [report.pk for report in claim_due_schedules(room, file_format)]
+        return ids + claim_pending_reports(room - len(ids))
+
+    def _report(self, futures):
+        for future in futures:
+            try:
+                report_id, error = future.result()
+            except Exception as e:
+                # A worker that died takes its report with it; keep the loop going.
+                self.stdout.write(self.style.ERROR(f"Report build failed: {e!r}"))
+                continue
+            if error:
+                self.stdout.write(self.style.ERROR(f"Report {report_id} failed: {error}"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"Report {report_id} written"))
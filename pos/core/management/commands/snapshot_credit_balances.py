@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.models import CreditBalanceSnapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Record every CustomerCredit balance so balance-at-date queries only "
+        "replay ledger entries written since. Run it periodically, e.g. nightly."
+    )
+
+    def handle(self, *args, **options):
+        snapshots = CreditBalanceSnapshot.take()
+        self.stdout.write(self.style.SUCCESS(f"Took {len(snapshots)} credit balance snapshot(s)"))
@@ -0,0 +1,145 @@
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+_current = contextvars.ContextVar('request_stats', default=None)
+
+
+class RequestStats:
+    """SQL and rendering work done while handling one request."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.lock_wait = 0.0
+        self.render_time = 0.0
+
+    def activate(self):
+        return _current.set(self)
+
+    @staticmethod
+    def deactivate(token):
+        _current.reset(token)
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper() hook
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.queries += 1
+            self.db_time += elapsed
+            # With transaction_mode='IMMEDIATE', SQLite takes the write lock
+            # at BEGIN, so time spent there is time queued behind other writers.
+            if sql.startswith('BEGIN'):
+                self.lock_wait += elapsed
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip((*self.buckets, '+Inf'), self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f'{name}_sum{{{labels}}} {self.sum}'
+        yield f'{name}_count{{{labels}}} {self.count}'
+
+
+METRICS = {
+    'pos_request_duration_seconds': ('histogram', "Total time to handle the request.",
+                                     DURATION_BUCKETS),
+    'pos_request_db_seconds': ('histogram', "Time spent executing SQL.", DURATION_BUCKETS),
+    'pos_request_db_lock_wait_seconds': ('histogram', "Time spent waiting for the write lock.",
+                                         DURATION_BUCKETS),
+    'pos_request_render_seconds': ('histogram', "Time spent rendering the response body.",
+                                   DURATION_BUCKETS),
+    'pos_request_queries': ('histogram', "SQL queries executed.", QUERY_BUCKETS),
+    'pos_request_over_budget_total': ('counter', "Requests over the query or time budget.",
+                                      None),
+}
+
+
+class Registry:
+    """In-process metrics per (view, method), rendered in Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {name: {} for name in METRICS}
+
+    def observe(self, view, method, stats, duration, over_budget=False):
+        values = {
+            'pos_request_duration_seconds': duration,
+            'pos_request_db_seconds': stats.db_time,
+            'pos_request_db_lock_wait_seconds': stats.lock_wait,
+            'pos_request_render_seconds': stats.render_time,
+            'pos_request_queries': stats.queries,
+        }
+        key = (view, method)
+        with self._lock:
+            for name, value in values.items():
+                series = self._series[name]
+                if key not in series:
+                    series[key] = Histogram(METRICS[name][2])
+                series[key].observe(value)
+            if over_budget:
+                counters = self._series['pos_request_over_budget_total']
+                counters[key] = counters.get(key, 0) + 1
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for name, (kind, help_text, _) in METRICS.items():
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+                for (view, method), value in sorted(self._series[name].items()):
+                    labels = f'view="{_escape(view)}",method="{method}"'
+                    if kind == 'counter':
+                        lines.append(f'{name}{{{labels}}} {value}')
+                    else:
+                        lines.extend(value.lines(name, labels))
+        return '\n'.join(lines) + '\n'
+
+    def totals(self, name):
+        """(observation count, sum) of a histogram over every view."""
+        with self._lock:
+            series = self._series[name].values()
+            return sum(h.count for h in series), sum(h.sum for h in series)
+
+    def reset(self):
+        with self._lock:
+            for series in self._series.values():
+                series.clear()
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = Registry()
+
+
+def current():
+    """The RequestStats of the request being handled, or None."""
+    return _current.get()
+
+
+def enabled():
+    return getattr(settings, 'REQUEST_METRICS_ENABLED', True)
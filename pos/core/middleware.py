@@ -0,0 +1,97 @@
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from core import activity, metrics
+
+logger = logging.getLogger(__name__)
+
+AUDITED_METHODS = {'POST', 'PUT', 'PATCH', 'DELETE'}
+
+
+class ActivityLogMiddleware:
+    """
+    Records every authenticated write to the API in UserActivity. Records are
+    handed to core.activity's background logger, so the request does not wait
+    for the insert.
+
+    The user is read after the view has run: DRF sets request.user to the
+    user its authentication classes resolved, so token and forced logins are
+    recorded as well as sessions.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        user = getattr(request, 'user', None)
+        if (request.method in AUDITED_METHODS and user is not None and user.is_authenticated
+                and request.path.startswith('/api/')):
+            match = request.resolver_match
+            activity.log(
+                user,
+                f'{request.method} {match.view_name if match else request.path}',
+                details=f'{request.get_full_path()} -> {response.status_code}',
+                ip_address=request.META.get('REMOTE_ADDR') or '0.0.0.0',
+            )
+        return response
+
+
+class RequestMetricsMiddleware:
+    """
+    Counts the SQL queries, database time, render time and total time of
+    every request, keyed by the resolved view name (e.g. ``product-list``,
+    ``product-low-stock``), and logs requests over REQUEST_QUERY_BUDGET
+    queries or REQUEST_TIME_BUDGET_MS milliseconds. Served by /api/_metrics.
+
+    Render time is measured around the renderer of DRF responses (which are
+    template responses), from process_template_response to the post-render
+    callback.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not metrics.enabled():
+            return self.get_response(request)
+        stats = metrics.RequestStats()
+        token = stats.activate()
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(stats))
+                response = self.get_response(request)
+        finally:
+            metrics.RequestStats.deactivate(token)
+        duration = time.perf_counter() - start
+
+        match = request.resolver_match
+        view = match.view_name if match else 'unmatched'
+        query_budget = getattr(settings, 'REQUEST_QUERY_BUDGET', None)
+        time_budget = getattr(settings, 'REQUEST_TIME_BUDGET_MS', None)
+        over_budget = ((query_budget is not None and stats.queries > query_budget)
+                       or (time_budget is not None and duration * 1000 > time_budget))
+        if over_budget:
+            logger.warning(
+                "%s %s (%s) over budget: %d queries, %.1f ms total, %.1f ms db, "
+                "%.1f ms rendering", request.method, request.path, view, stats.queries,
+                duration * 1000, stats.db_time * 1000, stats.render_time * 1000)
+        metrics.registry.observe(view, request.method, stats, duration, over_budget)
+        return response
+
+    def process_template_response(self, request, response):
+        stats = metrics.current()
+        if stats is not None:
+            start = time.perf_counter()
+
+            def rendered(response):
+                stats.render_time += time.perf_counter() - start
+
+            response.add_post_render_callback(rendered)
+        return response
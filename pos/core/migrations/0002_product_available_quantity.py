@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:17
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_available_quantity(apps, schema_editor):
+    Product = apps.get_model('core', 'Product')
+    InventoryItem = apps.get_model('core', 'InventoryItem')
+    totals = InventoryItem.objects.filter(
+        product=OuterRef('pk')
+    ).values('product').annotate(total=Sum('quantity')).values('total')
+    Product.objects.update(available_quantity=Coalesce(Subquery(totals), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='available_quantity',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_available_quantity, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,101 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_timestamp_id_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='discount',
+            index=models.Index(fields=['from_date', 'to_date'], name='discount_dates_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='discount',
+            index=models.Index(fields=['discount_type', 'all_products_discount'], name='discount_type_all_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='discount',
+            index=models.Index(condition=models.Q(('all_products_discount', True)), fields=['id'], name='discount_all_products_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['expense_category', 'payment_status'], name='expense_category_payment_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['payment_status'], name='expense_payment_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inventorymovement',
+            index=models.Index(fields=['movement_type', 'product'], name='movement_type_product_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['stock_quantity', 'reorder_point'], name='product_stock_reorder_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('stock_quantity__lte', models.F('reorder_point'))), fields=['id'], name='product_low_stock_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'brand', 'is_active'], name='product_cat_brand_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['id'], name='product_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchase',
+            index=models.Index(fields=['purchase_status', 'payment_status'], name='purchase_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchase',
+            index=models.Index(fields=['payment_status'], name='purchase_payment_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchasereturn',
+            index=models.Index(fields=['payment_status'], name='purchasereturn_payment_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='receipt',
+            index=models.Index(condition=models.Q(('void_status', True)), fields=['id'], name='receipt_voided_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(fields=['report_type', 'generated_by'], name='report_type_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='salesorder',
+            index=models.Index(fields=['status', 'shipping_status'], name='salesorder_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='salesorder',
+            index=models.Index(fields=['shipping_status'], name='salesorder_shipping_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='salesreturn',
+            index=models.Index(fields=['payment_status'], name='salesreturn_payment_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(fields=['current_stock'], name='stock_current_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['payment_method', 'is_completed'], name='transaction_method_done_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['customer', 'is_completed'], name='transaction_customer_done_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='useractivity',
+            index=models.Index(fields=['user', 'activity_type'], name='useractivity_user_type_idx'),
+        ),
+    ]
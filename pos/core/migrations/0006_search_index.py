@@ -0,0 +1,66 @@
+from django.db import migrations
+
+# The indexed columns as they were when this migration was written; later
+# changes to core.search must not change what this migration creates.
+SEARCH_INDEXES = {
+    'core_product': ['name', 'barcode', 'sku'],
+    'core_customer': ['name', 'business_name', 'mobile', 'email'],
+}
+
+
+def _has_fts5(connection):
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA compile_options")
+        return any('FTS5' in option for (option,) in cursor.fetchall())
+
+
+def _document(columns):
+    return " || ' ' || ".join(f"coalesce({column}, '')" for column in columns)
+
+
+def create_search_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite' and _has_fts5(connection):
+        for table, columns in SEARCH_INDEXES.items():
+            fields = ', '.join(columns)
+            schema_editor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {table}_fts USING fts5("
+                f"{fields}, prefix='2 3', tokenize='unicode61')")
+            schema_editor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {table}_fts_vocab "
+                f"USING fts5vocab({table}_fts, 'row')")
+            schema_editor.execute(f"DELETE FROM {table}_fts")
+            schema_editor.execute(
+                f"INSERT INTO {table}_fts (rowid, {fields}) SELECT id, {fields} FROM {table}")
+    elif connection.vendor == 'postgresql':
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for table, columns in SEARCH_INDEXES.items():
+            document = _document(columns)
+            schema_editor.execute(
+                f"CREATE INDEX IF NOT EXISTS {table}_fts_idx ON {table} "
+                f"USING GIN (to_tsvector('simple', {document}))")
+            schema_editor.execute(
+                f"CREATE INDEX IF NOT EXISTS {table}_trgm_idx ON {table} "
+                f"USING GIN (({document}) gin_trgm_ops)")
+
+
+def drop_search_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    for table in SEARCH_INDEXES:
+        if connection.vendor == 'sqlite':
+            schema_editor.execute(f"DROP TABLE IF EXISTS {table}_fts_vocab")
+            schema_editor.execute(f"DROP TABLE IF EXISTS {table}_fts")
+        elif connection.vendor == 'postgresql':
+            schema_editor.execute(f"DROP INDEX IF EXISTS {table}_fts_idx")
+            schema_editor.execute(f"DROP INDEX IF EXISTS {table}_trgm_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_report_schedule_due_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CreditBalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('as_of', models.DateTimeField()),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('last_entry_id', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='customercredit',
+            name='current_balance',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AddIndex(
+            model_name='creditpayment',
+            index=models.Index(fields=['customer_credit', 'payment_date'], name='credit_ledger_idx'),
+        ),
+        migrations.AddField(
+            model_name='creditbalancesnapshot',
+            name='customer_credit',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='core.customercredit'),
+        ),
+        migrations.AddIndex(
+            model_name='creditbalancesnapshot',
+            index=models.Index(fields=['customer_credit', 'as_of'], name='credit_snapshot_idx'),
+        ),
+    ]
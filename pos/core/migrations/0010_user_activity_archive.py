@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:46
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_stock_sku_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserActivityArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('activity_type', models.CharField(max_length=100)),
+                ('timestamp', models.DateTimeField()),
+                ('details', models.TextField()),
+                ('ip_address', models.GenericIPAddressField()),
+                ('month', models.DateField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_activities', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'User Activity Archive',
+                'indexes': [models.Index(fields=['timestamp', 'id'], name='activityarchive_ts_id_idx'), models.Index(fields=['month', 'user'], name='activityarchive_month_idx'), models.Index(fields=['activity_type', 'month'], name='activityarchive_type_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:09
+
+import uuid
+from django.db import migrations, models
+from django.db.models import F, Max
+
+SYNCED = ['Product', 'Discount', 'Customer', 'InventoryItem', 'CustomerCredit']
+
+
+def stamp_existing_rows(apps, schema_editor):
+    # Give every existing row its own sequence number so the first full sync
+    # pages through them like any other changes.
+    last = 0
+    for name in SYNCED:
+        model = apps.get_model('core', name)
+        model.objects.update(change_seq=F('pk'))
+        last = max(last, model.objects.aggregate(last=Max('pk'))['last'] or 0)
+    apps.get_model('core', 'ChangeSequence').objects.create(pk=1, value=last)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_stock_projection'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.BigIntegerField(default=0)),
+                ('pruned_through', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='change_seq',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='customercredit',
+            name='change_seq',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='discount',
+            name='change_seq',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='inventoryitem',
+            name='change_seq',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='change_seq',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='transaction_id',
+            field=models.UUIDField(default=uuid.uuid4, editable=False, unique=True),
+        ),
+        migrations.CreateModel(
+            name='SyncTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=100)),
+                ('object_id', models.BigIntegerField()),
+                ('change_seq', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['change_seq'], name='tombstone_seq_idx'), models.Index(fields=['deleted_at'], name='tombstone_deleted_at_idx')],
+            },
+        ),
+        migrations.RunPython(stamp_existing_rows, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_idempotent_responses'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='inventoryitem',
+            index=models.Index(condition=models.Q(('quantity__gt', 0)), fields=['product', 'expiry_date', 'id'], name='inventory_fefo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inventoryitem',
+            index=models.Index(condition=models.Q(('expiry_date__isnull', False), ('quantity__gt', 0)), fields=['expiry_date', 'id'], name='inventory_expiring_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:34
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+SUMMED = ['current_stock', 'current_stock_value_purchase_price', 'current_stock_value_sale_price',
+          'potential_profit', 'total_units_sold', 'total_units_transferred',
+          'total_units_adjusted']
+
+
+def merge_duplicate_rows(apps, schema_editor):
+    # Locations sharing a name used to get one row each under the same key.
+    # Fold them into the oldest row, which now counts all of them.
+    Stock = apps.get_model('core', 'Stock')
+    duplicates = Stock.objects.values('sku', 'location').annotate(
+        rows=Count('id'), keep=Min('id'), **{f'sum_{field}': Sum(field) for field in SUMMED},
+    ).filter(rows__gt=1).order_by()
+    for group in duplicates:
+        rows = Stock.objects.filter(sku=group['sku'], location=group['location'])
+        rows.filter(pk=group['keep']).update(
+            **{field: group[f'sum_{field}'] for field in SUMMED})
+        rows.exclude(pk=group['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_user_activity_logged_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_rows, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='stock',
+            constraint=models.UniqueConstraint(fields=('sku', 'location'), name='stock_sku_location_uniq'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:06
+
+from django.db import migrations, models
+
+FILE_JOB_STATUSES = ['PENDING', 'RUNNING', 'FAILED', 'COMPLETED']
+
+
+def move_file_jobs(apps, schema_editor):
+    # The file job used to be kept in results, replacing whatever was there.
+    Report = apps.get_model('core', 'Report')
+    for report in Report.objects.filter(results__status__in=FILE_JOB_STATUSES):
+        Report.objects.filter(pk=report.pk).update(file_job=report.results, results={})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_stock_sku_location_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='report',
+            name='file_job',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.RunPython(move_file_jobs, migrations.RunPython.noop),
+    ]
@@ -1,11 +1,33 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.contrib.auth.models import AbstractUser
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
-from django.db.models import Sum
+from django.db.models import (
+    Case, ExpressionWrapper, F, Func, IntegerField, OuterRef, Q, Subquery, Sum, Value, When, Window
+)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+import calendar
+import functools
+import operator
 import uuid
+from datetime import timedelta
 from decimal import Decimal
 
 
+def _increment(queryset, lookup, **deltas):
+    # Add to the counters of the row matching ``queryset``, creating it from
+    # ``lookup`` when it does not exist yet.
+    updates = {field: F(field) + delta for field, delta in deltas.items()}
+    if queryset.update(**updates):
+        return
+    try:
+        with transaction.atomic():
+            queryset.model.objects.create(**lookup, **deltas)
+    except IntegrityError:
+        queryset.update(**updates)
+
+
 class CustomUser(AbstractUser):
     ROLE_CHOICES = [
         ('Admin', 'Admin'),
@@ -54,12 +76,37 @@ class CustomUser(AbstractUser):
 class UserActivity(models.Model):
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
     activity_type = models.CharField(max_length=100)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set when the activity is logged; core.activity writes rows later.
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
     details = models.TextField()
     ip_address = models.GenericIPAddressField()
 
     class Meta:
         verbose_name_plural = "User Activities"
+        indexes = [
+            models.Index(fields=['timestamp', 'id'], name='useractivity_ts_id_idx'),
+            models.Index(fields=['user', 'activity_type'], name='useractivity_user_type_idx'),
+        ]
+
+
+class UserActivityArchive(models.Model):
+    """UserActivity rows past ACTIVITY_RETENTION_DAYS, keeping their ids, keyed by month."""
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(CustomUser, related_name='archived_activities',
+                             on_delete=models.CASCADE)
+    activity_type = models.CharField(max_length=100)
+    timestamp = models.DateTimeField()
+    details = models.TextField()
+    ip_address = models.GenericIPAddressField()
+    month = models.DateField()
+
+    class Meta:
+        verbose_name_plural = "User Activity Archive"
+        indexes = [
+            models.Index(fields=['timestamp', 'id'], name='activityarchive_ts_id_idx'),
+            models.Index(fields=['month', 'user'], name='activityarchive_month_idx'),
+            models.Index(fields=['activity_type', 'month'], name='activityarchive_type_idx'),
+        ]
 
 
 class Receipt(models.Model):
@@ -70,12 +117,27 @@ class Receipt(models.Model):
     void_status = models.BooleanField(default=False)
     void_reason = models.TextField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['id'], name='receipt_voided_idx',
+                         condition=models.Q(void_status=True)),
+        ]
+
     def print_receipt(self):
         if self.void_status:
             raise ValueError("Cannot print voided receipt")
         self.printed_count += 1
         self.save()
 
+    def void(self, reason):
+        with transaction.atomic():
+            voided = Receipt.objects.filter(pk=self.pk, void_status=False).update(
+                void_status=True, void_reason=reason)
+            if voided and self.transaction.is_completed:
+                SalesRollup.record(self.transaction, sign=-1)
+        self.void_status = True
+        self.void_reason = reason
+
 
 class Transaction(models.Model):
     PAYMENT_METHODS = [
@@ -85,7 +147,8 @@ class Transaction(models.Model):
         ('CREDIT', 'Store Credit')
     ]
 
-    transaction_id = models.UUIDField(default=uuid.uuid4, editable=False)
+    # Unique so that a till can upload an offline sale twice without it being recorded twice
+    transaction_id = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
     customer = models.ForeignKey('Customer', on_delete=models.PROTECT)
     cashier = models.ForeignKey(CustomUser, on_delete=models.PROTECT)
     timestamp = models.DateTimeField(auto_now_add=True)
@@ -95,6 +158,21 @@ class Transaction(models.Model):
     change_amount = models.DecimalField(max_digits=10, decimal_places=2)
     is_completed = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['timestamp', 'id'], name='transaction_ts_id_idx'),
+            models.Index(fields=['payment_method', 'is_completed'], name='transaction_method_done_idx'),
+            models.Index(fields=['customer', 'is_completed'], name='transaction_customer_done_idx'),
+        ]
+
+    def complete(self):
+        with transaction.atomic():
+            completed = Transaction.objects.filter(pk=self.pk, is_completed=False).update(
+                is_completed=True)
+            if completed:
+                SalesRollup.record(self)
+        self.is_completed = True
+
 
 class Product(models.Model):
     name = models.CharField(max_length=255)
@@ -110,12 +188,49 @@ class Product(models.Model):
     is_active = models.BooleanField(default=True)
     stock_quantity = models.IntegerField()
     packing_date = models.DateField()
+    # Maintained by InventoryItem.save()/delete(); see rebuild_available_quantity
+    available_quantity = models.IntegerField(default=0, editable=False)
+    # Stamped by ChangeSequence.stamp() for the till sync feed (core/sync.py)
+    change_seq = models.BigIntegerField(default=0, db_index=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['stock_quantity', 'reorder_point'], name='product_stock_reorder_idx'),
+            # Matches ProductViewSet.low_stock exactly so it never scans the catalog
+            models.Index(fields=['id'], name='product_low_stock_idx',
+                         condition=models.Q(stock_quantity__lte=F('reorder_point'))),
+            models.Index(fields=['category', 'brand', 'is_active'], name='product_cat_brand_active_idx'),
+            models.Index(fields=['id'], name='product_active_idx',
+                         condition=models.Q(is_active=True)),
+        ]
+
+    # Moved by F() updates elsewhere, so a save of an instance loaded before
+    # such an update must not write its stale copy back.
+    COUNTER_FIELDS = ('available_quantity', 'change_seq')
+
+    def save(self, *args, **kwargs):
+        updating = (not self._state.adding and not kwargs.get('force_insert')
+                    and kwargs.get('update_fields') is None)
+        if updating:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS]
+        super().save(*args, **kwargs)
+        if updating:
+            self.refresh_from_db(fields=self.COUNTER_FIELDS)
 
     def get_available_quantity(self):
         return self.inventoryitem_set.aggregate(
             total=Sum('quantity')
         )['total'] or 0
 
+    @staticmethod
+    def inventory_total():
+        totals = InventoryItem.objects.filter(
+            product=OuterRef('pk')
+        ).values('product').annotate(total=Sum('quantity')).values('total')
+        return Coalesce(Subquery(totals), 0)
+
 
 class InventoryItem(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
@@ -124,9 +239,79 @@ class InventoryItem(models.Model):
     location = models.ForeignKey('StorageLocation', on_delete=models.PROTECT)
     expiry_date = models.DateField(null=True, blank=True)
     last_counted = models.DateTimeField(null=True, blank=True)
+    # Stamped by ChangeSequence.stamp() for the till sync feed (core/sync.py)
+    change_seq = models.BigIntegerField(default=0, db_index=True, editable=False)
+
+    # Batches are sold first-expiry-first-out; those without an expiry go last.
+    FEFO_ORDER = (F('expiry_date').asc(nulls_last=True), F('id').asc())
 
     class Meta:
         unique_together = ['product', 'batch_number']
+        indexes = [
+            # Only batches with stock left are candidates for a sale or the
+            # expiring list, so empty batches stay out of both indexes.
+            models.Index(fields=['product', 'expiry_date', 'id'], name='inventory_fefo_idx',
+                         condition=Q(quantity__gt=0)),
+            models.Index(fields=['expiry_date', 'id'], name='inventory_expiring_idx',
+                         condition=Q(quantity__gt=0, expiry_date__isnull=False)),
+        ]
+
+    @classmethod
+    def fefo_batches(cls, quantities):
+        """
+        The batches a basket draws from, locked, in FEFO order per product.
+        Expired batches are never sold. ``quantities`` maps product id to the
+        quantity wanted. A batch is
+        included only while the batches before it fall short of the wanted
+        quantity, so a product with thousands of batches returns as many rows
+        as the sale consumes.
+        """
+        wanted = Case(*[When(product_id=pk, then=Value(qty)) for pk, qty in quantities.items()],
+                      output_field=IntegerField())
+        unexpired = Q(expiry_date__isnull=True) | Q(expiry_date__gte=timezone.localdate())
+        needed = cls.objects.filter(unexpired, product_id__in=quantities, quantity__gt=0).annotate(
+            stocked_before=Window(Sum('quantity'), partition_by=F('product_id'),
+                                  order_by=cls.FEFO_ORDER) - F('quantity'),
+        ).filter(stocked_before__lt=wanted)
+        # The window sits in a subquery so the outer query can be locked, and
+        # product_id first keeps the lock order stable across tills.
+        return cls.objects.select_for_update().filter(pk__in=needed.values('pk')).order_by(
+            'product_id', *cls.FEFO_ORDER)
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            previous = self._locked_row()
+            super().save(*args, **kwargs)
+            deltas = {self.product_id: int(self.quantity)}
+            pairs = {(self.product_id, self.location_id)}
+            if previous:
+                deltas[previous[0]] = deltas.get(previous[0], 0) - previous[1]
+                pairs.add((previous[0], previous[2]))
+            for product_id, delta in deltas.items():
+                self._adjust_available(product_id, delta)
+            Stock.refresh(pairs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            previous = self._locked_row()
+            result = super().delete(*args, **kwargs)
+            if previous:
+                self._adjust_available(previous[0], -previous[1])
+                Stock.refresh([(previous[0], previous[2])])
+        return result
+
+    def _locked_row(self):
+        if self.pk is None:
+            return None
+        return InventoryItem.objects.select_for_update().filter(
+            pk=self.pk).values_list('product_id', 'quantity', 'location_id').first()
+
+    @staticmethod
+    def _adjust_available(product_id, delta):
+        if delta:
+            product = Product.objects.filter(pk=product_id)
+            product.update(available_quantity=F('available_quantity') + delta)
+            ChangeSequence.stamp(product)
 
 
 class InventoryMovement(models.Model):
@@ -147,32 +332,227 @@ class InventoryMovement(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True)
     performed_by = models.ForeignKey(CustomUser, on_delete=models.PROTECT)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['timestamp', 'id'], name='movement_ts_id_idx'),
+            models.Index(fields=['movement_type', 'product'], name='movement_type_product_idx'),
+            models.Index(fields=['product', 'id'], name='movement_product_id_idx'),
+        ]
+
+    # Movements are never changed once written; corrections are new ADJUST
+    # movements. They record what was moved, not every change to stock:
+    # InventoryItem counts and edits write no movement, so StockBalance is the
+    # movement-derived view and InventoryItem stays the stock on hand.
+
+    def clean(self):
+        if self.movement_type == 'TRANSFER' and self.to_location_id is None:
+            raise ValidationError({'to_location': "A transfer needs a destination location"})
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            raise ValueError("Inventory movements cannot be changed")
+        if self.movement_type == 'TRANSFER' and self.to_location_id is None:
+            raise ValueError("A transfer needs a destination location")
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            StockBalance.apply([self])
+            Stock.record_movements([self])
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Inventory movements cannot be deleted")
+
+    def deltas(self):
+        """((product_id, location_id), quantity change) pairs for this movement."""
+        key = (self.product_id, self.from_location_id)
+        if self.movement_type == 'OUT':
+            return [(key, -self.quantity)]
+        if self.movement_type == 'TRANSFER':
+            # Matches delta_expressions() for transfers recorded without a
+            # destination before one was required.
+            if self.to_location_id is None:
+                return [(key, -self.quantity)]
+            return [(key, -self.quantity), ((self.product_id, self.to_location_id), self.quantity)]
+        if self.movement_type in ('IN', 'RETURN') and self.to_location_id is not None:
+            return [((self.product_id, self.to_location_id), self.quantity)]
+        return [(key, self.quantity)]
+
+    @staticmethod
+    def delta_expressions():
+        """SQL versions of deltas(): the change at from_location and at to_location."""
+        quantity = F('quantity')
+        at_from = Case(
+            When(movement_type__in=['OUT', 'TRANSFER'], then=-quantity),
+            When(movement_type__in=['IN', 'RETURN'], to_location__isnull=False, then=Value(0)),
+            default=quantity,
+            output_field=models.IntegerField(),
+        )
+        at_to = Case(
+            When(movement_type__in=['TRANSFER', 'IN', 'RETURN'], to_location__isnull=False,
+                 then=quantity),
+            default=Value(0),
+            output_field=models.IntegerField(),
+        )
+        return at_from, at_to
+
+
+class StockBalance(models.Model):
+    """Stock per (product, location), projected from InventoryMovement as movements are written."""
+    product = models.ForeignKey(Product, related_name='balances', on_delete=models.CASCADE)
+    location = models.ForeignKey('StorageLocation', on_delete=models.PROTECT)
+    quantity = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ['product', 'location']
+
+    @classmethod
+    def apply(cls, movements):
+        deltas = {}
+        for movement in movements:
+            for key, delta in movement.deltas():
+                deltas[key] = deltas.get(key, 0) + delta
+        deltas = {key: delta for key, delta in sorted(deltas.items()) if delta}
+        if not deltas:
+            return
+
+        def match(key):
+            return Q(product_id=key[0], location_id=key[1])
+
+        # Two statements whatever the number of pairs: create the missing
+        # rows at zero, then add every delta in one UPDATE.
+        with transaction.atomic():
+            cls.objects.bulk_create(
+                [cls(product_id=product_id, location_id=location_id, quantity=0)
+                 for product_id, location_id in deltas],
+                ignore_conflicts=True,
+            )
+            cls.objects.filter(functools.reduce(operator.or_, map(match, deltas))).update(
+                quantity=F('quantity') + Case(
+                    *[When(match(key), then=Value(delta)) for key, delta in deltas.items()],
+                    default=Value(0), output_field=IntegerField(),
+                ))
+
+
+class StockSnapshot(models.Model):
+    """Stock per (product, location) after every movement up to ``last_movement_id``."""
+    taken_at = models.DateTimeField()
+    last_movement_id = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['taken_at'], name='stock_snapshot_taken_idx'),
+        ]
+
+
+class StockSnapshotLine(models.Model):
+    snapshot = models.ForeignKey(StockSnapshot, related_name='lines', on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    location = models.ForeignKey('StorageLocation', on_delete=models.PROTECT)
+    quantity = models.IntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['snapshot', 'product'], name='stock_snapshot_line_idx'),
+        ]
+
 
 class CustomerCredit(models.Model):
     customer = models.ForeignKey('Customer', on_delete=models.CASCADE)
     credit_limit = models.DecimalField(max_digits=10, decimal_places=2)
-    current_balance = models.DecimalField(max_digits=10, decimal_places=2)
+    current_balance = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     last_payment_date = models.DateField(null=True, blank=True)
-
-    def add_credit(self, amount):
-        self.current_balance += Decimal(amount)
-        self.save()
-
-    def use_credit(self, amount):
-        if self.current_balance >= Decimal(amount):
-            self.current_balance -= Decimal(amount)
-            self.save()
-            return True
-        return False
+    # Stamped by ChangeSequence.stamp() for the till sync feed (core/sync.py)
+    change_seq = models.BigIntegerField(default=0, db_index=True, editable=False)
+
+    # current_balance is only changed by add_credit and use_credit, each of
+    # which writes a CreditPayment entry in the same transaction. The instance
+    # is not refreshed afterwards.
+
+    def add_credit(self, amount, received_by, reference_number=''):
+        amount = Decimal(amount)
+        if amount <= 0:
+            raise ValueError("Amount must be positive")
+        with transaction.atomic():
+            CustomerCredit.objects.filter(pk=self.pk).update(
+                current_balance=F('current_balance') + amount,
+                last_payment_date=timezone.localdate(),
+            )
+            ChangeSequence.stamp(CustomerCredit.objects.filter(pk=self.pk))
+            CreditPayment.objects.create(customer_credit_id=self.pk, amount=amount,
+                                         reference_number=reference_number,
+                                         received_by=received_by)
+
+    def use_credit(self, amount, received_by, reference_number=''):
+        amount = Decimal(amount)
+        if amount <= 0:
+            raise ValueError("Amount must be positive")
+        with transaction.atomic():
+            used = CustomerCredit.objects.filter(
+                pk=self.pk, current_balance__gte=amount
+            ).update(current_balance=F('current_balance') - amount)
+            if not used:
+                return False
+            ChangeSequence.stamp(CustomerCredit.objects.filter(pk=self.pk))
+            CreditPayment.objects.create(customer_credit_id=self.pk, amount=-amount,
+                                         reference_number=reference_number,
+                                         received_by=received_by)
+        return True
+
+    def balance_at(self, when):
+        """Balance after every ledger entry up to ``when``, from the latest snapshot before it."""
+        snapshot = self.snapshots.filter(as_of__lte=when).order_by('-as_of', '-id').first()
+        entries = self.creditpayment_set.all()
+        if snapshot is not None:
+            replayed = entries.filter(pk__gt=snapshot.last_entry_id, payment_date__lte=when)
+            return snapshot.balance + (replayed.aggregate(total=Sum('amount'))['total'] or 0)
+        # Without a snapshot, whatever the ledger does not explain is the
+        # opening balance.
+        totals = entries.aggregate(
+            total=Sum('amount'), until=Sum('amount', filter=Q(payment_date__lte=when)))
+        balance = CustomerCredit.objects.values_list('current_balance', flat=True).get(pk=self.pk)
+        return balance - (totals['total'] or 0) + (totals['until'] or 0)
 
 
 class CreditPayment(models.Model):
+    """Append-only credit ledger: positive amounts add credit, negative ones use it."""
     customer_credit = models.ForeignKey(CustomerCredit, on_delete=models.CASCADE)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     payment_date = models.DateTimeField(auto_now_add=True)
     reference_number = models.CharField(max_length=50)
     received_by = models.ForeignKey(CustomUser, on_delete=models.PROTECT)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['customer_credit', 'payment_date'], name='credit_ledger_idx'),
+        ]
+
+
+class CreditBalanceSnapshot(models.Model):
+    customer_credit = models.ForeignKey(CustomerCredit, related_name='snapshots',
+                                        on_delete=models.CASCADE)
+    as_of = models.DateTimeField()
+    balance = models.DecimalField(max_digits=10, decimal_places=2)
+    last_entry_id = models.BigIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['customer_credit', 'as_of'], name='credit_snapshot_idx'),
+        ]
+
+    @classmethod
+    def take(cls, now=None):
+        """Snapshot every credit account's balance together with the last ledger entry it includes."""
+        now = now or timezone.now()
+        # One statement reads each balance and its newest entry, so both come
+        # from the same committed state.
+        rows = CustomerCredit.objects.annotate(
+            last_entry=models.Max('creditpayment__id')
+        ).values_list('pk', 'current_balance', 'last_entry')
+        return cls.objects.bulk_create(
+            (cls(customer_credit_id=pk, as_of=now, balance=balance, last_entry_id=last or 0)
+             for pk, balance, last in rows.iterator(chunk_size=2000)),
+            batch_size=1000,
+        )
+
 
 class Report(models.Model):
     REPORT_TYPES = [
@@ -191,6 +571,14 @@ class Report(models.Model):
     parameters = models.JSONField()  # Stores report parameters
     results = models.JSONField()  # Stores report results
     file_path = models.FileField(upload_to='reports/', null=True, blank=True)
+    # The file job run by core.scheduler: status, format, and the row_count
+    # and columns of the written file or the error that stopped it.
+    file_job = models.JSONField(default=dict, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['report_type', 'generated_by'], name='report_type_user_idx'),
+        ]
 
 
 class ReportSchedule(models.Model):
@@ -207,6 +595,37 @@ class ReportSchedule(models.Model):
     last_run = models.DateTimeField(null=True, blank=True)
     next_run = models.DateTimeField()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['is_active', 'next_run'], name='schedule_due_idx'),
+        ]
+
+    def _step(self, run):
+        if self.frequency == 'DAILY':
+            return run + timedelta(days=1)
+        if self.frequency == 'WEEKLY':
+            return run + timedelta(weeks=1)
+        year, month = divmod(run.year * 12 + run.month, 12)
+        month += 1
+        return run.replace(year=year, month=month,
+                           day=min(run.day, calendar.monthrange(year, month)[1]))
+
+    def following_run(self, after):
+        """First run time after ``after``; runs missed while no worker was up are skipped."""
+        run = self.next_run
+        while run <= after:
+            run = self._step(run)
+        return run
+
+    def report_period(self, run=None):
+        """The dates covered by the run due at ``run`` (default ``next_run``), up to the day before it."""
+        end = timezone.localtime(run or self.next_run).date() - timedelta(days=1)
+        if self.frequency == 'DAILY':
+            return end, end
+        if self.frequency == 'WEEKLY':
+            return end - timedelta(days=6), end
+        return end.replace(day=1), end
+
 
 class Role(models.Model):
     name = models.CharField(max_length=50, unique=True)
@@ -229,6 +648,8 @@ class Customer(models.Model):
     mobile = models.CharField(max_length=20)
     total_sales_due = models.DecimalField(max_digits=10, decimal_places=2)
     total_sales_return_due = models.DecimalField(max_digits=10, decimal_places=2)
+    # Stamped by ChangeSequence.stamp() for the till sync feed (core/sync.py)
+    change_seq = models.BigIntegerField(default=0, db_index=True, editable=False)
 
     def __str__(self):
         return self.business_name
@@ -281,6 +702,12 @@ class SalesOrder(models.Model):
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'shipping_status'], name='salesorder_status_idx'),
+            models.Index(fields=['shipping_status'], name='salesorder_shipping_idx'),
+        ]
+
     def __str__(self):
         return f"Order #{self.id}"
 
@@ -294,6 +721,11 @@ class SalesReturn(models.Model):
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
     payment_due = models.DecimalField(max_digits=10, decimal_places=2)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['payment_status'], name='salesreturn_payment_idx'),
+        ]
+
     def __str__(self):
         return self.invoice_no
 
@@ -308,6 +740,12 @@ class Purchase(models.Model):
     payment_due = models.DecimalField(max_digits=10, decimal_places=2)
     total = models.DecimalField(max_digits=10, decimal_places=2)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['purchase_status', 'payment_status'], name='purchase_status_idx'),
+            models.Index(fields=['payment_status'], name='purchase_payment_idx'),
+        ]
+
     def __str__(self):
         return f"{self.reference_no} - {self.supplier}"
 
@@ -326,6 +764,11 @@ class PurchaseReturn(models.Model):
     payment_due = models.DecimalField(max_digits=10, decimal_places=2)
     total = models.DecimalField(max_digits=10, decimal_places=2)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['payment_status'], name='purchasereturn_payment_idx'),
+        ]
+
     def __str__(self):
         return self.reference_no
 
@@ -344,9 +787,185 @@ class Stock(models.Model):
     total_units_transferred = models.IntegerField()
     total_units_adjusted = models.IntegerField()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['current_stock'], name='stock_current_idx'),
+            models.Index(fields=['sku'], name='stock_sku_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['sku', 'location'], name='stock_sku_location_uniq'),
+        ]
+
     def __str__(self):
         return f'{self.product} ({self.sku})'
 
+    # One row per (product sku, location name), kept current from Product
+    # prices, InventoryItem quantities and InventoryMovement totals by
+    # refresh(), record_movements() and reprice(); rebuild() recomputes all.
+    # Locations that share a name share a row, which counts all of them.
+
+    MOVEMENT_TOTALS = {
+        'OUT': 'total_units_sold',
+        'TRANSFER': 'total_units_transferred',
+        'ADJUST': 'total_units_adjusted',
+    }
+    VALUATION_FIELDS = ['product', 'category', 'unit_selling_price', 'current_stock',
+                        'current_stock_value_purchase_price', 'current_stock_value_sale_price',
+                        'potential_profit']
+
+    @staticmethod
+    def _valuation(product, quantity):
+        return dict(
+            product=product.name,
+            category=product.category.name,
+            unit_selling_price=product.price,
+            current_stock=quantity,
+            current_stock_value_purchase_price=quantity * product.cost_price,
+            current_stock_value_sale_price=quantity * product.price,
+            potential_profit=quantity * (product.price - product.cost_price),
+        )
+
+    @classmethod
+    def _movement_totals(cls):
+        return {
+            field: Coalesce(Sum('quantity', filter=Q(movement_type=movement_type)), 0)
+            for movement_type, field in cls.MOVEMENT_TOTALS.items()
+        }
+
+    @staticmethod
+    def _on_hand(items):
+        return {(product_id, name): quantity for product_id, name, quantity
+                in items.values('product', 'location__name').annotate(quantity=Sum('quantity'))
+                .values_list('product', 'location__name', 'quantity').order_by()}
+
+    @classmethod
+    def _history(cls, movements):
+        return {(row.pop('product'), row.pop('from_location__name')): row
+                for row in movements.values('product', 'from_location__name').annotate(
+                    **cls._movement_totals()).order_by()}
+
+    @classmethod
+    def refresh(cls, pairs, totals=None):
+        """
+        Recompute the rows for the given (product_id, location_id) pairs and
+        add ``totals[pair]`` ({field: units}) to their movement totals.
+        Rows that do not exist yet are created with totals from the movement
+        history of their location. The number of queries does not depend on
+        the number of pairs.
+        """
+        totals = totals or {}
+        pairs = set(pairs) | set(totals)
+        if not pairs:
+            return
+        product_ids = {product_id for product_id, _ in pairs}
+        products = Product.objects.select_related('category').in_bulk(product_ids)
+        locations = dict(StorageLocation.objects.filter(
+            pk__in={location_id for _, location_id in pairs}).values_list('pk', 'name'))
+
+        # (product_id, location name) -> movement totals to add
+        rows = {}
+        for product_id, location_id in pairs:
+            if product_id not in products or location_id not in locations:
+                continue
+            increments = rows.setdefault((product_id, locations[location_id]), {})
+            for field, units in totals.get((product_id, location_id), {}).items():
+                increments[field] = increments.get(field, 0) + units
+        if not rows:
+            return
+        names = {name for _, name in rows}
+        on_hand = cls._on_hand(InventoryItem.objects.filter(
+            product_id__in=product_ids, location__name__in=names))
+        values = {key: cls._valuation(products[key[0]], on_hand.get(key, 0)) for key in rows}
+
+        def match(key):
+            return Q(sku=products[key[0]].sku, location=key[1])
+
+        def per_row(amounts, output_field, default=None):
+            return Case(*[When(match(key), then=Value(amount)) for key, amount in amounts],
+                        default=default, output_field=output_field)
+
+        keys = sorted(rows)
+        updates = {field: per_row([(key, values[key][field]) for key in keys],
+                                  cls._meta.get_field(field))
+                   for field in cls.VALUATION_FIELDS}
+        for field in cls.MOVEMENT_TOTALS.values():
+            added = [(key, rows[key][field]) for key in keys if rows[key].get(field)]
+            if added:
+                updates[field] = F(field) + per_row(added, IntegerField(), Value(0))
+
+        with transaction.atomic():
+            updated = cls.objects.filter(functools.reduce(operator.or_, map(match, keys))).update(
+                **updates)
+            missing = []
+            if updated < len(keys):
+                existing = set(cls.objects.filter(
+                    sku__in={products[pk].sku for pk, _ in keys}, location__in=names,
+                ).values_list('sku', 'location'))
+                missing = [key for key in keys if (products[key[0]].sku, key[1]) not in existing]
+            if missing:
+                history = cls._history(InventoryMovement.objects.filter(
+                    product_id__in={pk for pk, _ in missing},
+                    from_location__name__in={name for _, name in missing}))
+                empty = dict.fromkeys(cls.MOVEMENT_TOTALS.values(), 0)
+                cls.objects.bulk_create(
+                    [cls(sku=products[key[0]].sku, location=key[1], variation='',
+                         **values[key], **history.get(key, empty)) for key in missing],
+                    update_conflicts=True, unique_fields=['sku', 'location'],
+                    update_fields=[*cls.VALUATION_FIELDS, *cls.MOVEMENT_TOTALS.values()],
+                )
+
+    @classmethod
+    def record_movements(cls, movements):
+        """Refresh the rows at the source location of each movement and add to their totals."""
+        totals = {}
+        for movement in movements:
+            units = totals.setdefault((movement.product_id, movement.from_location_id), {})
+            field = cls.MOVEMENT_TOTALS.get(movement.movement_type)
+            if field:
+                units[field] = units.get(field, 0) + movement.quantity
+        cls.refresh(totals, totals)
+
+    @classmethod
+    def reprice(cls, skus):
+        """Revalue every row of the products with these SKUs at their current prices in one UPDATE."""
+        money = models.DecimalField(max_digits=10, decimal_places=2)
+        product = Product.objects.filter(sku=OuterRef('sku'))
+
+        def current(field):
+            return Subquery(product.values(field)[:1])
+
+        def times(amount):
+            return ExpressionWrapper(F('current_stock') * amount, output_field=money)
+
+        cls.objects.filter(sku__in=skus).update(
+            product=current('name'),
+            category=current('category__name'),
+            unit_selling_price=current('price'),
+            current_stock_value_purchase_price=times(current('cost_price')),
+            current_stock_value_sale_price=times(current('price')),
+            potential_profit=times(current('price') - current('cost_price')),
+        )
+
+    @classmethod
+    def rebuild(cls):
+        """Replace every row with values computed from grouped queries over the source tables."""
+        on_hand = cls._on_hand(InventoryItem.objects.all())
+        history = cls._history(InventoryMovement.objects.all())
+        keys = set(on_hand) | set(history)
+        products = Product.objects.select_related('category').in_bulk(
+            {product_id for product_id, _ in keys})
+        empty = dict.fromkeys(cls.MOVEMENT_TOTALS.values(), 0)
+        rows = [
+            cls(sku=products[product_id].sku, location=name, variation='',
+                **cls._valuation(products[product_id], on_hand.get((product_id, name), 0)),
+                **history.get((product_id, name), empty))
+            for product_id, name in sorted(keys)
+        ]
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(rows, batch_size=1000)
+        return len(rows)
+
 class Expense(models.Model):
     date = models.DateField()
     reference_no = models.CharField(max_length=100)
@@ -361,6 +980,12 @@ class Expense(models.Model):
     payment_due = models.DecimalField(max_digits=10, decimal_places=2)
     expense_for = models.CharField(max_length=255)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['expense_category', 'payment_status'], name='expense_category_payment_idx'),
+            models.Index(fields=['payment_status'], name='expense_payment_idx'),
+        ]
+
     def __str__(self):
         return self.reference_no
 
@@ -373,7 +998,8 @@ class ExpenseCategory(models.Model):
 
 
 class MonthlySales(models.Model):
-    month = models.CharField(max_length=20)
+    # "YYYY-MM"; maintained by SalesRollup.record()
+    month = models.CharField(max_length=20, unique=True)
     sales = models.FloatField()
 
     def __str__(self):
@@ -389,6 +1015,92 @@ class Metrics(models.Model):
     def __str__(self):
         return "Dashboard Metrics"
 
+    # The counts are kept current as customers and stock change (core.signals
+    # and checkout), so the dashboard reads them without counting.
+
+    @classmethod
+    def adjust(cls, **deltas):
+        deltas = {field: delta for field, delta in deltas.items() if delta}
+        if deltas and not cls.objects.update(
+                **{field: F(field) + delta for field, delta in deltas.items()}):
+            cls.recount()
+
+    @classmethod
+    def recount(cls, *fields):
+        counted = {
+            'number_of_customers': Customer.objects.all(),
+            'out_of_stock_products': Product.objects.filter(stock_quantity=0),
+        }
+        # One UPDATE with the counts as subqueries; create the row if missing.
+        if not cls.objects.update(**{
+                field: Subquery(rows.order_by().values(n=Func(F('pk'), function='COUNT')))
+                for field, rows in counted.items() if not fields or field in fields}):
+            cls.objects.create(**{field: rows.count() for field, rows in counted.items()})
+
+
+class SalesRollup(models.Model):
+    PERIOD_CHOICES = [
+        ('DAY', 'Daily'),
+        ('WEEK', 'Weekly'),
+        ('MONTH', 'Monthly')
+    ]
+
+    period = models.CharField(max_length=5, choices=PERIOD_CHOICES)
+    period_start = models.DateField()
+    total_sales = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    transaction_count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ['period', 'period_start']
+
+    def __str__(self):
+        return f"{self.period} {self.period_start}: {self.total_sales}"
+
+    @staticmethod
+    def period_starts(day):
+        return {
+            'DAY': day,
+            'WEEK': day - timedelta(days=day.weekday()),
+            'MONTH': day.replace(day=1),
+        }
+
+    @classmethod
+    def record(cls, sale, sign=1):
+        """Add a completed transaction to its rollups, or remove it with sign=-1."""
+        amount = sign * Decimal(sale.total_amount)
+        starts = cls.period_starts(timezone.localdate(sale.timestamp))
+        with transaction.atomic():
+            for period, start in starts.items():
+                _increment(cls.objects.filter(period=period, period_start=start),
+                           dict(period=period, period_start=start),
+                           total_sales=amount, transaction_count=sign)
+            _increment(MonthlySales.objects.filter(month=starts['MONTH'].strftime('%Y-%m')),
+                       dict(month=starts['MONTH'].strftime('%Y-%m')),
+                       sales=float(amount))
+
+    @classmethod
+    def _totals_query(cls, day):
+        starts = cls.period_starts(day)
+        return starts, cls.objects.filter(
+            models.Q(period='DAY', period_start=starts['DAY'])
+            | models.Q(period='WEEK', period_start=starts['WEEK'])
+            | models.Q(period='MONTH', period_start=starts['MONTH'])
+        ).values_list('period', 'total_sales')
+
+    @classmethod
+    def totals_for(cls, day):
+        starts, rows = cls._totals_query(day)
+        totals = dict.fromkeys(starts, Decimal('0.00'))
+        totals.update(rows)
+        return totals
+
+    @classmethod
+    async def atotals_for(cls, day):
+        starts, rows = cls._totals_query(day)
+        totals = dict.fromkeys(starts, Decimal('0.00'))
+        totals.update([row async for row in rows])
+        return totals
+
 class Discount(models.Model):
     DISCOUNT_TYPE_CHOICES = [
         ('Product wise discount', 'Product wise discount'),
@@ -404,6 +1116,16 @@ class Discount(models.Model):
     quantity = models.PositiveIntegerField(null=True, blank=True)
     total_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     discount_percent = models.DecimalField(max_digits=5, decimal_places=2)
+    # Stamped by ChangeSequence.stamp() for the till sync feed (core/sync.py)
+    change_seq = models.BigIntegerField(default=0, db_index=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['from_date', 'to_date'], name='discount_dates_idx'),
+            models.Index(fields=['discount_type', 'all_products_discount'], name='discount_type_all_idx'),
+            models.Index(fields=['id'], name='discount_all_products_idx',
+                         condition=models.Q(all_products_discount=True)),
+        ]
 
     def __str__(self):
         return f"{self.discount_type} from {self.from_date} to {self.to_date}"
@@ -422,4 +1144,77 @@ class ProductCategory(models.Model):
 
 class Unit(models.Model):
     name = models.CharField(max_length=50)  # e.g., "piece", "kg", "liter"
-    symbol = models.CharField(max_length=10)  # e.g., "pcs", "kg", "L"
\ No newline at end of file
+    symbol = models.CharField(max_length=10)  # e.g., "pcs", "kg", "L"
+
+
+class ChangeSequence(models.Model):
+    """
+    The one counter behind the ``change_seq`` columns of the models the tills
+    sync. stamp() takes the next value and writes it on the changed rows in
+    the same transaction, so whoever reads the counter at N sees every row
+    stamped up to N, and a row committed later always gets more than N.
+
+    That needs stamping transactions to commit in sequence order, so the
+    update of the pk=1 row is deliberately where they serialize: a second
+    writer waits on its lock until the first commits. Allocating ranges per
+    transaction would let a lower number commit after a till has read a
+    higher one, and the till would never see that row. SQLite serializes
+    writers anyway; elsewhere, stamp as late in the transaction as possible.
+    """
+    value = models.BigIntegerField(default=0)
+    # Tombstones up to this value have been pruned.
+    pruned_through = models.BigIntegerField(default=0)
+
+    @classmethod
+    def current(cls):
+        return cls.objects.filter(pk=1).values_list('value', 'pruned_through').first() or (0, 0)
+
+    @classmethod
+    def stamp(cls, *querysets):
+        """Mark the rows of ``querysets`` as changed, all under one new sequence number."""
+        with transaction.atomic(savepoint=False):
+            _increment(cls.objects.filter(pk=1), {'pk': 1}, value=1)
+            latest = Subquery(cls.objects.filter(pk=1).values('value'))
+            for queryset in querysets:
+                queryset.update(change_seq=latest)
+
+    @classmethod
+    def tombstone(cls, model, pks):
+        with transaction.atomic(savepoint=False):
+            _increment(cls.objects.filter(pk=1), {'pk': 1}, value=1)
+            seq = cls.objects.values_list('value', flat=True).get(pk=1)
+            SyncTombstone.objects.bulk_create(
+                SyncTombstone(model=model._meta.label_lower, object_id=pk, change_seq=seq)
+                for pk in pks)
+
+
+class SyncTombstone(models.Model):
+    """A deleted row of a synced model, kept so tills learn about the delete."""
+    model = models.CharField(max_length=100)
+    object_id = models.BigIntegerField()
+    change_seq = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['change_seq'], name='tombstone_seq_idx'),
+            models.Index(fields=['deleted_at'], name='tombstone_deleted_at_idx'),
+        ]
+
+
+class IdempotentResponse(models.Model):
+    """
+    The stored outcome of a request sent with an Idempotency-Key header
+    (core/idempotency.py). ``key`` and ``request_hash`` are digests, and
+    ``body`` is the zlib-compressed JSON that was sent back.
+    """
+    key = models.BinaryField(max_length=32, unique=True)
+    request_hash = models.BinaryField(max_length=16)
+    status_code = models.PositiveSmallIntegerField()
+    body = models.BinaryField()
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['expires_at'], name='idempotency_expires_idx'),
+        ]
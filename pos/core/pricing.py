@@ -0,0 +1,176 @@
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Q
+from django.utils import timezone
+
+from core.models import Discount, Product
+
+# Each day has one cache entry per product, holding the product-wise rules
+# and total-price discounts that name it, plus one entry for the rules that
+# apply to every product. A basket is priced from a single get_many.
+TIMEOUT = 24 * 60 * 60
+CENT = Decimal('0.01')
+
+TOTAL_PRICE = 'Total price discount'
+
+
+def _cache():
+    return caches[getattr(settings, 'PRICING_CACHE_ALIAS', 'default')]
+
+
+def _product_key(day, product_id):
+    return f'pricing:{day}:product:{product_id}'
+
+
+def _global_key(day):
+    return f'pricing:{day}:global'
+
+
+def _active(day):
+    return {'from_date__lte': day, 'to_date__gte': day}
+
+
+def _line_rule(discount_id, quantity_based, quantity, percent):
+    min_quantity = (quantity or 1) if quantity_based else 1
+    return (min_quantity, Decimal(percent), discount_id)
+
+
+def _best_rules(rules):
+    # Keep only rules not beaten by one that needs no more items and gives
+    # at least as much, ordered by the quantity they need.
+    kept = []
+    for rule in sorted(rules, key=lambda rule: (rule[0], -rule[1], rule[2])):
+        if not kept or rule[1] > kept[-1][1]:
+            kept.append(rule)
+    return kept
+
+
+def _build_products(day, product_ids):
+    entries = {pk: {'lines': [], 'totals': []} for pk in product_ids}
+    rows = Discount.products.through.objects.filter(
+        product_id__in=product_ids, **{f'discount__{k}': v for k, v in _active(day).items()}
+    ).values_list('product_id', 'discount_id', 'discount__discount_type',
+                  'discount__quantity_based_discount', 'discount__quantity',
+                  'discount__discount_percent')
+    for product_id, discount_id, discount_type, quantity_based, quantity, percent in rows:
+        if discount_type == TOTAL_PRICE:
+            entries[product_id]['totals'].append(discount_id)
+        else:
+            entries[product_id]['lines'].append(
+                _line_rule(discount_id, quantity_based, quantity, percent))
+    for entry in entries.values():
+        entry['lines'] = _best_rules(entry['lines'])
+    return entries
+
+
+def _build_global(day):
+    entry = {'lines': [], 'totals': {}}
+    discounts = Discount.objects.filter(
+        Q(all_products_discount=True) | Q(discount_type=TOTAL_PRICE), **_active(day)
+    ).values_list('id', 'discount_type', 'all_products_discount',
+                  'quantity_based_discount', 'quantity', 'total_price', 'discount_percent')
+    for pk, discount_type, all_products, quantity_based, quantity, total_price, percent in discounts:
+        if discount_type == TOTAL_PRICE:
+            entry['totals'][pk] = (total_price or Decimal('0'), Decimal(percent), all_products)
+        else:
+            entry['lines'].append(_line_rule(pk, quantity_based, quantity, percent))
+    entry['lines'] = _best_rules(entry['lines'])
+    return entry
+
+
+def price_book(product_ids, day=None):
+    """Return the day's global rules and a dict of per-product rules for ``product_ids``."""
+    day = day or timezone.localdate()
+    cache = _cache()
+    keys = {_product_key(day, pk): pk for pk in product_ids}
+    found = cache.get_many([_global_key(day), *keys])
+
+    global_rules = found.pop(_global_key(day), None)
+    if global_rules is None:
+        global_rules = _build_global(day)
+        cache.set(_global_key(day), global_rules, TIMEOUT)
+
+    entries = {keys[key]: entry for key, entry in found.items()}
+    missing = [pk for pk in product_ids if pk not in entries]
+    if missing:
+        built = _build_products(day, missing)
+        cache.set_many({_product_key(day, pk): entry for pk, entry in built.items()}, TIMEOUT)
+        entries.update(built)
+    return global_rules, entries
+
+
+def refresh(product_ids, day=None):
+    """Rebuild today's entries for ``product_ids`` and the global rules after a discount change."""
+    day = day or timezone.localdate()
+    cache = _cache()
+    cache.set(_global_key(day), _build_global(day), TIMEOUT)
+    if product_ids:
+        cache.set_many({_product_key(day, pk): entry
+                        for pk, entry in _build_products(day, list(product_ids)).items()},
+                       TIMEOUT)
+
+
+def _best_line_rule(rules, quantity):
+    best = None
+    for min_quantity, percent, discount_id in rules:
+        if min_quantity <= quantity and (best is None or percent > best[0]):
+            best = (percent, discount_id)
+    return best
+
+
+def _money(value):
+    return value.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def price_basket(lines, day=None):
+    """
+    Price ``lines`` (product id, quantity) with the best product-wise discount
+    for each line and then the best total-price discount for the basket.
+    Raises ValueError for unknown or inactive products.
+    """
+    quantities = {}
+    for product_id, quantity in lines:
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+
+    prices = dict(Product.objects.filter(pk__in=quantities, is_active=True)
+                  .values_list('pk', 'price'))
+    unknown = sorted(set(quantities) - set(prices))
+    if unknown:
+        raise ValueError(f"Unknown or inactive products: {unknown}")
+
+    global_rules, entries = price_book(list(quantities), day)
+    priced = []
+    for product_id, quantity in quantities.items():
+        entry = entries[product_id]
+        subtotal = prices[product_id] * quantity
+        best = _best_line_rule(entry['lines'] + global_rules['lines'], quantity)
+        discount = _money(subtotal * best[0] / 100) if best else Decimal('0.00')
+        priced.append({
+            'product': product_id,
+            'quantity': quantity,
+            'unit_price': prices[product_id],
+            'subtotal': _money(subtotal),
+            'discount': best[1] if best else None,
+            'discount_amount': discount,
+            'total': _money(subtotal) - discount,
+        })
+
+    subtotal = sum((line['total'] for line in priced), Decimal('0.00'))
+    basket_discount, basket_discount_amount = None, Decimal('0.00')
+    for discount_id, (threshold, percent, all_products) in global_rules['totals'].items():
+        eligible = sum((line['total'] for line in priced
+                        if all_products or discount_id in entries[line['product']]['totals']),
+                       Decimal('0.00'))
+        amount = _money(eligible * percent / 100)
+        if eligible and eligible >= threshold and amount > basket_discount_amount:
+            basket_discount, basket_discount_amount = discount_id, amount
+
+    return {
+        'lines': priced,
+        'subtotal': subtotal,
+        'basket_discount': basket_discount,
+        'basket_discount_amount': basket_discount_amount,
+        'total': subtotal - basket_discount_amount,
+    }
@@ -0,0 +1,131 @@
+from decimal import Context, Decimal
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.response import Response
+from rest_framework.settings import ISO_8601, api_settings
+
+# Fields whose representation of a database value is the value itself:
+# ints, strs and bools come back from the database as such, and a foreign
+# key column in values_list() is already the primary key.
+PASS_THROUGH = (serializers.IntegerField, serializers.CharField, serializers.ChoiceField,
+                serializers.BooleanField, serializers.PrimaryKeyRelatedField)
+
+
+def _decimal(field, model_field):
+    coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+    if (not coerce_to_string or field.localize or field.normalize_output
+            or field.decimal_places is None):
+        return field.to_representation
+    if (isinstance(model_field, models.DecimalField)
+            and (model_field.decimal_places, model_field.max_digits)
+            == (field.decimal_places, field.max_digits)):
+        # The database hands back values already quantized to the column.
+        return _plain_decimal
+    exponent = Decimal('.1') ** field.decimal_places
+    context = Context(prec=field.max_digits) if field.max_digits else None
+    rounding = field.rounding
+
+    def convert(value):
+        if not isinstance(value, Decimal):
+            return field.to_representation(value)
+        return f'{value.quantize(exponent, rounding=rounding, context=context):f}'
+    return convert
+
+
+def _plain_decimal(value):
+    return f'{value:f}'
+
+
+def _datetime(field):
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    tz = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+    if output_format is None or output_format.lower() != ISO_8601 or tz is None:
+        return field.to_representation
+
+    def convert(value):
+        if timezone.is_naive(value):
+            return field.to_representation(value)
+        text = value.astimezone(tz).isoformat()
+        return text[:-6] + 'Z' if text.endswith('+00:00') else text
+    return convert
+
+
+def _converter(field, model_field):
+    kind = type(field)
+    if kind in PASS_THROUGH and not getattr(field, 'pk_field', None):
+        return None
+    if kind is serializers.DecimalField:
+        return _decimal(field, model_field)
+    if kind is serializers.DateTimeField:
+        return _datetime(field)
+    if kind is serializers.UUIDField and field.uuid_format == 'hex_verbose':
+        return str
+    return field.to_representation
+
+
+def _model_field(model, name):
+    try:
+        return model._meta.get_field(name) if model is not None else None
+    except FieldDoesNotExist:
+        return None
+
+
+class RowSerializer:
+    """
+    Renders a queryset as ``serializer`` would, from ``values_list()`` rows
+    instead of model instances. Each column goes through one converter
+    picked up front from its serializer field, and columns the database
+    already returns in their final form are copied as they are. Only plain
+    model fields are supported; anything else raises ValueError.
+
+    ``extra`` columns (e.g. a pagination cursor field) are fetched but not
+    rendered.
+    """
+
+    def __init__(self, serializer, extra=()):
+        fields = [field for field in serializer.fields.values() if not field.write_only]
+        for field in fields:
+            if (isinstance(field, (serializers.BaseSerializer, serializers.ManyRelatedField,
+                                   serializers.SerializerMethodField))
+                    or field.source == '*' or '.' in field.source):
+                raise ValueError(f"{field.field_name} is not a plain model field")
+        self.columns = [field.source for field in fields]
+        self.columns += [name for name in extra if name not in self.columns]
+        model = getattr(getattr(serializer, 'Meta', None), 'model', None)
+        self._plan = [(field.field_name, _converter(field, _model_field(model, field.source)))
+                      for field in fields]
+
+    def rows(self, queryset):
+        return queryset.values_list(*self.columns, named=True)
+
+    def data(self, rows):
+        plan = self._plan
+        return [
+            {name: value if value is None or convert is None else convert(value)
+             for (name, convert), value in zip(plan, row)}
+            for row in rows
+        ]
+
+
+class FastListMixin:
+    """
+    A read-only list() that renders through RowSerializer. Retrieve and
+    writes keep the ViewSet's regular serializer, and the output is the same
+    bytes either way.
+    """
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        extra = ()
+        if self.paginator is not None and hasattr(self.paginator, 'get_ordering'):
+            ordering = self.paginator.get_ordering(request, queryset, self)
+            extra = [field.lstrip('-') for field in ordering]
+        renderer = RowSerializer(self.get_serializer(), extra=extra)
+        rows = renderer.rows(queryset)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(renderer.data(page))
+        return Response(renderer.data(rows))
@@ -0,0 +1,79 @@
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from core.exports import write_report_file
+from core.models import Report, ReportSchedule
+
+# Report.file_job while a file is being built. Reports queued from the API
+# start out PENDING; the scheduler moves them to RUNNING when it claims them.
+PENDING = 'PENDING'
+RUNNING = 'RUNNING'
+FAILED = 'FAILED'
+
+
+def claim_due_schedules(limit, file_format='csv', now=None):
+    """
+    Create a RUNNING Report for up to ``limit`` due schedules and move their
+    ``next_run`` forward. Rows locked by another worker are skipped, and the
+    ``next_run`` check in the update keeps two workers from claiming the same
+    run on databases without row locks. Schedules without recipients have
+    nobody to own the report and stay due until one is added.
+    """
+    now = now or timezone.now()
+    reports = []
+    has_recipients = Exists(ReportSchedule.recipients.through.objects.filter(
+        reportschedule_id=OuterRef('pk')))
+    with transaction.atomic():
+        due = ReportSchedule.objects.select_for_update(skip_locked=True).filter(
+            has_recipients, is_active=True, next_run__lte=now).order_by('next_run')[:limit]
+        for schedule in due:
+            claimed = ReportSchedule.objects.filter(
+                pk=schedule.pk, next_run=schedule.next_run
+            ).update(last_run=now, next_run=schedule.following_run(now))
+            if claimed:
+                reports.append(queue_report(schedule, RUNNING, file_format))
+    return reports
+
+
+def queue_report(schedule, status=PENDING, file_format='csv', run=None):
+    """
+    A Report for the run of ``schedule`` due at ``run`` (its ``next_run`` by
+    default), owned by its first recipient. Returns None when it has none.
+    """
+    owner = schedule.recipients.order_by('pk').first()
+    if owner is None:
+        return None
+    start_date, end_date = schedule.report_period(run)
+    return Report.objects.create(
+        report_type=schedule.report_type,
+        start_date=start_date,
+        end_date=end_date,
+        generated_by=owner,
+        parameters={'schedule': schedule.pk},
+        results={},
+        file_job={'status': status, 'format': file_format},
+    )
+
+
+def claim_pending_reports(limit):
+    """Mark up to ``limit`` reports queued through the API as RUNNING and return their ids."""
+    claimed = []
+    pending = Report.objects.filter(file_job__status=PENDING).order_by('pk')
+    for pk, file_job in pending.values_list('pk', 'file_job')[:limit]:
+        if Report.objects.filter(pk=pk, file_job__status=PENDING).update(
+                file_job=dict(file_job, status=RUNNING)):
+            claimed.append(pk)
+    return claimed
+
+
+def build_report(report_id):
+    """Write one report's file. Runs in a worker process; returns (id, error)."""
+    try:
+        report = Report.objects.get(pk=report_id)
+        write_report_file(report, report.file_job.get('format', 'csv'))
+    except Exception as e:
+        Report.objects.filter(pk=report_id).update(
+            file_job={'status': FAILED, 'error': str(e)})
+        return report_id, str(e)
+    return report_id, None
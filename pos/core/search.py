@@ -0,0 +1,274 @@
+import operator
+import re
+from functools import lru_cache, reduce
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from rest_framework import filters
+
+from core.models import Customer, Product
+
+# Fields kept in the full-text index for each model. They mirror the
+# search_fields of ProductViewSet and CustomerViewSet.
+SEARCH_INDEXES = {
+    Product: ['name', 'barcode', 'sku'],
+    Customer: ['name', 'business_name', 'mobile', 'email'],
+}
+
+# Code fields searched with LIKE '%term%' when the index finds nothing: the
+# index matches words by prefix, so it cannot find a barcode or SKU by the
+# digits in its middle or at its end.
+INFIX_FIELDS = {
+    Product: ['barcode', 'sku'],
+}
+
+# The most vocabulary words read per prefix range when correcting a typo.
+FUZZY_CANDIDATE_LIMIT = 200
+
+TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    return [term.lower() for term in TERM_RE.findall(text or '')]
+
+
+def edit_distance_at_most_one(a, b):
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    if len(a) == len(b):
+        # substitution, or transposition of two neighbours
+        return a[i + 1:] == b[i + 1:] or (
+            a[i + 2:] == b[i + 2:] and a[i:i + 2] == b[i:i + 2][::-1])
+    return a[i:] == b[i + 1:]
+
+
+class SearchBackend:
+    """Keeps a model's full-text index in sync and filters querysets with it."""
+
+    def create_index(self, model):
+        pass
+
+    def drop_index(self, model):
+        pass
+
+    def index(self, instance):
+        pass
+
+    def index_many(self, instances):
+        for instance in instances:
+            self.index(instance)
+
+    def remove(self, model, pk):
+        pass
+
+    def rebuild(self, model):
+        pass
+
+    def filter(self, queryset, terms):
+        raise NotImplementedError
+
+    def infix_filter(self, queryset, terms):
+        """Rows whose INFIX_FIELDS contain every term; a scan, so only a fallback."""
+        fields = INFIX_FIELDS.get(queryset.model)
+        if not fields:
+            return queryset.none()
+        for term in terms:
+            queryset = queryset.filter(reduce(operator.or_, (
+                Q(**{f'{field}__icontains': term}) for field in fields)))
+        return queryset
+
+
+class SQLiteFTSBackend(SearchBackend):
+    """
+    One FTS5 table per model, keyed by primary key (``rowid``). Every term is
+    matched as a prefix; when that finds nothing, terms of four or more
+    characters are widened to indexed words within one edit, and when that
+    finds nothing either, INFIX_FIELDS are searched with LIKE.
+    """
+
+    def table(self, model):
+        return f'{model._meta.db_table}_fts'
+
+    def create_index(self, model):
+        table = self.table(model)
+        columns = ', '.join(SEARCH_INDEXES[model])
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5("
+                f"{columns}, prefix='2 3', tokenize='unicode61')"
+            )
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {table}_vocab "
+                f"USING fts5vocab({table}, 'row')"
+            )
+
+    def drop_index(self, model):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {self.table(model)}_vocab")
+            cursor.execute(f"DROP TABLE IF EXISTS {self.table(model)}")
+
+    def index(self, instance):
+        fields = SEARCH_INDEXES[type(instance)]
+        placeholders = ', '.join(['%s'] * (len(fields) + 1))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT OR REPLACE INTO {self.table(type(instance))} "
+                f"(rowid, {', '.join(fields)}) VALUES ({placeholders})",
+                [instance.pk] + [getattr(instance, field) or '' for field in fields],
+            )
+
+    def index_many(self, instances):
+        if not instances:
+            return
+        model = type(instances[0])
+        fields = SEARCH_INDEXES[model]
+        placeholders = ', '.join(['%s'] * (len(fields) + 1))
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT OR REPLACE INTO {self.table(model)} "
+                f"(rowid, {', '.join(fields)}) VALUES ({placeholders})",
+                [[instance.pk] + [getattr(instance, field) or '' for field in fields]
+                 for instance in instances],
+            )
+
+    def remove(self, model, pk):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table(model)} WHERE rowid = %s", [pk])
+
+    def rebuild(self, model):
+        table = self.table(model)
+        fields = ', '.join(SEARCH_INDEXES[model])
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {table}")
+            cursor.execute(
+                f"INSERT INTO {table} (rowid, {fields}) "
+                f"SELECT id, {fields} FROM {model._meta.db_table}"
+            )
+
+    def filter(self, queryset, terms):
+        model = queryset.model
+        match = ' AND '.join(f'"{term}"*' for term in terms)
+        if not self._has_match(model, match):
+            match = self._fuzzy_match(model, terms)
+            if not self._has_match(model, match):
+                return self.infix_filter(queryset, terms)
+        return queryset.filter(pk__in=RawSQL(
+            f"SELECT rowid FROM {self.table(model)} WHERE {self.table(model)} MATCH %s",
+            [match],
+        ))
+
+    def _has_match(self, model, match):
+        table = self.table(model)
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT 1 FROM {table} WHERE {table} MATCH %s LIMIT 1", [match])
+            return cursor.fetchone() is not None
+
+    def _fuzzy_match(self, model, terms):
+        clauses = []
+        with connection.cursor() as cursor:
+            for term in terms:
+                candidates = [f'"{term}"*']
+                if len(term) >= 4:
+                    # A word within one edit keeps the first two letters, or
+                    # drops or swaps the second one, so two short ranges of
+                    # the term index hold every candidate except typos in the
+                    # first letter and a changed or added second letter.
+                    # Words more than one letter longer or shorter cannot be
+                    # within one edit either.
+                    for prefix in {term[:2], term[0] + term[2]}:
+                        cursor.execute(
+                            f"SELECT term FROM {self.table(model)}_vocab "
+                            f"WHERE term >= %s AND term < %s "
+                            f"AND length(term) BETWEEN %s AND %s LIMIT %s",
+                            [prefix, prefix[0] + chr(ord(prefix[1]) + 1),
+                             len(term) - 1, len(term) + 1, FUZZY_CANDIDATE_LIMIT],
+                        )
+                        candidates += [f'"{word}"' for (word,) in cursor.fetchall()
+                                       if edit_distance_at_most_one(term, word)]
+                clauses.append(f"({' OR '.join(candidates)})")
+        return ' AND '.join(clauses)
+
+
+class PostgresSearchBackend(SearchBackend):
+    """
+    Matches a ``to_tsvector('simple', ...)`` expression covered by a GIN index
+    (created in migration 0006), so Postgres maintains it on every write.
+    Falls back to pg_trgm similarity for typos, then to INFIX_FIELDS.
+    """
+
+    def create_index(self, model):
+        table = model._meta.db_table
+        document = " || ' ' || ".join(
+            f"coalesce({field}, '')" for field in SEARCH_INDEXES[model])
+        with connection.cursor() as cursor:
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {table}_fts_idx ON {table} "
+                f"USING GIN (to_tsvector('simple', {document}))"
+            )
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {table}_trgm_idx ON {table} "
+                f"USING GIN (({document}) gin_trgm_ops)"
+            )
+
+    def drop_index(self, model):
+        table = model._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP INDEX IF EXISTS {table}_fts_idx")
+            cursor.execute(f"DROP INDEX IF EXISTS {table}_trgm_idx")
+
+    def filter(self, queryset, terms):
+        model = queryset.model
+        document = " || ' ' || ".join(
+            f'coalesce("{model._meta.db_table}"."{field}", \'\')'
+            for field in SEARCH_INDEXES[model])
+        tsquery = ' & '.join(f"{term}:*" for term in terms)
+        matched = queryset.filter(pk__in=RawSQL(
+            f"SELECT id FROM {model._meta.db_table} "
+            f"WHERE to_tsvector('simple', {document}) @@ to_tsquery('simple', %s)",
+            [tsquery],
+        ))
+        if matched.exists():
+            return matched
+        similar = queryset.filter(pk__in=RawSQL(
+            f"SELECT id FROM {model._meta.db_table} WHERE %s <%% ({document})",
+            [' '.join(terms)],
+        ))
+        if similar.exists():
+            return similar
+        return self.infix_filter(queryset, terms)
+
+
+@lru_cache(maxsize=None)
+def _sqlite_has_fts5():
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA compile_options")
+        return any('FTS5' in option for (option,) in cursor.fetchall())
+
+
+def get_backend():
+    """Return the backend for the configured database, or None to fall back to LIKE."""
+    if connection.vendor == 'sqlite' and _sqlite_has_fts5():
+        return SQLiteFTSBackend()
+    if connection.vendor == 'postgresql':
+        return PostgresSearchBackend()
+    return None
+
+
+class FullTextSearchFilter(filters.SearchFilter):
+    """Drop-in replacement for SearchFilter that uses the full-text index."""
+
+    def filter_queryset(self, request, queryset, view):
+        backend = get_backend()
+        terms = [term for text in self.get_search_terms(request) for term in tokenize(text)]
+        if backend is None or not terms or queryset.model not in SEARCH_INDEXES:
+            return super().filter_queryset(request, queryset, view)
+        return backend.filter(queryset, terms)
@@ -0,0 +1,128 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from core import barcode_cache, catalog_cache, pricing, search
+from core.models import (
+    Brand, ChangeSequence, Customer, CustomerCredit, Discount, ExpenseCategory, InventoryItem,
+    Metrics, Product, ProductCategory, Stock, StorageLocation, Unit,
+)
+
+
+@receiver(post_save, sender=Customer)
+def customer_saved(sender, instance, created, **kwargs):
+    if created:
+        Metrics.adjust(number_of_customers=1)
+
+
+@receiver(post_delete, sender=Customer)
+def customer_deleted(sender, instance, **kwargs):
+    Metrics.adjust(number_of_customers=-1)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def product_stock_changed(sender, **kwargs):
+    Metrics.recount('out_of_stock_products')
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Discount)
+@receiver(post_delete, sender=Discount)
+@receiver(m2m_changed, sender=Discount.products.through)
+def catalog_changed(sender, **kwargs):
+    transaction.on_commit(barcode_cache.invalidate)
+
+
+@receiver([post_save, post_delete], sender=Brand)
+@receiver([post_save, post_delete], sender=ProductCategory)
+@receiver([post_save, post_delete], sender=Unit)
+@receiver([post_save, post_delete], sender=StorageLocation)
+@receiver([post_save, post_delete], sender=ExpenseCategory)
+def reference_data_changed(sender, **kwargs):
+    transaction.on_commit(lambda: catalog_cache.bump(sender))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Discount)
+@receiver(post_save, sender=Customer)
+@receiver(post_save, sender=InventoryItem)
+@receiver(post_save, sender=CustomerCredit)
+def synced_row_saved(sender, instance, **kwargs):
+    ChangeSequence.stamp(sender.objects.filter(pk=instance.pk))
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Discount)
+@receiver(post_delete, sender=Customer)
+@receiver(post_delete, sender=InventoryItem)
+@receiver(post_delete, sender=CustomerCredit)
+def synced_row_deleted(sender, instance, **kwargs):
+    ChangeSequence.tombstone(sender, [instance.pk])
+
+
+@receiver(m2m_changed, sender=Discount.products.through)
+def discount_products_synced(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        instance._synced_discounts = list(instance.discounts.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        if not reverse:
+            discount_ids = [instance.pk]
+        elif action == 'post_clear':
+            discount_ids = instance._synced_discounts
+        else:
+            discount_ids = pk_set
+        ChangeSequence.stamp(Discount.objects.filter(pk__in=discount_ids))
+
+
+def _refresh_pricing(product_ids):
+    transaction.on_commit(lambda: pricing.refresh(product_ids))
+
+
+@receiver(pre_delete, sender=Discount)
+def discount_deleting(sender, instance, **kwargs):
+    # The M2M rows are gone by post_delete.
+    instance._priced_products = list(instance.products.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Discount)
+@receiver(post_delete, sender=Discount)
+def discount_changed(sender, instance, **kwargs):
+    product_ids = getattr(instance, '_priced_products', None)
+    if product_ids is None:
+        product_ids = list(instance.products.values_list('pk', flat=True))
+    _refresh_pricing(product_ids)
+
+
+@receiver(m2m_changed, sender=Discount.products.through)
+def discount_products_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        instance._priced_products = (
+            [instance.pk] if reverse else list(instance.products.values_list('pk', flat=True)))
+    elif action == 'post_clear':
+        _refresh_pricing(instance._priced_products)
+    elif action in ('post_add', 'post_remove'):
+        _refresh_pricing([instance.pk] if reverse else list(pk_set))
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, created, **kwargs):
+    if not created:
+        Stock.reprice([instance.sku])
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Customer)
+def update_search_index(sender, instance, **kwargs):
+    backend = search.get_backend()
+    if backend is not None:
+        backend.index(instance)
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Customer)
+def remove_from_search_index(sender, instance, **kwargs):
+    backend = search.get_backend()
+    if backend is not None:
+        backend.remove(sender, instance.pk)
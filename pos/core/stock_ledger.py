@@ -0,0 +1,109 @@
+from django.db import transaction
+from django.db.models import Max, Sum
+from django.utils import timezone
+
+from core.models import InventoryMovement, StockBalance, StockSnapshot, StockSnapshotLine
+
+
+def movement_deltas(movements):
+    """
+    Sum the stock changes of ``movements`` per (product_id, location_id) in
+    the database, with one grouped query for each side of a movement.
+    """
+    at_from, at_to = InventoryMovement.delta_expressions()
+    totals = {}
+    sides = (
+        ('from_location', at_from, movements),
+        ('to_location', at_to, movements.filter(to_location__isnull=False)),
+    )
+    for location, delta, queryset in sides:
+        rows = queryset.values('product', location).annotate(
+            delta=Sum(delta)).values_list('product', location, 'delta').order_by()
+        for product_id, location_id, change in rows.iterator(chunk_size=5000):
+            if change:
+                key = (product_id, location_id)
+                totals[key] = totals.get(key, 0) + change
+    return totals
+
+
+def _base(when=None):
+    """The latest snapshot taken at or before ``when`` (default: the latest one)."""
+    snapshots = StockSnapshot.objects.order_by('-taken_at', '-id')
+    if when is not None:
+        snapshots = snapshots.filter(taken_at__lte=when)
+    return snapshots.first()
+
+
+def stock_at(when, product_id=None, location_id=None):
+    """
+    Stock per (product_id, location_id) as of ``when``: the latest snapshot
+    before it plus the movements written after that snapshot, so the cost
+    grows with the movements since the snapshot rather than all history.
+    """
+    snapshot = _base(when)
+    lines = StockSnapshotLine.objects.none()
+    tail = InventoryMovement.objects.filter(timestamp__lte=when)
+    if snapshot is not None:
+        lines = snapshot.lines.all()
+        tail = tail.filter(pk__gt=snapshot.last_movement_id)
+    if product_id is not None:
+        lines = lines.filter(product_id=product_id)
+        tail = tail.filter(product_id=product_id)
+
+    totals = {(product, location): quantity for product, location, quantity
+              in lines.values_list('product_id', 'location_id', 'quantity')}
+    for key, delta in movement_deltas(tail).items():
+        totals[key] = totals.get(key, 0) + delta
+    if location_id is not None:
+        totals = {key: quantity for key, quantity in totals.items() if key[1] == location_id}
+    return {key: quantity for key, quantity in totals.items() if quantity}
+
+
+def _current_totals():
+    """Stock after every movement so far, and the last movement id included."""
+    snapshot = _base()
+    last_movement_id = InventoryMovement.objects.aggregate(last=Max('pk'))['last'] or 0
+    totals = {}
+    tail = InventoryMovement.objects.filter(pk__lte=last_movement_id)
+    if snapshot is not None:
+        totals = {(product, location): quantity for product, location, quantity
+                  in snapshot.lines.values_list('product_id', 'location_id', 'quantity')}
+        tail = tail.filter(pk__gt=snapshot.last_movement_id)
+    for key, delta in movement_deltas(tail).items():
+        totals[key] = totals.get(key, 0) + delta
+    return totals, last_movement_id
+
+
+def take_snapshot():
+    """Record stock per (product, location) from the previous snapshot plus the movements since."""
+    with transaction.atomic():
+        totals, last_movement_id = _current_totals()
+        snapshot = StockSnapshot.objects.create(
+            taken_at=timezone.now(), last_movement_id=last_movement_id)
+        StockSnapshotLine.objects.bulk_create(
+            (StockSnapshotLine(snapshot=snapshot, product_id=product, location_id=location,
+                               quantity=quantity)
+             for (product, location), quantity in totals.items() if quantity),
+            batch_size=1000,
+        )
+    return snapshot
+
+
+def rebuild_balances(from_scratch=False):
+    """
+    Recompute StockBalance from the latest snapshot plus the movements after
+    it, or from every movement when ``from_scratch`` is set. Returns the
+    number of rows written; pairs whose stock nets to zero get none.
+    """
+    with transaction.atomic():
+        if from_scratch:
+            totals = movement_deltas(InventoryMovement.objects.all())
+        else:
+            totals, _ = _current_totals()
+        StockBalance.objects.all().delete()
+        written = StockBalance.objects.bulk_create(
+            (StockBalance(product_id=product, location_id=location, quantity=quantity)
+             for (product, location), quantity in totals.items() if quantity),
+            batch_size=1000,
+        )
+    return len(written)
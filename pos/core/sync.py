@@ -0,0 +1,133 @@
+from django.db import IntegrityError, transaction
+from django.db.models import F, Max
+
+from core.checkout import CheckoutError, checkout
+from core.models import (
+    ChangeSequence, Customer, CustomerCredit, Discount, InventoryItem, Product, SyncTombstone,
+    Transaction,
+)
+from core.rows import RowSerializer
+from serializers import (
+    CustomerCreditSerializer, CustomerSerializer, DiscountSerializer, InventoryItemSerializer,
+    ProductSerializer,
+)
+
+# What a till keeps offline. Every row carries the sequence number of its
+# last change (ChangeSequence.stamp), and deletes leave a SyncTombstone, so a
+# till sends the last ``until`` it saw and gets back only what changed since.
+FEEDS = {
+    'products': (Product.objects.all(), ProductSerializer),
+    'discounts': (Discount.objects.prefetch_related('products'), DiscountSerializer),
+    'customers': (Customer.objects.all(), CustomerSerializer),
+    'inventory': (InventoryItem.objects.all(), InventoryItemSerializer),
+    'customer_credits': (CustomerCredit.objects.all(), CustomerCreditSerializer),
+}
+
+
+def restamp():
+    """
+    Give every synced row its own new sequence number, for rows loaded with
+    bulk_create or raw SQL that never went through ChangeSequence.stamp().
+    Tills pick them up as ordinary changes.
+    """
+    with transaction.atomic():
+        current, _ = ChangeSequence.current()
+        last = 0
+        for queryset, _ in FEEDS.values():
+            model = queryset.model
+            model.objects.update(change_seq=F('pk') + current)
+            last = max(last, model.objects.aggregate(last=Max('pk'))['last'] or 0)
+        ChangeSequence.objects.update_or_create(pk=1, defaults={'value': current + last})
+
+
+def _render(queryset, serializer_class):
+    try:
+        renderer = RowSerializer(serializer_class())
+    except ValueError:
+        # Many-to-many fields, e.g. Discount.products
+        return serializer_class(queryset, many=True).data
+    return renderer.data(renderer.rows(queryset))
+
+
+def changes(since, limit):
+    """
+    Rows changed and deleted after sequence number ``since``, at most about
+    ``limit`` per feed. ``until`` is the ``since`` of the next call, and
+    ``more`` says whether there is a next page. ``reset`` means the deletes
+    since ``since`` have been pruned: the till must drop its copy and apply
+    this full resync from 0 instead.
+    """
+    current, pruned_through = ChangeSequence.current()
+    reset = 0 < since < pruned_through
+    if reset or since < 0:
+        since = 0
+
+    # Cut the page at the sequence number of the limit-th change of the
+    # busiest feed. Rows stamped together share a number and stay together.
+    until = current
+    sources = [queryset for queryset, _ in FEEDS.values()]
+    if since:
+        sources.append(SyncTombstone.objects.all())
+    for queryset in sources:
+        cut = queryset.filter(change_seq__gt=since, change_seq__lte=until).order_by(
+            'change_seq').values_list('change_seq', flat=True)[limit - 1:limit]
+        until = next(iter(cut), until)
+
+    window = {'change_seq__gt': since, 'change_seq__lte': until}
+    deleted = {name: [] for name in FEEDS}
+    if since:
+        labels = {queryset.model._meta.label_lower: name for name, (queryset, _) in FEEDS.items()}
+        for label, object_id in SyncTombstone.objects.filter(**window).order_by(
+                'change_seq').values_list('model', 'object_id'):
+            if label in labels:
+                deleted[labels[label]].append(object_id)
+    return {
+        'since': since,
+        'until': until,
+        'more': until < current,
+        'reset': reset,
+        'changes': {
+            name: _render(queryset.filter(**window).order_by('change_seq', 'pk'), serializer_class)
+            for name, (queryset, serializer_class) in FEEDS.items()
+        },
+        'deleted': deleted,
+    }
+
+
+def record_offline_sale(cashier, sale):
+    """
+    Check out a sale a till recorded while offline, once. ``sale`` is the
+    validated data of an OfflineSaleSerializer. Returns ``(created, receipt,
+    shortfall)``; a sale whose transaction_id is already recorded returns the
+    receipt it got the first time.
+
+    The till has already handed the goods over, so selling more than the
+    server's stock does not reject the sale: the excess is recorded as
+    negative stock (see checkout()) and returned in ``shortfall`` as
+    ``{product_id: quantity}``.
+    """
+    transaction_id = sale['transaction_id']
+    existing = Transaction.objects.filter(transaction_id=transaction_id).select_related(
+        'receipt').first()
+    if existing is not None:
+        return False, existing.receipt, {}
+    try:
+        recorded, receipt = checkout(
+            cashier=cashier,
+            customer=sale['customer'],
+            payment_method=sale['payment_method'],
+            paid_amount=sale['paid_amount'],
+            lines=[(line['product'], line['quantity']) for line in sale['lines']],
+            receipt_number=sale.get('receipt_number'),
+            transaction_id=transaction_id,
+            timestamp=sale.get('recorded_at'),
+            allow_shortfall=True,
+        )
+    except IntegrityError:
+        # The same sale uploaded concurrently.
+        existing = Transaction.objects.filter(transaction_id=transaction_id).select_related(
+            'receipt').first()
+        if existing is None:
+            raise
+        return False, existing.receipt, {}
+    return True, receipt, recorded.shortfall
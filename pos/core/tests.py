@@ -1,3 +1,1268 @@
-from django.test import TestCase
+import base64
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import OperationalError, connection, transaction
+from django.db.models import F, Sum
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import viewsets
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from core import activity, barcode_cache, metrics, stock_ledger, write_queue
+from core.checks import check_shared_caches
+from core.search import FUZZY_CANDIDATE_LIMIT, get_backend as get_search_backend
+from core.scheduler import build_report, claim_due_schedules, claim_pending_reports
+from core.bench.data import generate
+from core.bulk import BulkUpsert
+from core.models import (
+    Brand, ChangeSequence, CreditPayment, CustomUser, Customer, CustomerCredit, Discount, Expense,
+    ExpenseCategory, InventoryItem, InventoryMovement, Metrics, MonthlySales, Product,
+    ProductCategory, Purchase, PurchaseReturn, Receipt, Report, ReportSchedule, SalesOrder,
+    SalesReturn, SalesRollup, Stock, StockBalance, StorageLocation, Supplier, Transaction, Unit,
+    UserActivity, UserActivityArchive,
+)
+from core.views import InventoryMovementViewSet, StockViewSet, TransactionViewSet
+from pos.urls import router
+from serializers import ProductBulkSerializer, StockSerializer
+
+# Seeded volumes (core.bench.data) are multiplied by POS_PERF_SCALE; 50
+# gives 10k products, 100k inventory items and 1M inventory movements.
+SCALE = int(os.environ.get('POS_PERF_SCALE', '1'))
+LATENCY_CEILING_MS = float(os.environ.get('POS_PERF_LATENCY_MS', '1000'))
+
+
+class QueryBudgetTests(TestCase):
+    """
+    Every list, retrieve and custom action of the router ViewSets runs within
+    a fixed number of SQL queries and a latency ceiling against seeded data.
+    A budget that grows with the page size means an N+1 query crept in.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = generate(SCALE)
+
+    def setUp(self):
+        cache.clear()
+        barcode_cache.invalidate()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def first(self, model, **filters):
+        return model.objects.filter(**filters).order_by('pk').values_list('pk', flat=True)[0]
+
+    def requests(self):
+        """(view name, method, url, data, max queries) for every endpoint under test."""
+        product = Product.objects.order_by('pk').first()
+        location = self.first(StorageLocation)
+        customer = self.first(Customer)
+        credit = self.first(CustomerCredit)
+        receipts = Receipt.objects.order_by('pk').values_list('pk', flat=True)
+        open_sale = self.first(Transaction, is_completed=False)
+        item = self.first(InventoryItem)
+        report = self.first(Report)
+        schedule = self.first(ReportSchedule)
+        today = date.today().isoformat()
+        lines = [{'product': product.pk + i, 'quantity': 1} for i in range(3)]
+
+        def detail(name, model, queries=1):
+            return (f'{name}-detail', 'get', reverse(f'{name}-detail', args=[self.first(model)]),
+                    None, queries)
+
+        def listing(name, queries=1):
+            return (f'{name}-list', 'get', reverse(f'{name}-list'), None, queries)
+
+        return [
+            listing('useractivity'), detail('useractivity', UserActivity),
+            listing('useractivityarchive'), detail('useractivityarchive', UserActivityArchive),
+
+            listing('receipt'), detail('receipt', Receipt),
+            ('receipt-print-receipt', 'post', reverse('receipt-print-receipt', args=[receipts[0]]),
+             {}, 3),
+            ('receipt-void-receipt', 'post', reverse('receipt-void-receipt', args=[receipts[1]]),
+             {'reason': 'Wrong item'}, 20),
+
+            listing('transaction'), detail('transaction', Transaction),
+            ('transaction-complete-transaction', 'post',
+             reverse('transaction-complete-transaction', args=[open_sale]), {}, 10),
+            ('transaction-checkout', 'post', reverse('transaction-checkout'),
+             {'customer': customer, 'payment_method': 'CASH', 'paid_amount': '100.00',
+              'lines': lines}, 29),
+
+            listing('product'), detail('product', Product),
+            ('product-by-barcode', 'get',
+             reverse('product-by-barcode', kwargs={'code': product.barcode}), None, 3),
+            ('product-price-basket', 'post', reverse('product-price-basket'), {'lines': lines}, 3),
+            ('product-bulk', 'post', reverse('product-bulk'),
+             [{'name': 'New', 'barcode': 'NEW1', 'sku': 'NEW1', 'category': product.category_id,
+               'brand': product.brand_id, 'unit': product.unit_id, 'price': '1.00',
+               'cost_price': '0.50', 'stock_quantity': 1, 'packing_date': today}], 14),
+            ('product-low-stock', 'get', reverse('product-low-stock'), None, 1),
+
+            listing('inventoryitem'), detail('inventoryitem', InventoryItem),
+            ('inventoryitem-expiring', 'get', reverse('inventoryitem-expiring'), {'days': 60}, 1),
+            ('inventoryitem-update-count', 'post',
+             reverse('inventoryitem-update-count', args=[item]), {'quantity': 7}, 16),
+            ('inventoryitem-bulk', 'post', reverse('inventoryitem-bulk'),
+             [{'product': product.pk, 'batch_number': 'NEW', 'quantity': 5,
+               'location': location}], 16),
+
+            listing('inventorymovement'), detail('inventorymovement', InventoryMovement),
+            ('inventorymovement-export', 'get', reverse('inventorymovement-export'), None, 2),
+            ('inventorymovement-stock-at', 'get', reverse('inventorymovement-stock-at'),
+             {'product': product.pk}, 4),
+
+            listing('customercredit'), detail('customercredit', CustomerCredit),
+            ('customercredit-add-credit', 'post',
+             reverse('customercredit-add-credit', args=[credit]), {'amount': '10.00'}, 7),
+            ('customercredit-use-credit', 'post',
+             reverse('customercredit-use-credit', args=[credit]), {'amount': '10.00'}, 7),
+            ('customercredit-balance-at', 'get',
+             reverse('customercredit-balance-at', args=[credit]), {'at': today}, 4),
+
+            listing('report'), detail('report', Report),
+            ('report-export', 'get', reverse('report-export', args=[report]), None, 2),
+            ('report-write-file', 'post', reverse('report-write-file', args=[report]),
+             {'format': 'csv'}, 2),
+
+            listing('reportschedule', 2), detail('reportschedule', ReportSchedule, 2),
+            ('reportschedule-toggle-active', 'post',
+             reverse('reportschedule-toggle-active', args=[schedule]), {}, 3),
+            ('reportschedule-run-now', 'post',
+             reverse('reportschedule-run-now', args=[schedule]), {}, 4),
+
+            listing('customer'), detail('customer', Customer),
+            ('customer-get-total-sales', 'get',
+             reverse('customer-get-total-sales', args=[customer]), None, 2),
+
+            listing('supplier'), detail('supplier', Supplier),
+            listing('salesorder'), detail('salesorder', SalesOrder),
+            listing('salesreturn'), detail('salesreturn', SalesReturn),
+            listing('purchase'), detail('purchase', Purchase),
+            listing('purchasereturn'), detail('purchasereturn', PurchaseReturn),
+
+            listing('stock'), detail('stock', Stock),
+            ('stock-low-stock-items', 'get', reverse('stock-low-stock-items'), None, 1),
+            ('stock-valuation', 'get', reverse('stock-valuation'), None, 1),
+
+            listing('expense'), detail('expense', Expense),
+            listing('expensecategory'), detail('expensecategory', ExpenseCategory),
+
+            listing('monthlysales'), detail('monthlysales', MonthlySales),
+            ('monthlysales-year-summary', 'get', reverse('monthlysales-year-summary'), None, 1),
+
+            listing('metrics'), detail('metrics', Metrics),
+            ('metrics-dashboard-summary', 'get', reverse('metrics-dashboard-summary'), None, 3),
+
+            listing('discount', 2), detail('discount', Discount, 2),
+            ('discount-active-discounts', 'get', reverse('discount-active-discounts'), None, 2),
+
+            listing('storagelocation'), detail('storagelocation', StorageLocation),
+            listing('brand'), detail('brand', Brand),
+            listing('productcategory'), detail('productcategory', ProductCategory),
+            listing('unit'), detail('unit', Unit),
+            listing('customuser', 3), detail('customuser', CustomUser, 3),
+
+            ('sync-changes', 'get', reverse('sync-changes'), {'since': 0}, 14),
+            ('sync-upload', 'post', reverse('sync-upload'),
+             {'sales': [{'transaction_id': str(uuid.uuid4()), 'customer': customer,
+                         'payment_method': 'CASH', 'paid_amount': '100.00',
+                         'lines': lines}]}, 30),
+        ]
+
+    def call(self, method, url, data):
+        if method == 'get':
+            return self.client.get(url, data)
+        return self.client.post(url, json.dumps(data), content_type='application/json')
+
+    def test_every_endpoint_has_a_budget(self):
+        names = {name for name, *_ in self.requests()}
+        for prefix, viewset, basename in router.registry:
+            expected = {f'{basename}-{name}' for name, method in
+                        (('list', 'list'), ('detail', 'retrieve')) if hasattr(viewset, method)}
+            expected |= {f'{basename}-{action.url_name}' for action in viewset.get_extra_actions()}
+            with self.subTest(viewset=viewset.__name__):
+                self.assertEqual(expected - names, set())
+
+    def test_query_budgets(self):
+        for name, method, url, data, budget in self.requests():
+            with self.subTest(view=name, url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    start = time.perf_counter()
+                    response = self.call(method, url, data)
+                    if response.streaming:
+                        # Exports grow with the table; their latency is the first chunk.
+                        chunks = iter(response.streaming_content)
+                        next(chunks, None)
+                    elapsed_ms = (time.perf_counter() - start) * 1000
+                    if response.streaming:
+                        for _ in chunks:
+                            pass
+                self.assertLess(response.status_code, 400, getattr(response, 'data', None))
+                self.assertLessEqual(
+                    len(queries), budget,
+                    '\n'.join(query['sql'] for query in queries.captured_queries[:budget + 2]))
+                self.assertLessEqual(elapsed_ms, LATENCY_CEILING_MS)
+
+
+class FastListTests(TestCase):
+    """The values_list() list path renders the same bytes as the ViewSet's serializer."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = generate(1)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assertSameAsSerializer(self, viewset, url, params):
+        fast = self.client.get(url, params)
+        with mock.patch.object(viewset, 'list', viewsets.ModelViewSet.list):
+            slow = self.client.get(url, params)
+        self.assertEqual(fast.status_code, 200)
+        self.assertEqual(fast.content, slow.content)
+        return fast.json()
+
+    def test_lists_match_serializer_output(self):
+        views = [(StockViewSet, 'stock'), (TransactionViewSet, 'transaction'),
+                 (InventoryMovementViewSet, 'inventorymovement')]
+        for tz in ('UTC', 'America/Sao_Paulo'):
+            for viewset, basename in views:
+                with self.subTest(view=basename, tz=tz), timezone.override(tz):
+                    page = self.assertSameAsSerializer(
+                        viewset, reverse(f'{basename}-list'), {'page_size': 500})
+                    self.assertTrue(page['results'])
+                    if page['next']:
+                        self.assertSameAsSerializer(viewset, page['next'], {})
+
+    def test_low_stock_items_match_serializer_output(self):
+        response = self.client.get(reverse('stock-low-stock-items'), {'threshold': 1000})
+        expected = StockSerializer(Stock.objects.filter(current_stock__lte=1000), many=True)
+        self.assertTrue(response.json())
+        self.assertEqual(response.content, JSONRenderer().render(expected.data))
+
+
+class CatalogCacheTests(TestCase):
+    """Reference lists answer a current ETag with 304 and no queries."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('till', password='till', role='Admin')
+        Brand.objects.bulk_create(Brand(name=f'Brand {i}') for i in range(3))
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_not_modified_until_a_change_commits(self):
+        url = reverse('brand-list')
+        first = self.client.get(url)
+        etag = first['ETag']
+        with self.assertNumQueries(0):
+            cached = self.client.get(url)
+            not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(cached.content, first.content)
+        self.assertEqual(not_modified.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(reverse('brand-detail', args=[Brand.objects.first().pk]),
+                              {'name': 'Renamed'}, format='json')
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], etag)
+        self.assertContains(changed, 'Renamed')
+
+    def test_deploy_check_flags_caches_local_to_one_worker(self):
+        self.assertEqual({error.id for error in check_shared_caches(None)}, {'core.W001'})
+        shared = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                  'LOCATION': os.path.join(tempfile.gettempdir(), 'pos-cache-test')}
+        with override_settings(CACHES={'default': shared}):
+            self.assertEqual(check_shared_caches(None), [])
+
+
+class BarcodeCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('till', password='till', role='Cashier')
+        cls.product = Product.objects.create(
+            name='Cola', barcode='5000112', sku='COLA', price='1.50', cost_price=1,
+            stock_quantity=1, packing_date=date(2026, 1, 1),
+            category=ProductCategory.objects.create(name='Drinks'),
+            brand=Brand.objects.create(name='Acme'),
+            unit=Unit.objects.create(name='can', symbol='c'))
+
+    def setUp(self):
+        cache.clear()
+        barcode_cache.invalidate()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.loads = []
+
+    def loader(self, code):
+        self.loads.append(code)
+        return {'barcode': code} if code == self.product.barcode else None
+
+    def scan(self, code):
+        return self.client.get(reverse('product-by-barcode', args=[code]))
+
+    def test_a_hit_needs_no_shared_cache_round_trip(self):
+        shared = caches[settings.BARCODE_CACHE_ALIAS]
+        self.assertEqual(barcode_cache.lookup('5000112', self.loader), {'barcode': '5000112'})
+        with mock.patch.object(shared, 'get_or_set', wraps=shared.get_or_set) as generation, \
+                mock.patch.object(shared, 'get', wraps=shared.get) as get:
+            for _ in range(3):
+                self.assertEqual(barcode_cache.lookup('5000112', self.loader),
+                                 {'barcode': '5000112'})
+        self.assertEqual((generation.call_count, get.call_count), (0, 0))
+        self.assertEqual(self.loads, ['5000112'])
+
+    def test_a_miss_is_not_cached(self):
+        self.assertIsNone(barcode_cache.lookup('404', self.loader))
+        self.assertIsNone(barcode_cache.lookup('404', self.loader))
+        self.assertEqual(self.loads, ['404', '404'])
+
+    @override_settings(BARCODE_GENERATION_TTL=0)
+    def test_another_workers_invalidation_is_seen_after_the_ttl(self):
+        barcode_cache.lookup('5000112', self.loader)
+        caches[settings.BARCODE_CACHE_ALIAS].incr(barcode_cache.GENERATION_KEY)
+        barcode_cache.lookup('5000112', self.loader)
+        self.assertEqual(self.loads, ['5000112', '5000112'])
+
+    def test_product_and_barcode_edits_invalidate_scans(self):
+        url = reverse('product-detail', args=[self.product.pk])
+        self.assertEqual(self.scan('5000112').json()['price'], '1.50')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(url, {'price': '1.75'}, format='json')
+        self.assertEqual(self.scan('5000112').json()['price'], '1.75')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(url, {'barcode': '5000113'}, format='json')
+        self.assertEqual(self.scan('5000112').status_code, 404)
+        self.assertEqual(self.scan('5000113').json()['price'], '1.75')
+
+
+class AsyncViewTests(TestCase):
+    """The async twins (core/async_views.py) serve the payloads of the DRF actions they mirror."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = generate(1)
+        cls.product = Product.objects.filter(discounts__isnull=False).first()
+        cls.sku = Stock.objects.values_list('sku', flat=True).first()
+
+    def setUp(self):
+        cache.clear()
+        barcode_cache.invalidate()
+        self.client.force_login(self.user)
+
+    def assertSamePayload(self, sync_url, async_url):
+        expected = self.client.get(sync_url)
+        barcode_cache.invalidate()
+        response = self.client.get(async_url)
+        self.assertEqual((expected.status_code, response.status_code), (200, 200))
+        self.assertEqual(response.json(), expected.json())
+        return response.json()
+
+    def test_requests_need_credentials_and_get(self):
+        url = reverse('async-active-discounts')
+        self.client.logout()
+        self.assertEqual(self.client.get(url).status_code, 401)
+        wrong = 'Basic ' + base64.b64encode(b'bench:wrong').decode()
+        expected = self.client.get(reverse('discount-active-discounts'), HTTP_AUTHORIZATION=wrong)
+        response = self.client.get(url, HTTP_AUTHORIZATION=wrong)
+        self.assertEqual((response.status_code, response.json()), (401, expected.json()))
+
+        credentials = base64.b64encode(b'bench:bench').decode()
+        response = self.client.get(url, HTTP_AUTHORIZATION='Basic ' + credentials)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.post(url, HTTP_AUTHORIZATION='Basic ' + credentials)
+                         .status_code, 405)
+
+    def test_scan_matches_by_barcode(self):
+        scan = self.assertSamePayload(
+            reverse('product-by-barcode', args=[self.product.barcode]),
+            reverse('async-product-by-barcode', args=[self.product.barcode]))
+        self.assertTrue(scan['active_discounts'])
+        self.assertEqual(self.client.get(
+            reverse('async-product-by-barcode', args=['404'])).status_code, 404)
+
+    def test_stock_matches_stock_search(self):
+        sku = self.sku
+        expected = self.client.get(reverse('stock-list'), {'search': sku, 'page_size': 500}).json()
+        response = self.client.get(reverse('async-stock-by-sku', args=[sku]))
+        rows = [row for row in reversed(expected['results']) if row['sku'] == sku]
+        self.assertTrue(rows)
+        self.assertEqual(response.json(), rows)
+
+    def test_active_discounts_match(self):
+        discounts = self.assertSamePayload(
+            reverse('discount-active-discounts'), reverse('async-active-discounts'))
+        self.assertTrue(discounts)
+
+    def test_dashboard_summary_matches(self):
+        summary = self.assertSamePayload(
+            reverse('metrics-dashboard-summary'), reverse('async-dashboard-summary'))
+        self.assertNotEqual(summary['monthly_sales'], '0.00')
+
+    def test_async_rollup_totals_match_the_sync_totals(self):
+        for day in (timezone.localdate(), timezone.localdate() - timedelta(days=40)):
+            with self.subTest(day=day):
+                self.assertEqual(async_to_sync(SalesRollup.atotals_for)(day),
+                                 SalesRollup.totals_for(day))
+
+
+class ProductSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('till', password='till', role='Admin')
+        cls.parents = {'category': ProductCategory.objects.create(name='Drinks'),
+                       'brand': Brand.objects.create(name='Acme'),
+                       'unit': Unit.objects.create(name='piece', symbol='pcs')}
+        for name, code in (('Orange juice', '50012345'), ('Apple juice', '50067890'),
+                           ('Sparkling water', '70011111')):
+            Product.objects.create(name=name, barcode=code, sku=f'SKU-{code}', price=1,
+                                   cost_price=1, stock_quantity=1, packing_date=date(2026, 1, 1),
+                                   **cls.parents)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def search(self, text):
+        response = self.client.get(reverse('product-list'), {'search': text})
+        self.assertEqual(response.status_code, 200)
+        return sorted(product['name'] for product in response.json()['results'])
+
+    def test_prefix_typo_and_infix_matches(self):
+        self.assertEqual(self.search('juic'), ['Apple juice', 'Orange juice'])
+        self.assertEqual(self.search('sparkeling'), ['Sparkling water'])
+        self.assertEqual(self.search('67890'), ['Apple juice'])
+        self.assertEqual(self.search('nothing'), [])
+
+    def test_typos_are_corrected_in_a_large_vocabulary(self):
+        # More words than FUZZY_CANDIDATE_LIMIT share the first letter and
+        # sort before the one the typo is for.
+        Product.objects.bulk_create(
+            Product(name=f'Wa{i:04d}', barcode=f'W{i}', sku=f'W{i}', price=1, cost_price=1,
+                    stock_quantity=1, packing_date=date(2026, 1, 1), **self.parents)
+            for i in range(FUZZY_CANDIDATE_LIMIT + 50))
+        Product.objects.create(name='Wrench', barcode='WRENCH', sku='WRENCH', price=1,
+                               cost_price=1, stock_quantity=1, packing_date=date(2026, 1, 1),
+                               **self.parents)
+        get_search_backend().rebuild(Product)
+        self.assertEqual(self.search('wrenhc'), ['Wrench'])
+        self.assertEqual(self.search('wernch'), ['Wrench'])
+
+
+class PricingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('till', password='till', role='Cashier')
+        parents = {'category': ProductCategory.objects.create(name='Drinks'),
+                   'brand': Brand.objects.create(name='Acme'),
+                   'unit': Unit.objects.create(name='piece', symbol='pcs')}
+        cls.juice, cls.water = (
+            Product.objects.create(name=name, barcode=name, sku=name, price=price, cost_price=1,
+                                   stock_quantity=1, packing_date=date(2026, 1, 1), **parents)
+            for name, price in (('juice', 10.0), ('water', 25.0)))
+        today = timezone.localdate()
+        rules = {'three': ('Product wise discount', True, 3, None, 10, today),
+                 'six': ('Product wise discount', True, 6, None, 20, today),
+                 'ended': ('Product wise discount', False, None, None, 50,
+                           today - timedelta(days=1)),
+                 'over_50': ('Total price discount', False, None, 50, 5, today)}
+        cls.discounts = {}
+        for name, (discount_type, quantity_based, quantity, total_price, percent,
+                   to_date) in rules.items():
+            cls.discounts[name] = Discount.objects.create(
+                from_date=today - timedelta(days=7), to_date=to_date,
+                discount_type=discount_type, quantity_based_discount=quantity_based,
+                quantity=quantity, total_price=total_price, discount_percent=percent,
+                all_products_discount=name == 'over_50')
+        cls.discounts['three'].products.set([cls.juice])
+        cls.discounts['six'].products.set([cls.juice])
+        cls.discounts['ended'].products.set([cls.water])
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def price(self, *lines):
+        response = self.client.post(reverse('product-price-basket'), {'lines': [
+            {'product': product.pk, 'quantity': quantity} for product, quantity in lines]},
+            format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_best_line_discount_then_basket_discount(self):
+        priced = self.price((self.juice, 3), (self.water, 1))
+        juice, water = priced['lines']
+        self.assertEqual((juice['discount'], juice['discount_amount'], juice['total']),
+                         (self.discounts['three'].pk, 3.0, 27.0))
+        self.assertEqual((water['discount'], water['total']), (None, 25.0))
+        self.assertEqual(priced['basket_discount'], self.discounts['over_50'].pk)
+        self.assertEqual((priced['subtotal'], priced['basket_discount_amount'], priced['total']),
+                         (52.0, 2.6, 49.4))
+
+        juice = self.price((self.juice, 6))['lines'][0]
+        self.assertEqual((juice['discount'], juice['total']), (self.discounts['six'].pk, 48.0))
+        self.assertEqual(self.price((self.juice, 2))['total'], 20.0)
+
+    def test_a_changed_discount_reprices_after_commit(self):
+        self.assertEqual(self.price((self.juice, 3))['total'], 27.0)
+        discount = self.discounts['three']
+        discount.discount_percent = 15
+        with self.captureOnCommitCallbacks(execute=True):
+            discount.save()
+        self.assertEqual(self.price((self.juice, 3))['total'], 25.5)
+
+
+class SyncTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = generate(1)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def changes(self, since):
+        response = self.client.get(reverse('sync-changes'), {'since': since})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_delta_holds_only_what_changed(self):
+        page = self.changes(0)
+        while page['more']:
+            page = self.changes(page['until'])
+        until = page['until']
+        product = Product.objects.order_by('pk').first()
+        discount_id = Discount.objects.order_by('pk').values_list('pk', flat=True).last()
+        self.client.patch(reverse('product-detail', args=[product.pk]), {'price': '1.23'},
+                          format='json')
+        Discount.objects.get(pk=discount_id).delete()
+
+        delta = self.changes(until)
+        self.assertEqual([row['id'] for row in delta['changes']['products']], [product.pk])
+        self.assertEqual(delta['changes']['products'][0]['price'], '1.23')
+        self.assertEqual(delta['deleted']['discounts'], [discount_id])
+        self.assertEqual(delta['changes']['inventory'], [])
+        self.assertEqual(self.changes(delta['until'])['changes']['products'], [])
+
+    def test_upload_records_each_sale_once(self):
+        product = Product.objects.filter(available_quantity__gt=0).order_by('pk').first()
+        sale = {'transaction_id': str(uuid.uuid4()), 'customer': self.first_customer(),
+                'payment_method': 'CASH', 'paid_amount': str(product.price * 2),
+                'lines': [{'product': product.pk, 'quantity': 2}],
+                'recorded_at': '2026-01-02T03:04:05Z'}
+        first = self.client.post(reverse('sync-upload'), {'sales': [sale]}, format='json')
+        again = self.client.post(reverse('sync-upload'), {'sales': [sale]}, format='json')
+        self.assertEqual(first.json()['results'][0]['status'], 'created')
+        self.assertEqual(again.json()['results'][0]['status'], 'duplicate')
+        self.assertEqual(again.json()['results'][0]['receipt'], first.json()['results'][0]['receipt'])
+        recorded = Transaction.objects.get(transaction_id=sale['transaction_id'])
+        self.assertEqual(recorded.timestamp.isoformat(), '2026-01-02T03:04:05+00:00')
+
+    def test_upload_records_a_sale_beyond_stock_as_a_shortfall(self):
+        product, expired = Product.objects.filter(available_quantity__gt=0).order_by('pk')[:2]
+        InventoryItem.objects.filter(product=expired).update(
+            expiry_date=timezone.localdate() - timedelta(days=1))
+        newest = InventoryItem.objects.filter(product=expired).latest('pk')
+        sold = product.available_quantity + 3
+        sale = {'transaction_id': str(uuid.uuid4()), 'customer': self.first_customer(),
+                'payment_method': 'CASH',
+                'paid_amount': str(product.price * sold + expired.price * 2),
+                'lines': [{'product': product.pk, 'quantity': sold},
+                          {'product': expired.pk, 'quantity': 2}]}
+        response = self.client.post(reverse('sync-upload'), {'sales': [sale]}, format='json')
+        result = response.json()['results'][0]
+        self.assertEqual(result['status'], 'created', result)
+        self.assertEqual(result['shortfall'], {str(product.pk): 3, str(expired.pk): 2})
+        product.refresh_from_db()
+        self.assertEqual(product.available_quantity, -3)
+        self.assertEqual(InventoryItem.objects.filter(product=product).aggregate(
+            total=Sum('quantity'))['total'], -3)
+        self.assertEqual(InventoryItem.objects.get(pk=newest.pk).quantity, newest.quantity - 2)
+
+    def test_rebuilt_counters_reach_the_tills(self):
+        product = Product.objects.order_by('pk').first()
+        Product.objects.filter(pk=product.pk).update(available_quantity=F('available_quantity') + 7)
+        page = self.changes(0)
+        while page['more']:
+            page = self.changes(page['until'])
+        until = page['until']
+        call_command('rebuild_available_quantity', stdout=io.StringIO())
+        delta = self.changes(until)
+        self.assertEqual([row['id'] for row in delta['changes']['products']], [product.pk])
+        self.assertEqual(delta['changes']['products'][0]['available_quantity'],
+                         product.available_quantity)
+
+    def first_customer(self):
+        return Customer.objects.order_by('pk').values_list('pk', flat=True)[0]
+
+
+class IdempotencyTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('till', password='till', role='Cashier')
+        customer = Customer.objects.create(
+            contact_id='C1', business_name='Shop', name='Ann', email='ann@example.com',
+            pay_term='30', opening_balance=0, advance_balance=0, credit_limit=100,
+            date=date(2026, 1, 1), mobile='01', total_sales_due=0, total_sales_return_due=0)
+        cls.credit = CustomerCredit.objects.create(customer=customer, credit_limit=100)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('customercredit-add-credit', args=[self.credit.pk])
+
+    def post(self, data, key):
+        return self.client.post(self.url, data, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_without_running_again(self):
+        first = self.post({'amount': '5.00'}, 'retry-1')
+        with self.assertNumQueries(1):
+            retry = self.post({'amount': '5.00'}, 'retry-1')
+        self.assertEqual(retry.content, first.content)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(CreditPayment.objects.filter(customer_credit=self.credit).count(), 1)
+
+        self.assertEqual(self.post({'amount': '6.00'}, 'retry-1').status_code, 422)
+        self.post({'amount': '5.00'}, 'retry-2')
+        self.assertEqual(CreditPayment.objects.filter(customer_credit=self.credit).count(), 2)
+
+
+class CustomerCreditTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('till', password='till', role='Cashier')
+        customer = Customer.objects.create(
+            contact_id='C1', business_name='Shop', name='Ann', email='ann@example.com',
+            pay_term='30', opening_balance=0, advance_balance=0, credit_limit=100,
+            date=date(2026, 1, 1), mobile='01', total_sales_due=0, total_sales_return_due=0)
+        cls.credit = CustomerCredit.objects.create(customer=customer, credit_limit=100,
+                                                   current_balance=100)
+
+    def test_concurrent_uses_cannot_overdraw(self):
+        # Two tills load the account before either spends: both see 100.
+        first, second = (CustomerCredit.objects.get(pk=self.credit.pk) for _ in range(2))
+        self.assertTrue(first.use_credit('60.00', self.user, 'R-1'))
+        self.assertFalse(second.use_credit('60.00', self.user, 'R-2'))
+        self.assertTrue(second.use_credit('40.00', self.user, 'R-3'))
+        self.assertFalse(first.use_credit('0.01', self.user, 'R-4'))
+
+        self.credit.refresh_from_db()
+        self.assertEqual(self.credit.current_balance, Decimal('0.00'))
+        self.assertEqual(sorted(CreditPayment.objects.filter(
+            customer_credit=self.credit).values_list('reference_number', 'amount')),
+            [('R-1', Decimal('-60.00')), ('R-3', Decimal('-40.00'))])
+
+
+class FefoAllocationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = generate(1)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_checkout_sells_the_earliest_expiry_first(self):
+        product = Product.objects.order_by('pk').first()
+        today = timezone.localdate()
+        location = StorageLocation.objects.order_by('pk').first()
+        InventoryItem.objects.filter(product=product).update(
+            expiry_date=today + timedelta(days=60))
+        for batch_number, quantity, expiry_date in (('EXPIRED', 50, today - timedelta(days=1)),
+                                                    ('SOON', 5, today + timedelta(days=10)),
+                                                    ('UNDATED', 100, None)):
+            InventoryItem.objects.create(product=product, batch_number=batch_number,
+                                         quantity=quantity, location=location,
+                                         expiry_date=expiry_date)
+        before = dict(InventoryItem.objects.filter(product=product).values_list(
+            'batch_number', 'quantity'))
+
+        expiring = self.client.get(reverse('inventoryitem-expiring'),
+                                   {'days': 10, 'product': product.pk}).json()
+        self.assertEqual([item['batch_number'] for item in expiring['results']],
+                         ['EXPIRED', 'SOON'])
+
+        response = self.checkout(product, 30)
+        self.assertEqual(response.status_code, 201, response.content)
+        after = dict(InventoryItem.objects.filter(product=product).values_list(
+            'batch_number', 'quantity'))
+        self.assertEqual(after['SOON'], 0)
+        self.assertEqual(after['B0'], 0)
+        self.assertEqual(after['B1'], before['B1'] - (30 - 5 - before['B0']))
+        self.assertEqual(after['EXPIRED'], 50)
+        self.assertEqual(after['UNDATED'], 100)
+
+    def test_expired_batches_are_not_sold(self):
+        product = Product.objects.order_by('pk').first()
+        InventoryItem.objects.filter(product=product).update(
+            expiry_date=timezone.localdate() - timedelta(days=1))
+        response = self.checkout(product, 1)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('unexpired', str(response.json()))
+
+    def checkout(self, product, quantity):
+        return self.client.post(reverse('transaction-checkout'), {
+            'customer': Customer.objects.order_by('pk').values_list('pk', flat=True)[0],
+            'payment_method': 'CASH', 'paid_amount': str(product.price * quantity),
+            'lines': [{'product': product.pk, 'quantity': quantity}],
+        }, format='json')
+
+
+class InventoryMovementTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = generate(1)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_transfer_needs_a_destination(self):
+        movement = {'product': Product.objects.order_by('pk').values_list('pk', flat=True)[0],
+                    'movement_type': 'TRANSFER', 'quantity': 2, 'reference_number': 'T1',
+                    'from_location': StorageLocation.objects.order_by('pk')[0].pk,
+                    'performed_by': self.user.pk}
+        count = InventoryMovement.objects.count()
+        response = self.client.post(reverse('inventorymovement-list'), movement, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('to_location', response.json())
+        self.assertEqual(InventoryMovement.objects.count(), count)
+
+    def move(self, movement_type, quantity, from_location, to_location=None):
+        InventoryMovement.objects.create(
+            product=self.product, movement_type=movement_type, quantity=quantity,
+            reference_number='L1', from_location=from_location, to_location=to_location,
+            performed_by=self.user)
+
+    @staticmethod
+    def balances():
+        return dict(((product, location), quantity) for product, location, quantity in
+                    StockBalance.objects.exclude(quantity=0).values_list(
+                        'product_id', 'location_id', 'quantity'))
+
+    def test_balances_and_stock_at_match_a_rebuild(self):
+        self.product = Product.objects.order_by('pk')[0]
+        store, back, spare = StorageLocation.objects.order_by('pk')[:3]
+        snapshot = stock_ledger.take_snapshot()
+        at_snapshot = {(line.product_id, line.location_id): line.quantity
+                       for line in snapshot.lines.all()}
+        self.move('IN', 20, store, back)
+        self.move('TRANSFER', 5, back, store)
+        self.move('OUT', 3, store)
+        self.move('ADJUST', -2, back)
+        self.move('IN', 4, spare, spare)
+        self.move('OUT', 4, spare)
+        incremental = self.balances()
+
+        self.assertEqual(stock_ledger.stock_at(snapshot.taken_at), at_snapshot)
+        self.assertEqual(stock_ledger.stock_at(timezone.now()), incremental)
+        self.assertEqual(stock_ledger.stock_at(timezone.now(), product_id=self.product.pk,
+                                               location_id=spare.pk), {})
+        for from_scratch in (False, True):
+            written = stock_ledger.rebuild_balances(from_scratch=from_scratch)
+            self.assertEqual(self.balances(), incremental)
+            self.assertEqual(written, StockBalance.objects.count())
+
+
+@override_settings(ACTIVITY_LOG_ASYNC=False)
+class ActivityLogTests(TestCase):
+    def test_api_writes_are_logged_when_they_commit(self):
+        user = CustomUser.objects.create_user('clerk', password='clerk', role='Cashier')
+        client = APIClient()
+        client.force_authenticate(user)
+        before = timezone.now()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post(reverse('brand-list'), {'name': 'Acme'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        logged = UserActivity.objects.get(user=user)
+        self.assertEqual(logged.activity_type, 'POST brand-list')
+        self.assertEqual(logged.details, '/api/brands/ -> 201')
+        self.assertGreaterEqual(logged.timestamp, before)
+
+
+@override_settings(ACTIVITY_LOG_ASYNC=True)
+class AsyncActivityLogTests(TransactionTestCase):
+    """The background writer that ACTIVITY_LOG_ASYNC turns on outside tests."""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('clerk', password='clerk', role='Cashier')
+        self.logger = activity.ActivityLogger(batch_size=2, flush_interval=60)
+        self.addCleanup(self.logger.stop)
+
+    def logged(self):
+        return list(UserActivity.objects.order_by('id').values_list('activity_type', flat=True))
+
+    def test_full_batches_are_written_and_stop_flushes_the_rest(self):
+        for i in range(3):
+            self.logger.log(self.user, f'scan {i}')
+        deadline = time.monotonic() + 5
+        while not self.logged() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.logged(), ['scan 0', 'scan 1'])
+
+        self.logger.stop()
+        self.assertEqual(self.logged(), ['scan 0', 'scan 1', 'scan 2'])
+        self.assertEqual(self.logger.dropped, 0)
+
+    def test_flush_writes_the_buffer_on_the_calling_thread(self):
+        with mock.patch.object(self.logger, '_start'):
+            self.logger.log(self.user, 'login')
+            self.logger.log(self.user, 'logout')
+            self.assertEqual(self.logged(), [])
+            self.logger.flush()
+        self.assertEqual(self.logged(), ['login', 'logout'])
+
+    def test_only_committed_records_are_queued(self):
+        with transaction.atomic():
+            self.logger.log(self.user, 'kept')
+        with self.assertRaises(ValueError), transaction.atomic():
+            self.logger.log(self.user, 'rolled back')
+            raise ValueError
+        self.logger.stop()
+        self.assertEqual(self.logged(), ['kept'])
+
+
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        metrics.registry.reset()
+
+    def test_metrics_are_for_staff_only(self):
+        cashier = CustomUser.objects.create_user('clerk', password='clerk', role='Cashier')
+        self.client.force_login(cashier)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        cashier.is_staff = True
+        cashier.save()
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 200)
+
+    def test_render_time_is_recorded_for_api_responses(self):
+        client = APIClient()
+        client.force_authenticate(CustomUser.objects.create_user('clerk', password='clerk'))
+        self.assertEqual(client.get(reverse('brand-list')).status_code, 200)
+        count, total = metrics.registry.totals('pos_request_render_seconds')
+        self.assertEqual(count, 1)
+        self.assertGreater(total, 0)
+
+
+class BulkUpsertTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('stock', password='stock', role='Admin')
+        cls.category = ProductCategory.objects.create(name='Snacks')
+        cls.brand = Brand.objects.create(name='Acme')
+        cls.unit = Unit.objects.create(name='bag', symbol='b')
+        for code in ('B1', 'B2'):
+            Product.objects.create(
+                name=code, barcode=code, sku=f'S{code[1]}', price='1.00', cost_price='0.50',
+                stock_quantity=1, packing_date=date(2026, 1, 1),
+                category=cls.category, brand=cls.brand, unit=cls.unit)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def row(self, barcode, sku, **fields):
+        return {'name': barcode, 'barcode': barcode, 'sku': sku, 'category': self.category.pk,
+                'brand': self.brand.pk, 'unit': self.unit.pk, 'price': '2.00',
+                'cost_price': '1.00', 'stock_quantity': 3, 'packing_date': '2026-02-01',
+                **fields}
+
+    def prices(self):
+        return dict(Product.objects.values_list('barcode', 'price'))
+
+    def test_good_rows_are_written_and_bad_rows_reported_by_index(self):
+        rows = [
+            self.row('N1', 'SN1'),
+            self.row('N2', 'SN2', price='cheap'),
+            self.row('N3', 'SN3', brand=999999),
+            self.row('B1', 'S1', price='1.25'),
+            self.row('N1', 'SN1b'),
+            self.row('N4', 'S2'),
+            ['not', 'an', 'object'],
+        ]
+        response = self.client.post(reverse('product-bulk'), rows, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        result = response.json()
+        self.assertEqual((result['created'], result['updated']), (1, 1))
+        self.assertEqual([(error['row'], sorted(error['errors'])) for error in result['errors']],
+                         [(1, ['price']), (2, ['brand']), (4, ['non_field_errors']),
+                          (5, ['sku']), (6, ['non_field_errors'])])
+        self.assertEqual(self.prices(), {'B1': Decimal('1.25'), 'B2': Decimal('1.00'),
+                                         'N1': Decimal('2.00')})
+
+    def test_row_indexes_count_across_batches(self):
+        upsert = BulkUpsert(Product, ProductBulkSerializer, unique_fields=['barcode'],
+                            also_unique=['sku'], batch_size=2,
+                            related={'category': ProductCategory, 'brand': Brand, 'unit': Unit})
+        result = upsert.run([self.row('N1', 'SN1'), self.row('N2', 'SN2'),
+                             self.row('N3', 'SN3', unit=999999), self.row('N1', 'SN1', price='3')])
+        self.assertEqual((result['created'], result['updated']), (2, 1))
+        self.assertEqual([error['row'] for error in result['errors']], [2])
+        self.assertEqual(self.prices()['N1'], Decimal('3.00'))
+
+    def test_ndjson_rows_are_parsed_one_per_line(self):
+        body = '\n'.join([json.dumps(self.row('N1', 'SN1')), '', '{"name": "cut off',
+                          json.dumps(self.row('B2', 'S2', price='0.90'))]) + '\n'
+        response = self.client.post(reverse('product-bulk'), body.encode(),
+                                    content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 200, response.content)
+        result = response.json()
+        self.assertEqual((result['created'], result['updated']), (1, 1))
+        self.assertEqual([error['row'] for error in result['errors']], [1])
+        self.assertIn('non_field_errors', result['errors'][0]['errors'])
+        self.assertEqual(self.prices()['B2'], Decimal('0.90'))
+
+
+class StockValuationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = generate(1)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_bulk_price_import_revalues_stock(self):
+        product = Product.objects.filter(sku__in=Stock.objects.values('sku')).order_by('pk')[0]
+        row = {'name': product.name, 'barcode': product.barcode, 'sku': product.sku,
+               'category': product.category_id, 'brand': product.brand_id,
+               'unit': product.unit_id, 'price': '12.34', 'cost_price': '10.00',
+               'stock_quantity': product.stock_quantity,
+               'packing_date': product.packing_date.isoformat()}
+        response = self.client.post(reverse('product-bulk'), [row], format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        for stock in Stock.objects.filter(sku=product.sku):
+            self.assertEqual(stock.unit_selling_price, Decimal('12.34'))
+            self.assertEqual(stock.current_stock_value_sale_price,
+                             stock.current_stock * Decimal('12.34'))
+            self.assertEqual(stock.potential_profit, stock.current_stock * Decimal('2.34'))
+
+    def test_saving_a_stale_product_keeps_its_counters(self):
+        stale = Product.objects.filter(available_quantity__gt=0).order_by('pk')[0]
+        batch = InventoryItem.objects.filter(product=stale, quantity__gt=1).order_by('pk')[0]
+        batch.quantity = 1
+        batch.save()
+        stale.price += 1
+        stale.save()
+        response = self.client.patch(reverse('product-detail', args=[stale.pk]),
+                                     {'price': str(stale.price + 1)}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        actual = stale.get_available_quantity()
+        self.assertEqual(response.json()['available_quantity'], actual)
+        self.assertEqual(Product.objects.get(pk=stale.pk).available_quantity, actual)
+        self.assertEqual(stale.available_quantity, actual)
+        call_command('rebuild_available_quantity', '--verify', stdout=io.StringIO())
+
+
+class CheckoutTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = generate(1)
+        cls.customer = Customer.objects.order_by('pk').values_list('pk', flat=True)[0]
+        cls.products = list(Product.objects.filter(available_quantity__gt=10).order_by('pk')[:7])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def checkout(self, lines, paid_amount='100000.00', **extra):
+        return self.client.post(reverse('transaction-checkout'), {
+            'customer': self.customer, 'payment_method': 'CASH', 'paid_amount': paid_amount,
+            'lines': [{'product': product.pk, 'quantity': quantity} for product, quantity in lines],
+            **extra,
+        }, format='json')
+
+    def test_checkout_records_the_sale_and_deducts_stock(self):
+        first, second = self.products[:2]
+        total = first.price * 2 + second.price
+        response = self.checkout([(first, 2), (second, 1)], paid_amount=str(total + 5))
+        self.assertEqual(response.status_code, 201, response.content)
+
+        sale = Transaction.objects.get(transaction_id=response.json()['transaction_id'])
+        self.assertEqual((sale.total_amount, sale.change_amount), (total, Decimal('5.00')))
+        self.assertTrue(sale.is_completed)
+        for product, sold in ((first, 2), (second, 1)):
+            refreshed = Product.objects.get(pk=product.pk)
+            self.assertEqual(refreshed.available_quantity, product.available_quantity - sold)
+            self.assertEqual(refreshed.stock_quantity, product.stock_quantity - sold)
+            self.assertEqual(InventoryItem.objects.filter(product=product).aggregate(
+                total=Sum('quantity'))['total'], product.available_quantity - sold)
+        self.assertEqual(InventoryMovement.objects.filter(
+            reference_number=response.json()['receipt_number'], movement_type='OUT',
+        ).aggregate(total=Sum('quantity'))['total'], 3)
+
+    def test_queries_do_not_grow_with_basket_lines(self):
+        self.checkout([(self.products[0], 1)])
+        counts = []
+        for size in (2, 6):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.checkout([(product, 1) for product in self.products[:size]])
+            self.assertEqual(response.status_code, 201, response.content)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_a_used_receipt_number_is_rejected(self):
+        self.assertEqual(self.checkout([(self.products[0], 1)], receipt_number='R-1').status_code,
+                         201)
+        sales = Transaction.objects.count()
+        response = self.checkout([(self.products[0], 1)], receipt_number='R-1')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('R-1', response.json()['error'])
+        self.assertEqual(Transaction.objects.count(), sales)
+
+    def test_receipts_are_voided_only_through_the_action(self):
+        response = self.checkout([(self.products[0], 1)])
+        receipt, total = response.json()['receipt'], Decimal(response.json()['total_amount'])
+        sold = self.rollups()
+        response = self.client.patch(reverse('receipt-detail', args=[receipt]),
+                                     {'void_status': True, 'void_reason': 'typo'}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertFalse(Receipt.objects.get(pk=receipt).void_status)
+        self.assertEqual(self.rollups(), sold)
+
+        response = self.client.post(reverse('receipt-void-receipt', args=[receipt]),
+                                    {'reason': 'Wrong customer'}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertTrue(Receipt.objects.get(pk=receipt).void_status)
+        today = SalesRollup.period_starts(timezone.localdate())
+        self.assertEqual(self.rollups(), {
+            key: amount - total if key in today.items() else amount
+            for key, amount in sold.items()})
+
+    def rollups(self):
+        return {(period, start): total for period, start, total in
+                SalesRollup.objects.values_list('period', 'period_start', 'total_sales')}
+
+    def test_selling_out_counts_the_product_as_out_of_stock(self):
+        product = self.products[0]
+        Product.objects.filter(pk=product.pk).update(stock_quantity=3)
+        Metrics.recount()
+        out_of_stock = Metrics.objects.get().out_of_stock_products
+        self.assertEqual(self.checkout([(product, 3)]).status_code, 201)
+        self.assertEqual(Metrics.objects.get().out_of_stock_products, out_of_stock + 1)
+        response = self.client.get(reverse('metrics-dashboard-summary'))
+        self.assertEqual(response.json()['out_of_stock_products'], out_of_stock + 1)
+
+    def test_editing_a_voided_sale_leaves_the_rollups_alone(self):
+        response = self.checkout([(self.products[0], 1)])
+        sale = Transaction.objects.get(transaction_id=response.json()['transaction_id'])
+        Receipt.objects.get(transaction=sale).void('Wrong customer')
+        rollups = list(SalesRollup.objects.values_list('period', 'total_sales'))
+        response = self.client.patch(reverse('transaction-detail', args=[sale.pk]),
+                                     {'payment_method': 'CARD'}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(list(SalesRollup.objects.values_list('period', 'total_sales')), rollups)
+
+
+class ReportSchedulerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('boss', password='boss', role='Manager')
+        cls.due = timezone.now() - timedelta(minutes=5)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def schedule(self, recipients=()):
+        schedule = ReportSchedule.objects.create(report_type='SALES', frequency='DAILY',
+                                                 next_run=self.due)
+        schedule.recipients.set(recipients)
+        return schedule
+
+    def test_schedules_without_recipients_stay_due(self):
+        lonely, owned = self.schedule(), self.schedule([self.user])
+        reports = claim_due_schedules(10)
+        self.assertEqual([report.parameters['schedule'] for report in reports], [owned.pk])
+        lonely.refresh_from_db()
+        owned.refresh_from_db()
+        self.assertEqual(lonely.next_run, self.due)
+        self.assertGreater(owned.next_run, timezone.now())
+
+    def test_run_now_queues_a_report_and_keeps_the_schedule(self):
+        schedule = self.schedule([self.user])
+        response = self.client.post(reverse('reportschedule-run-now', args=[schedule.pk]))
+        self.assertEqual(response.status_code, 202)
+        report = Report.objects.get(pk=response.json()['report'])
+        self.assertEqual(report.file_job['status'], 'PENDING')
+        self.assertEqual(report.end_date, timezone.localdate() - timedelta(days=1))
+        schedule.refresh_from_db()
+        self.assertEqual(schedule.next_run, self.due)
+        response = self.client.post(reverse('reportschedule-run-now', args=[self.schedule().pk]))
+        self.assertEqual(response.status_code, 400)
+
+    def test_a_deleted_report_is_a_failed_build(self):
+        report_id, error = build_report(0)
+        self.assertEqual(report_id, 0)
+        self.assertIn('does not exist', error)
+
+    def test_parquet_without_pyarrow_is_rejected_when_queued(self):
+        report = Report.objects.create(report_type='SALES', start_date=date(2026, 1, 1),
+                                       end_date=date(2026, 1, 31), generated_by=self.user,
+                                       parameters={}, results={})
+        with mock.patch('core.exports.importlib.util.find_spec', return_value=None):
+            response = self.client.post(reverse('report-write-file', args=[report.pk]),
+                                        {'format': 'parquet'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('pyarrow', response.json()['error'])
+
+    def test_report_file_counts_the_rows_it_writes(self):
+        media_root = tempfile.mkdtemp(prefix='pos-media-test-')
+        self.addCleanup(shutil.rmtree, media_root)
+        media = self.settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        customer = Customer.objects.create(
+            contact_id='C1', business_name='Shop', name='Ann', email='ann@example.com',
+            pay_term='30', opening_balance=0, advance_balance=0, credit_limit=100,
+            date=date(2026, 1, 1), mobile='01', total_sales_due=0, total_sales_return_due=0)
+        for amount in (10, 20, 30):
+            Transaction.objects.create(customer=customer, cashier=self.user, payment_method='CASH',
+                                       total_amount=amount, paid_amount=amount, change_amount=0,
+                                       is_completed=True)
+        today = timezone.localdate()
+        report = Report.objects.create(report_type='SALES', start_date=today, end_date=today,
+                                       generated_by=self.user, parameters={},
+                                       results={'total_sales': '60.00'})
+        response = self.client.post(reverse('report-write-file', args=[report.pk]),
+                                    {'format': 'csv'}, format='json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['file_job'], {'status': 'PENDING', 'format': 'csv'})
+        self.assertEqual(claim_pending_reports(10), [report.pk])
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(build_report(report.pk), (report.pk, None))
+        report.refresh_from_db()
+        self.assertEqual(report.results, {'total_sales': '60.00'})
+        self.assertEqual((report.file_job['status'], report.file_job['row_count']),
+                         ('COMPLETED', 3))
+        self.assertFalse([query for query in queries if 'COUNT(' in query['sql']])
+        with report.file_path.open('rb') as written:
+            self.assertEqual(len(written.read().splitlines()), 4)
+
+
+class WriteQueueTests(TransactionTestCase):
+    """The writer thread commits on its own connection, so these tests commit."""
+
+    def setUp(self):
+        self.queue = write_queue.WriteQueue()
+        self.addCleanup(self.queue.stop)
+
+    def queued_together(self, *jobs):
+        # Hold the writer on a first job so the rest queue up behind it and
+        # are taken as one group.
+        release = threading.Event()
+        blocker = self.queue.submit(release.wait, 5)
+        futures = [self.queue.submit(job) for job in jobs]
+        release.set()
+        blocker.result(5)
+        return futures
+
+    def test_a_group_commits_in_one_transaction(self):
+        def outer_transaction():
+            Brand.objects.create(name='Queued')
+            return connection.atomic_blocks[0]
+
+        futures = self.queued_together(outer_transaction, outer_transaction, outer_transaction)
+        transactions = [future.result(5) for future in futures]
+        self.assertTrue(all(block is transactions[0] for block in transactions))
+        self.assertEqual(Brand.objects.filter(name='Queued').count(), 3)
+
+    def test_a_failing_job_rolls_back_alone_and_raises_to_its_caller(self):
+        def fail():
+            Brand.objects.create(name='Lost')
+            raise ValueError("no such brand")
+
+        kept, failed, also_kept = self.queued_together(
+            lambda: Brand.objects.create(name='Kept'), fail,
+            lambda: Brand.objects.create(name='Also kept'))
+        with self.assertRaisesMessage(ValueError, "no such brand"):
+            failed.result(5)
+        self.assertEqual((kept.result(5).name, also_kept.result(5).name), ('Kept', 'Also kept'))
+        self.assertEqual(sorted(Brand.objects.values_list('name', flat=True)),
+                         ['Also kept', 'Kept'])
+
+    @override_settings(SQLITE_WRITE_QUEUE=True)
+    def test_run_stays_inline_inside_a_transaction(self):
+        def writer():
+            return threading.current_thread().name, Brand.objects.filter(name='Open').exists()
+
+        self.addCleanup(write_queue._get_writer().stop)
+        with transaction.atomic():
+            Brand.objects.create(name='Open')
+            self.assertEqual(write_queue.run(writer), (threading.current_thread().name, True))
+        self.assertEqual(write_queue.run(writer), ('sqlite-writer', True))
+
+
+class ChangeSequenceTests(TransactionTestCase):
+    """Stamps from several connections at once, each committing on its own."""
+
+    def test_concurrent_stamps_increase_and_are_never_reused(self):
+        customers = [Customer.objects.create(
+            contact_id=f'C{i}', business_name='', name=f'Customer {i}', email='c@example.com',
+            pay_term='', opening_balance=0, advance_balance=0, credit_limit=0,
+            date=date(2026, 1, 1), mobile='', total_sales_due=0, total_sales_return_due=0)
+            for i in range(4)]
+        start, _ = ChangeSequence.current()
+        stamps, errors = {}, []
+        ready = threading.Barrier(len(customers))
+
+        def stamp(customer):
+            # The shared-cache in-memory test database reports a busy writer
+            # as "table is locked" at once instead of waiting like
+            # busy_timeout does, so retry the way SQLite would.
+            while True:
+                try:
+                    with transaction.atomic():
+                        ChangeSequence.stamp(Customer.objects.filter(pk=customer.pk))
+                        return Customer.objects.values_list('change_seq', flat=True).get(
+                            pk=customer.pk)
+                except OperationalError as e:
+                    if 'locked' not in str(e):
+                        raise
+                    time.sleep(0.001)
+
+        def worker(customer):
+            try:
+                ready.wait(5)
+                stamps[customer.pk] = [stamp(customer) for _ in range(25)]
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=[customer]) for customer in customers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        for values in stamps.values():
+            self.assertEqual(values, sorted(set(values)))
+        issued = sorted(value for values in stamps.values() for value in values)
+        self.assertEqual(issued, list(range(start + 1, start + 101)))
+        self.assertEqual(ChangeSequence.current()[0], start + 100)
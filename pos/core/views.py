@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.shortcuts import render
 from rest_framework import viewsets
 from rest_framework.views import APIView
@@ -6,18 +7,21 @@ from rest_framework.generics import ListCreateAPIView, RetrieveUpdateDestroyAPIV
 from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.parsers import JSONParser
 from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
+from django.db import transaction as db_transaction
 from django.db.models import F
 from core.models import (
-    UserActivity, Receipt, Transaction, Product, InventoryItem,
+    UserActivity, UserActivityArchive, Receipt, Transaction, Product, InventoryItem,
     InventoryMovement, CustomerCredit, CreditPayment, Report, ReportSchedule,
     Role, Customer, Supplier, Agent, Staff, SalesOrder, SalesReturn, Purchase,
     PurchaseReturn, Stock, Expense, ExpenseCategory, MonthlySales, Metrics,
-    Discount,StorageLocation, Brand, ProductCategory, Unit, CustomUser
+    Discount,StorageLocation, Brand, ProductCategory, Unit, CustomUser,
+    SalesRollup, ChangeSequence
 )
 from serializers import (
-    UserActivitySerializer, ReceiptSerializer,
+    UserActivitySerializer, UserActivityArchiveSerializer, ReceiptSerializer,
     TransactionSerializer, ProductSerializer, InventoryItemSerializer,
     InventoryMovementSerializer, CustomerCreditSerializer, CreditPaymentSerializer,
     ReportSerializer, ReportScheduleSerializer, RoleSerializer, CustomerSerializer,
@@ -26,12 +30,25 @@ from serializers import (
     StockSerializer, ExpenseSerializer, ExpenseCategorySerializer,
     MonthlySalesSerializer, MetricsSerializer, DiscountSerializer,
     StorageLocationSerializer, BrandSerializer, ProductCategorySerializer,
-    UnitSerializer,CustomUserSerializer,CustomUserDetailSerializer
+    UnitSerializer,CustomUserSerializer,CustomUserDetailSerializer,
+    CheckoutSerializer, ProductScanSerializer, ProductBulkSerializer, PriceBasketSerializer,
+    InventoryItemBulkSerializer, OfflineSaleSerializer
 )
-from datetime import datetime
+from core import barcode_cache, metrics, pricing, scheduler, stock_ledger, sync, write_queue
+from core.bulk import BulkUpsert, NDJSONParser
+from core.catalog_cache import CatalogCacheMixin
+from core.idempotency import idempotent
+from core.search import FullTextSearchFilter, get_backend as get_search_backend
+from core.checkout import checkout, CheckoutError
+from core.exports import check_file_format, report_rows, streaming_response
+from core.rows import FastListMixin, RowSerializer
+from copy import copy
+from datetime import datetime, time, timedelta
 from django.db.models import Sum, Count
 from django.shortcuts import get_object_or_404
 from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 
 
 
@@ -39,11 +56,22 @@ class UserActivityViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = UserActivity.objects.all()
     serializer_class = UserActivitySerializer
     permission_classes = [IsAuthenticated]
+    cursor_ordering = ('-timestamp', '-id')
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     filterset_fields = ['user', 'activity_type']
     search_fields = ['details']
 
 
+class UserActivityArchiveViewSet(viewsets.ReadOnlyModelViewSet):
+    queryset = UserActivityArchive.objects.all()
+    serializer_class = UserActivityArchiveSerializer
+    permission_classes = [IsAuthenticated]
+    cursor_ordering = ('-timestamp', '-id')
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
+    filterset_fields = ['month', 'user', 'activity_type']
+    search_fields = ['details']
+
+
 class ReceiptViewSet(viewsets.ModelViewSet):
     queryset = Receipt.objects.all()
     serializer_class = ReceiptSerializer
@@ -52,6 +80,7 @@ class ReceiptViewSet(viewsets.ModelViewSet):
     filterset_fields = ['void_status']
 
     @action(detail=True, methods=['post'])
+    @idempotent
     def print_receipt(self, request, pk=None):
         receipt = self.get_object()
         try:
@@ -61,42 +90,131 @@ class ReceiptViewSet(viewsets.ModelViewSet):
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
     @action(detail=True, methods=['post'])
+    @idempotent
     def void_receipt(self, request, pk=None):
         receipt = self.get_object()
         reason = request.data.get('reason')
         if not reason:
             return Response({'error': 'Void reason is required'},
                             status=status.HTTP_400_BAD_REQUEST)
-        receipt.void_status = True
-        receipt.void_reason = reason
-        receipt.save()
+        write_queue.run(receipt.void, reason)
         return Response({'status': 'receipt voided'})
 
 
-class TransactionViewSet(viewsets.ModelViewSet):
+class TransactionViewSet(FastListMixin, viewsets.ModelViewSet):
     queryset = Transaction.objects.all()
     serializer_class = TransactionSerializer
     permission_classes = [IsAuthenticated]
+    cursor_ordering = ('-timestamp', '-id')
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     filterset_fields = ['payment_method', 'is_completed']
     search_fields = ['transaction_id']
 
+    def perform_create(self, serializer):
+        sale = serializer.save()
+        if sale.is_completed:
+            SalesRollup.record(sale)
+
+    def perform_update(self, serializer):
+        previous = copy(serializer.instance)
+        sale = serializer.save()
+        # Voiding the receipt already took the sale out of the rollups.
+        if Receipt.objects.filter(transaction=sale, void_status=True).exists():
+            return
+        if previous.is_completed:
+            SalesRollup.record(previous, sign=-1)
+        if sale.is_completed:
+            SalesRollup.record(sale)
+
     @action(detail=True, methods=['post'])
+    @idempotent
     def complete_transaction(self, request, pk=None):
         transaction = self.get_object()
-        transaction.is_completed = True
-        transaction.save()
+        transaction.complete()
         return Response({'status': 'transaction completed'})
 
+    @action(detail=False, methods=['post'])
+    @idempotent
+    def checkout(self, request):
+        serializer = CheckoutSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        try:
+            sale, receipt = write_queue.run(
+                checkout,
+                cashier=request.user,
+                customer=data['customer'],
+                payment_method=data['payment_method'],
+                paid_amount=data['paid_amount'],
+                lines=[(line['product'], line['quantity']) for line in data['lines']],
+                receipt_number=data.get('receipt_number'),
+            )
+        except CheckoutError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        response = TransactionSerializer(sale).data
+        response['receipt'] = receipt.pk
+        response['receipt_number'] = receipt.receipt_number
+        return Response(response, status=status.HTTP_201_CREATED)
+
 
 class ProductViewSet(viewsets.ModelViewSet):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     permission_classes = [IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter]
     filterset_fields = ['category', 'brand', 'is_active']
     search_fields = ['name', 'barcode', 'sku']
 
+    @action(detail=False, methods=['get'], url_path=r'by-barcode/(?P<code>[^/]+)')
+    def by_barcode(self, request, code=None):
+        data = barcode_cache.lookup(code, self._load_scan)
+        if data is None:
+            return Response({'error': 'Unknown barcode'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(data)
+
+    @staticmethod
+    def _load_scan(code):
+        product = Product.objects.filter(barcode=code).first()
+        if product is None:
+            return None
+        return ProductScanSerializer(product).data
+
+    @action(detail=False, methods=['post'], url_path='price-basket')
+    def price_basket(self, request):
+        serializer = PriceBasketSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        lines = [(line['product'], line['quantity']) for line in serializer.validated_data['lines']]
+        try:
+            return Response(pricing.price_basket(lines))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=False, methods=['post'], parser_classes=[JSONParser, NDJSONParser])
+    def bulk(self, request):
+        if isinstance(request.data, dict):
+            return Response({'error': 'Expected a list of products'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        upsert = BulkUpsert(
+            Product, ProductBulkSerializer,
+            unique_fields=['barcode'],
+            also_unique=['sku'],
+            related={'category': ProductCategory, 'brand': Brand, 'unit': Unit},
+            after_batch=self._after_bulk_batch,
+        )
+        return Response(upsert.run(request.data))
+
+    @staticmethod
+    def _after_bulk_batch(products):
+        # bulk_create skips the post_save handlers in core.signals
+        keys = [product.barcode for product in products]
+        backend = get_search_backend()
+        if backend is not None:
+            backend.index_many(list(Product.objects.filter(barcode__in=keys)))
+        ChangeSequence.stamp(Product.objects.filter(barcode__in=keys))
+        Stock.reprice([product.sku for product in products])
+        Metrics.recount('out_of_stock_products')
+        db_transaction.on_commit(barcode_cache.invalidate)
+
     @action(detail=False, methods=['get'])
     def low_stock(self, request):
         products = Product.objects.filter(
@@ -119,18 +237,124 @@ class InventoryItemViewSet(viewsets.ModelViewSet):
         if new_quantity is None:
             return Response({'error': 'Quantity is required'},
                             status=status.HTTP_400_BAD_REQUEST)
+        try:
+            new_quantity = int(new_quantity)
+        except (TypeError, ValueError):
+            return Response({'error': 'Quantity must be an integer'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if new_quantity < 0:
+            return Response({'error': 'Quantity cannot be negative'},
+                            status=status.HTTP_400_BAD_REQUEST)
         inventory_item.quantity = new_quantity
         inventory_item.last_counted = datetime.now()
         inventory_item.save()
         return Response({'status': 'quantity updated'})
 
-
-class InventoryMovementViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['get'])
+    def expiring(self, request):
+        # Batches with stock left that expire within ?days= (default 30),
+        # soonest first, read off inventory_expiring_idx and paged by expiry.
+        try:
+            days = int(request.query_params.get('days', 30))
+        except ValueError:
+            return Response({'error': 'days must be an integer'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if days < 0:
+            return Response({'error': 'days cannot be negative'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        items = self.filter_queryset(self.get_queryset()).filter(
+            quantity__gt=0, expiry_date__lte=timezone.localdate() + timedelta(days=days),
+        )
+        self.cursor_ordering = ('expiry_date', 'id')
+        renderer = RowSerializer(self.get_serializer())
+        page = self.paginate_queryset(renderer.rows(items))
+        return self.get_paginated_response(renderer.data(page))
+
+    @action(detail=False, methods=['post'], parser_classes=[JSONParser, NDJSONParser])
+    def bulk(self, request):
+        if isinstance(request.data, dict):
+            return Response({'error': 'Expected a list of inventory items'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        upsert = BulkUpsert(
+            InventoryItem, InventoryItemBulkSerializer,
+            unique_fields=['product', 'batch_number'],
+            related={'product': Product, 'location': StorageLocation},
+            after_batch=self._after_bulk_batch,
+        )
+        return Response(upsert.run(request.data))
+
+    @staticmethod
+    def _after_bulk_batch(items):
+        # bulk_create skips InventoryItem.save(), which maintains the counter,
+        # the stock valuation rows and the sync sequence
+        products = Product.objects.filter(pk__in={item.product_id for item in items})
+        products.update(available_quantity=Product.inventory_total())
+        Stock.refresh({(item.product_id, item.location_id) for item in items})
+        ChangeSequence.stamp(products, InventoryItem.objects.filter(
+            product_id__in={item.product_id for item in items},
+            batch_number__in={item.batch_number for item in items}))
+
+
+def _as_of(at):
+    # An ISO date means the end of that day; no value means now.
+    try:
+        day = parse_date(at) if at else None
+        if day:
+            when = datetime.combine(day, time.max)
+        else:
+            when = parse_datetime(at) if at else timezone.now()
+    except ValueError:
+        return None
+    if when is not None and timezone.is_naive(when):
+        when = timezone.make_aware(when)
+    return when
+
+
+class InventoryMovementViewSet(FastListMixin, viewsets.ModelViewSet):
     queryset = InventoryMovement.objects.all()
     serializer_class = InventoryMovementSerializer
     permission_classes = [IsAuthenticated]
+    cursor_ordering = ('-timestamp', '-id')
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['movement_type', 'product']
+    # Movements are append-only; corrections are new ADJUST movements.
+    http_method_names = ['get', 'post', 'head', 'options']
+
+    def perform_create(self, serializer):
+        write_queue.run(serializer.save)
+
+    EXPORT_COLUMNS = ['id', 'timestamp', 'product', 'movement_type', 'quantity',
+                      'from_location', 'to_location', 'reference_number', 'performed_by']
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        rows = self.filter_queryset(self.get_queryset()).order_by('timestamp', 'id').values_list(
+            'id', 'timestamp', 'product_id', 'movement_type', 'quantity',
+            'from_location_id', 'to_location_id', 'reference_number', 'performed_by_id')
+        try:
+            return streaming_response('inventory-movements', self.EXPORT_COLUMNS, rows,
+                                      request.query_params.get('fmt', 'csv'))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=False, methods=['get'])
+    def stock_at(self, request):
+        when = _as_of(request.query_params.get('at'))
+        if when is None:
+            return Response({'error': 'at must be an ISO date or datetime'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        params = request.query_params
+        try:
+            product = int(params['product']) if params.get('product') else None
+            location = int(params['location']) if params.get('location') else None
+        except ValueError:
+            return Response({'error': 'product and location must be ids'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        stock = stock_ledger.stock_at(when, product_id=product, location_id=location)
+        return Response({'at': when, 'stock': [
+            {'product': product_id, 'location': location_id, 'quantity': quantity}
+            for (product_id, location_id), quantity in sorted(stock.items())
+        ]})
 
 
 class CustomerCreditViewSet(viewsets.ModelViewSet):
@@ -139,27 +363,49 @@ class CustomerCreditViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
 
     @action(detail=True, methods=['post'])
+    @idempotent
     def add_credit(self, request, pk=None):
         customer_credit = self.get_object()
         amount = request.data.get('amount')
         if not amount:
             return Response({'error': 'Amount is required'},
                             status=status.HTTP_400_BAD_REQUEST)
-        customer_credit.add_credit(amount)
+        try:
+            customer_credit.add_credit(amount, request.user,
+                                       request.data.get('reference_number', ''))
+        except (ValueError, ArithmeticError):
+            return Response({'error': 'Amount must be a positive number'},
+                            status=status.HTTP_400_BAD_REQUEST)
         return Response({'status': 'credit added'})
 
     @action(detail=True, methods=['post'])
+    @idempotent
     def use_credit(self, request, pk=None):
         customer_credit = self.get_object()
         amount = request.data.get('amount')
         if not amount:
             return Response({'error': 'Amount is required'},
                             status=status.HTTP_400_BAD_REQUEST)
-        if customer_credit.use_credit(amount):
+        try:
+            used = customer_credit.use_credit(amount, request.user,
+                                              request.data.get('reference_number', ''))
+        except (ValueError, ArithmeticError):
+            return Response({'error': 'Amount must be a positive number'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if used:
             return Response({'status': 'credit used'})
         return Response({'error': 'Insufficient credit'},
                         status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=True, methods=['get'])
+    def balance_at(self, request, pk=None):
+        customer_credit = self.get_object()
+        when = _as_of(request.query_params.get('at'))
+        if when is None:
+            return Response({'error': 'at must be an ISO date or datetime'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response({'at': when, 'balance': customer_credit.balance_at(when)})
+
 
 class ReportViewSet(viewsets.ModelViewSet):
     queryset = Report.objects.all()
@@ -168,9 +414,34 @@ class ReportViewSet(viewsets.ModelViewSet):
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['report_type', 'generated_by']
 
+    @action(detail=True, methods=['get'])
+    def export(self, request, pk=None):
+        report = self.get_object()
+        columns, rows = report_rows(report)
+        filename = f'{report.report_type.lower()}-{report.start_date}-{report.end_date}'
+        try:
+            return streaming_response(filename, columns, rows,
+                                      request.query_params.get('fmt', 'csv'))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=True, methods=['post'])
+    def write_file(self, request, pk=None):
+        # The file is written by the run_report_scheduler command.
+        report = self.get_object()
+        file_format = request.data.get('format', 'csv')
+        try:
+            check_file_format(file_format)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        report.file_job = {'status': scheduler.PENDING, 'format': file_format}
+        report.save(update_fields=['file_job'])
+        return Response(ReportSerializer(report, context={'request': request}).data,
+                        status=status.HTTP_202_ACCEPTED)
+
 
 class ReportScheduleViewSet(viewsets.ModelViewSet):
-    queryset = ReportSchedule.objects.all()
+    queryset = ReportSchedule.objects.prefetch_related('recipients')
     serializer_class = ReportScheduleSerializer
     permission_classes = [IsAuthenticated]
 
@@ -181,12 +452,22 @@ class ReportScheduleViewSet(viewsets.ModelViewSet):
         schedule.save()
         return Response({'status': f'schedule {"activated" if schedule.is_active else "deactivated"}'})
 
+    @action(detail=True, methods=['post'])
+    def run_now(self, request, pk=None):
+        # A one-off report for a run due now; the schedule keeps its next_run.
+        report = scheduler.queue_report(self.get_object(), run=timezone.now())
+        if report is None:
+            return Response({'error': 'Schedule has no recipients'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response({'status': 'report queued', 'report': report.pk},
+                        status=status.HTTP_202_ACCEPTED)
+
 
 class CustomerViewSet(viewsets.ModelViewSet):
     queryset = Customer.objects.all()
     serializer_class = CustomerSerializer
     permission_classes = [IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter]
     search_fields = ['name', 'business_name', 'mobile', 'email']
 
     @action(detail=True, methods=['get'])
@@ -242,7 +523,7 @@ class PurchaseReturnViewSet(viewsets.ModelViewSet):
     search_fields = ['reference_no', 'supplier']
 
 
-class StockViewSet(viewsets.ModelViewSet):
+class StockViewSet(FastListMixin, viewsets.ModelViewSet):
     queryset = Stock.objects.all()
     serializer_class = StockSerializer
     permission_classes = [IsAuthenticated]
@@ -254,8 +535,18 @@ class StockViewSet(viewsets.ModelViewSet):
         # Define your low stock threshold
         threshold = request.query_params.get('threshold', 10)
         low_stock = Stock.objects.filter(current_stock__lte=threshold)
-        serializer = self.get_serializer(low_stock, many=True)
-        return Response(serializer.data)
+        renderer = RowSerializer(self.get_serializer())
+        return Response(renderer.data(renderer.rows(low_stock)))
+
+    @action(detail=False, methods=['get'])
+    def valuation(self, request):
+        totals = self.filter_queryset(self.get_queryset()).values('location').annotate(
+            current_stock=Sum('current_stock'),
+            purchase_value=Sum('current_stock_value_purchase_price'),
+            sale_value=Sum('current_stock_value_sale_price'),
+            potential_profit=Sum('potential_profit'),
+        ).order_by('location')
+        return Response(totals)
 
 
 class ExpenseViewSet(viewsets.ModelViewSet):
@@ -267,7 +558,7 @@ class ExpenseViewSet(viewsets.ModelViewSet):
     search_fields = ['reference_no', 'customer_name']
 
 
-class ExpenseCategoryViewSet(viewsets.ModelViewSet):
+class ExpenseCategoryViewSet(CatalogCacheMixin, viewsets.ModelViewSet):
     queryset = ExpenseCategory.objects.all()
     serializer_class = ExpenseCategorySerializer
     permission_classes = [IsAuthenticated]
@@ -297,24 +588,20 @@ class MetricsViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def dashboard_summary(self, request):
-        metrics = Metrics.objects.first()  # Assuming one metrics record
-        if not metrics:
-            metrics = Metrics.objects.create()
-
-        # Update metrics with real-time data
-        metrics.out_of_stock_products = Product.objects.filter(
-            stock_quantity=0).count()
-        metrics.number_of_customers = Customer.objects.count()
-
-        # You might want to calculate these based on actual transactions
-        metrics.save()
+        # The counts are kept current by core.signals and checkout and the
+        # sales figures come from SalesRollup, so a GET never writes or counts.
+        metrics = Metrics.objects.first() or Metrics()
+        totals = SalesRollup.totals_for(timezone.localdate())
+        metrics.daily_sales = totals['DAY']
+        metrics.weekly_sales = totals['WEEK']
+        metrics.monthly_sales = totals['MONTH']
 
         serializer = self.get_serializer(metrics)
         return Response(serializer.data)
 
 
 class DiscountViewSet(viewsets.ModelViewSet):
-    queryset = Discount.objects.all()
+    queryset = Discount.objects.prefetch_related('products')
     serializer_class = DiscountSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
@@ -323,7 +610,7 @@ class DiscountViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def active_discounts(self, request):
         today = datetime.now().date()
-        active_discounts = Discount.objects.filter(
+        active_discounts = self.get_queryset().filter(
             from_date__lte=today,
             to_date__gte=today
         )
@@ -331,7 +618,7 @@ class DiscountViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
     
 
-class StorageLocationViewSet(viewsets.ModelViewSet):
+class StorageLocationViewSet(CatalogCacheMixin, viewsets.ModelViewSet):
     queryset = StorageLocation.objects.all()
     serializer_class = StorageLocationSerializer
     permission_classes = [IsAuthenticated]
@@ -343,7 +630,7 @@ class StorageLocationViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(name__icontains=name)
         return queryset
 
-class BrandViewSet(viewsets.ModelViewSet):
+class BrandViewSet(CatalogCacheMixin, viewsets.ModelViewSet):
     queryset = Brand.objects.all()
     serializer_class = BrandSerializer
     permission_classes = [IsAuthenticated]
@@ -355,7 +642,7 @@ class BrandViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(name__icontains=name)
         return queryset
 
-class ProductCategoryViewSet(viewsets.ModelViewSet):
+class ProductCategoryViewSet(CatalogCacheMixin, viewsets.ModelViewSet):
     queryset = ProductCategory.objects.all()
     serializer_class = ProductCategorySerializer
     permission_classes = [IsAuthenticated]
@@ -367,7 +654,7 @@ class ProductCategoryViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(name__icontains=name)
         return queryset
 
-class UnitViewSet(viewsets.ModelViewSet):
+class UnitViewSet(CatalogCacheMixin, viewsets.ModelViewSet):
     queryset = Unit.objects.all()
     serializer_class = UnitSerializer
     permission_classes = [IsAuthenticated]
@@ -390,6 +677,8 @@ class CustomUserViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         queryset = CustomUser.objects.all()
+        if self.action in ['retrieve', 'list']:
+            queryset = queryset.prefetch_related('groups', 'user_permissions__content_type')
         role = self.request.query_params.get('role', None)
         is_active = self.request.query_params.get('is_active', None)
         
@@ -399,6 +688,68 @@ class CustomUserViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(is_active=is_active)
         
         return queryset
-    
+
+
+class SyncViewSet(viewsets.ViewSet):
+    permission_classes = [IsAuthenticated]
+
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        page_size = getattr(settings, 'SYNC_PAGE_SIZE', 1000)
+        try:
+            since = int(request.query_params.get('since', 0))
+            limit = min(int(request.query_params.get('limit', page_size)), page_size)
+        except ValueError:
+            return Response({'error': 'since and limit must be integers'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if limit < 1:
+            return Response({'error': 'limit must be positive'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response(sync.changes(since, limit))
+
+    @action(detail=False, methods=['post'])
+    def upload(self, request):
+        sales = request.data.get('sales') if isinstance(request.data, dict) else None
+        if not isinstance(sales, list):
+            return Response({'error': 'Expected {"sales": [...]}'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if len(sales) > getattr(settings, 'SYNC_UPLOAD_BATCH', 200):
+            return Response({'error': 'Too many sales in one upload'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        # Each sale stands alone: one that fails is reported and the till
+        # keeps it for later, the others are recorded.
+        results = []
+        for row in sales:
+            serializer = OfflineSaleSerializer(data=row)
+            if not serializer.is_valid():
+                results.append({'transaction_id': row.get('transaction_id') if isinstance(
+                    row, dict) else None, 'status': 'invalid', 'errors': serializer.errors})
+                continue
+            sale = serializer.validated_data
+            try:
+                created, receipt, shortfall = write_queue.run(
+                    sync.record_offline_sale, request.user, sale)
+            except CheckoutError as e:
+                results.append({'transaction_id': str(sale['transaction_id']),
+                                'status': 'rejected', 'error': str(e)})
+                continue
+            result = {'transaction_id': str(sale['transaction_id']),
+                      'status': 'created' if created else 'duplicate',
+                      'receipt': receipt.pk, 'receipt_number': receipt.receipt_number}
+            if shortfall:
+                # Recorded, but sold beyond the stock on file: flag for a count.
+                result['shortfall'] = {str(pk): quantity for pk, quantity in shortfall.items()}
+            results.append(result)
+        return Response({'results': results})
+
+
 def home_view(request):
     return HttpResponse("Welcome to the Home Page")
+
+
+def metrics_view(request):
+    allowed = getattr(settings, 'METRICS_ALLOWED_IPS', [])
+    if not (request.user.is_staff or request.META.get('REMOTE_ADDR') in allowed):
+        return HttpResponse(status=403)
+    return HttpResponse(metrics.registry.render(),
+                        content_type='text/plain; version=0.0.4; charset=utf-8')
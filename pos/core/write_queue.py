@@ -0,0 +1,123 @@
+import atexit
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import connection, transaction
+
+
+class WriteQueue:
+    """
+    Runs short write functions on a single thread and commits each group of
+    them in one transaction. On SQLite there is only one writer at a time
+    anyway; queueing in-process turns lock contention between request
+    threads into one commit per group.
+
+    Every function runs in its own savepoint, so one that raises is rolled
+    back and reports its error without affecting the rest of the group.
+    """
+
+    def __init__(self, max_batch=64, max_delay=0, maxsize=10000):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue = queue.Queue(maxsize)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        self._start()
+        self._queue.put((future, fn, args, kwargs))
+        return future
+
+    def call(self, fn, *args, **kwargs):
+        return self.submit(fn, *args, **kwargs).result()
+
+    def stop(self):
+        """Commit everything already queued and stop the writer thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name='sqlite-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            job = self._queue.get()
+            if job is None:
+                break
+            batch = [job]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch:
+                try:
+                    job = self._queue.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if job is None:
+                    stopping = True
+                    break
+                batch.append(job)
+            self._commit(batch)
+        connection.close()
+
+    def _commit(self, batch):
+        outcomes = []
+        try:
+            with transaction.atomic():
+                for future, fn, args, kwargs in batch:
+                    try:
+                        with transaction.atomic():
+                            outcomes.append((future, fn(*args, **kwargs), None))
+                    except Exception as e:
+                        outcomes.append((future, None, e))
+        except Exception as e:
+            for future, *_ in batch:
+                future.set_exception(e)
+            return
+        for future, result, error in outcomes:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def _get_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = WriteQueue(
+                max_batch=getattr(settings, 'SQLITE_WRITE_BATCH', 64),
+                max_delay=getattr(settings, 'SQLITE_WRITE_DELAY', 0),
+            )
+            atexit.register(_writer.stop)
+        return _writer
+
+
+def enabled():
+    return connection.vendor == 'sqlite' and getattr(settings, 'SQLITE_WRITE_QUEUE', False)
+
+
+def run(fn, *args, **kwargs):
+    """
+    Run ``fn`` through the process's writer thread and return its result, or
+    raise its exception. Runs ``fn`` directly when the queue is off, when the
+    database is not SQLite, or when the caller is already inside a
+    transaction, whose writes the writer thread could not see.
+    """
+    if not enabled() or connection.in_atomic_block:
+        return fn(*args, **kwargs)
+    return _get_writer().call(fn, *args, **kwargs)
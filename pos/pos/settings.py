@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -44,6 +45,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -51,6 +53,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.ActivityLogMiddleware',
 ]
 
 ROOT_URLCONF = 'pos.urls'
@@ -77,13 +80,39 @@ WSGI_APPLICATION = 'pos.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# SQLite tuned for several workers: WAL lets readers run alongside the one
+# writer, IMMEDIATE transactions take the write lock when they begin instead
+# of failing with "database is locked" when a read turns into a write, and
+# OPTIONS['timeout'] (SQLite's busy timeout, in seconds) makes writers wait
+# for the lock rather than error out. It is the only place the busy timeout
+# is set: a busy_timeout pragma here would run after connecting and replace it.
+SQLITE_PRAGMAS = [
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA mmap_size=268435456',
+    'PRAGMA cache_size=-65536',
+    'PRAGMA temp_store=MEMORY',
+]
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            'init_command': ';'.join(SQLITE_PRAGMAS),
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
+# Funnel short SQLite write transactions through one writer thread per
+# process and commit them in groups (core/write_queue.py). Worth turning on
+# where commits are expensive; compare with `manage.py bench_sqlite_writes`.
+SQLITE_WRITE_QUEUE = False
+SQLITE_WRITE_BATCH = 64
+SQLITE_WRITE_DELAY = 0
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -121,8 +150,96 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+MEDIA_URL = 'media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
-AUTH_USER_MODEL = 'core.CustomUser'
\ No newline at end of file
+AUTH_USER_MODEL = 'core.CustomUser'
+
+# Test configuration: a local-memory cache and inline audit logging (below).
+# `manage.py test` sets POS_TESTING=1; other runners (pytest and the like)
+# must set it themselves.
+TESTING = os.environ.get('POS_TESTING') == '1'
+
+# The barcode, pricing and catalog caches below are invalidated by bumping
+# counters in a cache, which only reaches other workers if the cache is
+# shared. The file-based default is shared by every worker on this host;
+# point it at Redis or Memcached when serving from several hosts. Tests run
+# in one process and keep Django's local-memory cache. `check --deploy`
+# warns about any of these aliases left on a local-memory cache.
+if not TESTING:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('POS_CACHE_DIR',
+                                       os.path.join(tempfile.gettempdir(), 'pos-cache')),
+            'OPTIONS': {'MAX_ENTRIES': 100000},
+        },
+    }
+
+# Barcode scans (core/barcode_cache.py): size of the per-process LRU and the
+# CACHES alias that holds scans and the invalidation generation for every
+# worker. With None, invalidation only reaches the current process. Each
+# worker rereads the generation at most every BARCODE_GENERATION_TTL
+# seconds, which bounds how long it serves a scan from before a change.
+BARCODE_LRU_SIZE = 4096
+BARCODE_CACHE_ALIAS = 'default'
+BARCODE_GENERATION_TTL = 1
+
+# Per-day discount rules (core/pricing.py). Point this at a cache shared by
+# all workers so a discount change reaches every one of them.
+PRICING_CACHE_ALIAS = 'default'
+
+# Reference lists and details (core/catalog_cache.py): brands, categories,
+# units, locations and expense categories are cached for CATALOG_CACHE_TIMEOUT
+# seconds under a per-model version. The versions live in this cache too, so
+# it must be shared by all workers for a change to reach every one of them.
+CATALOG_CACHE_ALIAS = 'default'
+CATALOG_CACHE_TIMEOUT = 60 * 60
+
+# Till sync (core/sync.py): changes?since= returns at most about
+# SYNC_PAGE_SIZE rows per feed, upload takes at most SYNC_UPLOAD_BATCH sales,
+# and prune_sync_tombstones keeps deletes for SYNC_TOMBSTONE_RETENTION_DAYS.
+# A till that has been offline for longer gets a full resync.
+SYNC_PAGE_SIZE = 1000
+SYNC_UPLOAD_BATCH = 200
+SYNC_TOMBSTONE_RETENTION_DAYS = 30
+
+# Responses to POS actions sent with an Idempotency-Key header
+# (core/idempotency.py) are replayed for retries within this many seconds.
+# prune_idempotency_keys deletes the expired ones.
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+
+# Audit log (core/activity.py): UserActivity rows are written in batches of
+# up to ACTIVITY_LOG_BATCH_SIZE or every ACTIVITY_LOG_FLUSH_INTERVAL seconds.
+# When ACTIVITY_LOG_QUEUE_SIZE records are waiting, a request waits at most
+# ACTIVITY_LOG_PUT_TIMEOUT seconds before its record is dropped. With
+# ACTIVITY_LOG_ASYNC off, rows are written inline when the request commits;
+# tests run that way so nothing is written outside their transaction.
+ACTIVITY_LOG_ASYNC = not TESTING
+ACTIVITY_LOG_BATCH_SIZE = 500
+ACTIVITY_LOG_FLUSH_INTERVAL = 0.2
+ACTIVITY_LOG_QUEUE_SIZE = 10000
+ACTIVITY_LOG_PUT_TIMEOUT = 0.05
+
+# Rows older than this are moved to UserActivityArchive by archive_user_activity.
+ACTIVITY_RETENTION_DAYS = 90
+
+# Request metrics (core/metrics.py), served in Prometheus format by
+# /api/_metrics to staff users and to the addresses in METRICS_ALLOWED_IPS.
+# Empty by default: behind a reverse proxy every request arrives from the
+# proxy's address, so allowing 127.0.0.1 would allow everyone. List the
+# scraper's address only when it reaches the app directly.
+# Requests over either budget are logged by core.middleware.
+REQUEST_METRICS_ENABLED = True
+REQUEST_QUERY_BUDGET = 50
+REQUEST_TIME_BUDGET_MS = 500
+METRICS_ALLOWED_IPS = []
+
+REST_FRAMEWORK = {
+    'DEFAULT_PAGINATION_CLASS': 'core.pagination.KeysetPagination',
+    'PAGE_SIZE': 50,
+}
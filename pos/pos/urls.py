@@ -20,7 +20,7 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from django.contrib.auth.views import PasswordResetView, PasswordChangeView, LogoutView, LoginView
 from core.views import (
-    UserActivityViewSet, ReceiptViewSet,
+    UserActivityViewSet, UserActivityArchiveViewSet, ReceiptViewSet,
     TransactionViewSet, ProductViewSet, InventoryItemViewSet,
     InventoryMovementViewSet, CustomerCreditViewSet, ReportViewSet,
     ReportScheduleViewSet, CustomerViewSet, SupplierViewSet,
@@ -28,16 +28,18 @@ from core.views import (
     PurchaseReturnViewSet, StockViewSet, ExpenseViewSet,
     ExpenseCategoryViewSet, MonthlySalesViewSet, MetricsViewSet,
     DiscountViewSet,StorageLocationViewSet,
-    BrandViewSet,ProductCategoryViewSet,UnitViewSet,CustomUserViewSet
+    BrandViewSet,ProductCategoryViewSet,UnitViewSet,CustomUserViewSet,SyncViewSet
     
 )
-from core.views import home_view
+from core.views import home_view, metrics_view
+from core import async_views
 
 # Create a router instance
 router = DefaultRouter()
 
 # Register ViewSets
 router.register(r'user-activity', UserActivityViewSet)
+router.register(r'user-activity-archive', UserActivityArchiveViewSet)
 router.register(r'receipts', ReceiptViewSet)
 router.register(r'transactions', TransactionViewSet)
 router.register(r'products', ProductViewSet)
@@ -63,12 +65,24 @@ router.register(r'brands', BrandViewSet)
 router.register(r'product-categories', ProductCategoryViewSet)
 router.register(r'units', UnitViewSet)
 router.register(r'users', CustomUserViewSet)
+router.register(r'sync', SyncViewSet, basename='sync')
 
 
 urlpatterns = [
     # Admin Interface
     path('admin/', admin.site.urls),
 
+    # Async read endpoints, for ASGI deployments
+    path('api/async/products/by-barcode/<str:code>/', async_views.product_by_barcode,
+         name='async-product-by-barcode'),
+    path('api/async/stock/<str:sku>/', async_views.stock_by_sku, name='async-stock-by-sku'),
+    path('api/async/discounts/active/', async_views.active_discounts,
+         name='async-active-discounts'),
+    path('api/async/metrics/dashboard-summary/', async_views.dashboard_summary,
+         name='async-dashboard-summary'),
+
+    path('api/_metrics', metrics_view, name='metrics'),
+
     # Router URLs
     path('api/', include(router.urls)),
 
@@ -1,7 +1,9 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from django.db.models import Q
+from django.utils import timezone
 from core.models import (
-    CustomUser, UserActivity, Receipt, Transaction, Product, InventoryItem,
+    CustomUser, UserActivity, UserActivityArchive, Receipt, Transaction, Product, InventoryItem,
     InventoryMovement, CustomerCredit, CreditPayment, Report, ReportSchedule,
     Role, Customer, Supplier, Agent, Staff, SalesOrder, SalesReturn, Purchase,
     PurchaseReturn, Stock, Expense, ExpenseCategory, MonthlySales, Metrics,
@@ -15,11 +17,19 @@ class UserActivitySerializer(serializers.ModelSerializer):
         model = UserActivity
         fields = '__all__'
 
+class UserActivityArchiveSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UserActivityArchive
+        fields = '__all__'
+
 class ReceiptSerializer(serializers.ModelSerializer):
     class Meta:
         model = Receipt
         fields = ['id', 'receipt_number', 'transaction', 'printed_count',
                  'last_printed', 'void_status', 'void_reason']
+        # Changed only by the print_receipt and void_receipt actions, which
+        # keep the sales rollups in step with voids.
+        read_only_fields = ['printed_count', 'last_printed', 'void_status', 'void_reason']
 
 class TransactionSerializer(serializers.ModelSerializer):
     class Meta:
@@ -28,17 +38,62 @@ class TransactionSerializer(serializers.ModelSerializer):
                  'payment_method', 'total_amount', 'paid_amount',
                  'change_amount', 'is_completed']
 
-class ProductSerializer(serializers.ModelSerializer):
-    available_quantity = serializers.SerializerMethodField()
+class CheckoutLineSerializer(serializers.Serializer):
+    product = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
+
+class CheckoutSerializer(serializers.Serializer):
+    customer = serializers.PrimaryKeyRelatedField(queryset=Customer.objects.all())
+    payment_method = serializers.ChoiceField(choices=Transaction.PAYMENT_METHODS)
+    paid_amount = serializers.DecimalField(max_digits=10, decimal_places=2)
+    receipt_number = serializers.CharField(max_length=50, required=False)
+    lines = CheckoutLineSerializer(many=True, allow_empty=False)
+
+class OfflineSaleSerializer(CheckoutSerializer):
+    transaction_id = serializers.UUIDField()
+    recorded_at = serializers.DateTimeField(required=False)
 
+class PriceBasketSerializer(serializers.Serializer):
+    lines = CheckoutLineSerializer(many=True, allow_empty=False)
+
+class ProductSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
         fields = ['id', 'name', 'barcode', 'sku', 'category', 'brand', 'unit',
                  'price', 'cost_price', 'tax_rate', 'reorder_point', 'is_active',
                  'stock_quantity', 'packing_date', 'available_quantity']
+        read_only_fields = ['available_quantity']
+
+class ProductBulkSerializer(serializers.ModelSerializer):
+    # Foreign keys are plain ids here; core.bulk.BulkUpsert checks them per batch.
+    category = serializers.IntegerField()
+    brand = serializers.IntegerField()
+    unit = serializers.IntegerField()
 
-    def get_available_quantity(self, obj):
-        return obj.get_available_quantity()
+    class Meta:
+        model = Product
+        fields = ['name', 'barcode', 'sku', 'category', 'brand', 'unit',
+                 'price', 'cost_price', 'tax_rate', 'reorder_point', 'is_active',
+                 'stock_quantity', 'packing_date']
+        extra_kwargs = {'barcode': {'validators': []}, 'sku': {'validators': []}}
+
+class ProductScanSerializer(serializers.ModelSerializer):
+    active_discounts = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Product
+        fields = ['id', 'name', 'barcode', 'sku', 'category', 'brand', 'unit',
+                 'price', 'tax_rate', 'is_active', 'active_discounts']
+
+    def get_active_discounts(self, obj):
+        if 'active_discounts' in self.context:
+            return DiscountSerializer(self.context['active_discounts'], many=True).data
+        today = timezone.localdate()
+        discounts = Discount.objects.filter(
+            Q(products=obj) | Q(all_products_discount=True),
+            from_date__lte=today, to_date__gte=today,
+        ).distinct()
+        return DiscountSerializer(discounts, many=True).data
 
 class InventoryItemSerializer(serializers.ModelSerializer):
     class Meta:
@@ -46,17 +101,34 @@ class InventoryItemSerializer(serializers.ModelSerializer):
         fields = ['id', 'product', 'batch_number', 'quantity', 'location',
                  'expiry_date', 'last_counted']
 
+class InventoryItemBulkSerializer(serializers.ModelSerializer):
+    product = serializers.IntegerField()
+    location = serializers.IntegerField()
+
+    class Meta:
+        model = InventoryItem
+        fields = ['product', 'batch_number', 'quantity', 'location',
+                 'expiry_date', 'last_counted']
+        validators = []
+
 class InventoryMovementSerializer(serializers.ModelSerializer):
     class Meta:
         model = InventoryMovement
         fields = ['id', 'product', 'movement_type', 'quantity', 'reference_number',
                  'from_location', 'to_location', 'timestamp', 'performed_by']
 
+    def validate(self, attrs):
+        if attrs.get('movement_type') == 'TRANSFER' and attrs.get('to_location') is None:
+            raise serializers.ValidationError(
+                {'to_location': "A transfer needs a destination location"})
+        return attrs
+
 class CustomerCreditSerializer(serializers.ModelSerializer):
     class Meta:
         model = CustomerCredit
         fields = ['id', 'customer', 'credit_limit', 'current_balance',
                  'last_payment_date']
+        read_only_fields = ['current_balance', 'last_payment_date']
 
 class CreditPaymentSerializer(serializers.ModelSerializer):
     class Meta:
@@ -68,13 +140,15 @@ class ReportSerializer(serializers.ModelSerializer):
     class Meta:
         model = Report
         fields = ['id', 'report_type', 'start_date', 'end_date', 'generated_by',
-                 'generated_at', 'parameters', 'results', 'file_path']
+                 'generated_at', 'parameters', 'results', 'file_path', 'file_job']
 
 class ReportScheduleSerializer(serializers.ModelSerializer):
     class Meta:
         model = ReportSchedule
         fields = ['id', 'report_type', 'frequency', 'recipients', 'is_active',
                  'last_run', 'next_run']
+        # The first recipient owns each report the schedule produces.
+        extra_kwargs = {'recipients': {'allow_empty': False}}
 
 class RoleSerializer(serializers.ModelSerializer):
     class Meta: